@@ -0,0 +1,120 @@
+import numpy as np
+from Brick.Piece import Piece
+from Brick.Type import Type
+from BrickLink.Color import Color
+from BrickLink.Item import Item
+from Brick.Optimizer import Placement
+
+
+class Board:
+    """
+    Board of 1x1 pieces stored as a 2D array of palette indices.
+    Piece objects are only created on demand, one shared instance per palette color.
+    After optimization, `placements` lists the larger parts covering the board.
+    """
+
+    def __init__(
+        self,
+        indices: np.ndarray,
+        palette: list[Color],
+        reference: Type,
+        item: Item,
+        size: tuple[int, int] = (1, 1),
+    ):
+        self.indices = np.asarray(indices)
+        if self.indices.ndim != 2:
+            raise ValueError(f"Board indices must be 2D, got shape {self.indices.shape}")
+        self.palette = palette
+        self.reference = reference
+        self.item = item
+        self.size = size
+        self.placements = None
+        self._pieces = {}
+
+    @property
+    def height(self) -> int:
+        return self.indices.shape[0]
+
+    @property
+    def width(self) -> int:
+        return self.indices.shape[1]
+
+    def get_piece(
+        self, index: int, reference: Type = None, size: tuple[int, int] = None, item: Item = None
+    ) -> Piece:
+        key = (index, reference, size, item) if reference is not None else index
+        piece = self._pieces.get(key)
+        if piece is None:
+            if reference is None:
+                reference, size, item = self.reference, self.size, self.item
+            piece = Piece(reference, self.palette[index], size, item)
+            self._pieces[key] = piece
+        return piece
+
+    def __getitem__(self, position: tuple[int, int]) -> Piece:
+        y, x = position
+        return self.get_piece(int(self.indices[y, x]))
+
+    def split(self, plate_size: int) -> list[tuple[tuple[int, int], "Board"]]:
+        """
+        ((row, column), board) for each plate_size x plate_size baseplate, row by row.
+        Sub-boards are views sharing this board's palette, placements must not cross plates.
+        """
+        if self.height % plate_size or self.width % plate_size:
+            raise ValueError(
+                f"Board of {self.width}x{self.height} cannot be split in {plate_size}x{plate_size} baseplates"
+            )
+        plates = []
+        for row in range(self.height // plate_size):
+            for column in range(self.width // plate_size):
+                y0, x0 = row * plate_size, column * plate_size
+                plate = Board(
+                    self.indices[y0 : y0 + plate_size, x0 : x0 + plate_size],
+                    self.palette,
+                    self.reference,
+                    self.item,
+                    self.size,
+                )
+                if self.placements is not None:
+                    plate.placements = [
+                        Placement(
+                            p.y - y0, p.x - x0, p.height, p.width, p.index, p.reference, p.item
+                        )
+                        for p in self.placements
+                        if y0 <= p.y < y0 + plate_size and x0 <= p.x < x0 + plate_size
+                    ]
+                plates.append(((row, column), plate))
+        return plates
+
+    def counts(self) -> list[tuple[int, int]]:
+        """
+        (palette index, count) pairs, most used first, ties in order of first appearance.
+        """
+        flat = self.indices.reshape(-1)
+        counts = np.bincount(flat, minlength=len(self.palette))
+        used, first_seen = np.unique(flat, return_index=True)
+        order = sorted(
+            zip(used, first_seen), key=lambda pair: (-counts[pair[0]], pair[1])
+        )
+        return [(int(index), int(counts[index])) for index, _ in order]
+
+    def piece_counts(self) -> list[tuple[Piece, int]]:
+        """
+        (piece, count) pairs for every part and color, most used first.
+        Without placements every cell is one 1x1 piece.
+        """
+        if self.placements is None:
+            return [(self.get_piece(index), count) for index, count in self.counts()]
+        counts = {}
+        for p in self.placements:
+            piece = self.get_piece(p.index, p.reference, p.size, p.item)
+            counts[piece] = counts.get(piece, 0) + 1
+        # dicts keep first appearance order, sorted() is stable
+        return sorted(counts.items(), key=lambda pair: -pair[1])
+
+    def to_rgb(self) -> np.ndarray:
+        """
+        (height, width, 3) uint8 array of the piece colors.
+        """
+        colors = np.array([c.rgb_code for c in self.palette], dtype=np.uint8)
+        return colors[self.indices]
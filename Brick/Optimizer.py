@@ -0,0 +1,211 @@
+import time
+import numpy as np
+from Brick.Type import Type
+from BrickLink.Item import Item
+
+
+# 1x1 piece type -> {(rows, columns): (reference, item)} of the larger parts it can merge into
+_part_sizes = {
+    Type.PLATE: {
+        (1, 2): (Type.PLATE_1_2, Item.PLATE_1_2),
+        (1, 3): (Type.PLATE_1_3, Item.PLATE_1_3),
+        (1, 4): (Type.PLATE_1_4, Item.PLATE_1_4),
+        (1, 6): (Type.PLATE_1_6, Item.PLATE_1_6),
+        (1, 8): (Type.PLATE_1_8, Item.PLATE_1_8),
+        (2, 2): (Type.PLATE_2_2, Item.PLATE_2_2),
+        (2, 3): (Type.PLATE_2_3, Item.PLATE_2_3),
+        (2, 4): (Type.PLATE_2_4, Item.PLATE_2_4),
+        (2, 6): (Type.PLATE_2_6, Item.PLATE_2_6),
+        (2, 8): (Type.PLATE_2_8, Item.PLATE_2_8),
+    },
+    Type.TILE: {
+        (1, 2): (Type.TILE_1_2, Item.TILE_1_2),
+        (1, 3): (Type.TILE_1_3, Item.TILE_1_3),
+        (1, 4): (Type.TILE_1_4, Item.TILE_1_4),
+        (1, 6): (Type.TILE_1_6, Item.TILE_1_6),
+        (1, 8): (Type.TILE_1_8, Item.TILE_1_8),
+        (2, 2): (Type.TILE_2_2, Item.TILE_2_2),
+        (2, 4): (Type.TILE_2_4, Item.TILE_2_4),
+    },
+}
+# a part without a BrickLink item id could not be added to a wishlist, its size is left
+# out until the id is filled in Item
+merge_parts = {
+    piece_type: {size: part for size, part in parts.items() if part[1] is not None}
+    for piece_type, parts in _part_sizes.items()
+}
+
+
+class Placement:
+    """
+    One part on the board: top-left cell, extent in cells, palette index and part.
+    """
+
+    __slots__ = ("y", "x", "height", "width", "index", "reference", "item")
+
+    def __init__(self, y, x, height, width, index, reference, item):
+        self.y = y
+        self.x = x
+        self.height = height
+        self.width = width
+        self.index = index
+        self.reference = reference
+        self.item = item
+
+    @property
+    def size(self) -> tuple[int, int]:
+        # parts are counted whatever their orientation
+        return (min(self.height, self.width), max(self.height, self.width))
+
+
+class Optimizer:
+    """
+    Covers same-color regions of a board with larger parts, to use fewer pieces.
+
+    A greedy row-major scan places the largest part that fits at each uncovered cell,
+    then neighbouring parts that together form an available part are merged until
+    nothing changes or the time budget runs out. A part is only used in the colors
+    it has stock in.
+    """
+
+    def __init__(
+        self,
+        parts: dict[tuple[int, int], tuple[Type, Item]],
+        available: dict[Type, set],
+        time_budget: float = 0.5,
+    ):
+        self.parts = parts
+        self.available = available
+        self.time_budget = time_budget
+
+    @staticmethod
+    def get_available_colors(parts: dict) -> dict[Type, set]:
+        """
+        Color ids each part has stock in, parts missing from an offline snapshot have none.
+        """
+        from BrickLink.Connector import Connector
+
+        available = {}
+        for reference, _ in parts.values():
+            try:
+                colors = Connector.get_piece_colors_with_stock(reference)
+            except RuntimeError:
+                colors = []
+            available[reference] = {c.id for c in colors if c.stock}
+        return available
+
+    @staticmethod
+    def for_piece_type(piece_type: Type, time_budget: float = 0.5) -> "Optimizer":
+        parts = merge_parts.get(piece_type, {})
+        return Optimizer(parts, Optimizer.get_available_colors(parts), time_budget)
+
+    def _allowed(self, board, reference: Type) -> np.ndarray:
+        colors = self.available.get(reference, set())
+        return np.array([c.id in colors for c in board.palette], dtype=bool)
+
+    def _fits(self, board, rows: int, columns: int, reference: Type, plate_size: int):
+        """
+        fits[y, x] is True where a rows x columns part of one available color can start.
+        """
+        h, w = board.height, board.width
+        if rows > h or columns > w:
+            return None
+        indices = board.indices
+        base = indices[: h - rows + 1, : w - columns + 1]
+        fits = self._allowed(board, reference)[base]
+        for dy in range(rows):
+            for dx in range(columns):
+                if dy or dx:
+                    fits &= indices[dy : dy + h - rows + 1, dx : dx + w - columns + 1] == base
+        if plate_size:
+            # parts never cross a baseplate border
+            ys = np.arange(h - rows + 1)[:, None] % plate_size + rows <= plate_size
+            xs = np.arange(w - columns + 1)[None, :] % plate_size + columns <= plate_size
+            fits &= ys & xs
+        return fits
+
+    def _part_for(self, board, height: int, width: int, index: int):
+        part = self.parts.get((min(height, width), max(height, width)))
+        if part is None or board.palette[index].id not in self.available.get(part[0], ()):
+            return None
+        return part
+
+    def optimize(self, board, plate_size: int = None) -> list[Placement]:
+        start = time.perf_counter()
+        h, w = board.height, board.width
+        indices = board.indices
+
+        shapes = []
+        for (rows, columns), (reference, item) in self.parts.items():
+            for r, c in {(rows, columns), (columns, rows)}:
+                fits = self._fits(board, r, c, reference, plate_size)
+                if fits is not None and fits.any():
+                    shapes.append((r, c, reference, item, fits))
+        shapes.sort(key=lambda shape: -shape[0] * shape[1])
+
+        covered = np.zeros((h, w), dtype=bool)
+        owner = np.empty((h, w), dtype=np.intp)
+        placements = []
+        for y in range(h):
+            for x in range(w):
+                if covered[y, x]:
+                    continue
+                placement = None
+                for r, c, reference, item, fits in shapes:
+                    if (
+                        y < fits.shape[0]
+                        and x < fits.shape[1]
+                        and fits[y, x]
+                        and not covered[y : y + r, x : x + c].any()
+                    ):
+                        placement = Placement(y, x, r, c, int(indices[y, x]), reference, item)
+                        break
+                if placement is None:
+                    placement = Placement(
+                        y, x, 1, 1, int(indices[y, x]), board.reference, board.item
+                    )
+                covered[y : y + placement.height, x : x + placement.width] = True
+                owner[y : y + placement.height, x : x + placement.width] = len(placements)
+                placements.append(placement)
+
+        self._merge(board, placements, owner, plate_size, start)
+        return [p for p in placements if p is not None]
+
+    def _merge(self, board, placements, owner, plate_size, start) -> None:
+        """
+        Refinement: join two aligned neighbours of the same color into one available part.
+        """
+        h, w = board.height, board.width
+        merged = True
+        while merged and time.perf_counter() - start < self.time_budget:
+            merged = False
+            for i, p in enumerate(placements):
+                if p is None:
+                    continue
+                for right in (True, False):
+                    y, x = (p.y, p.x + p.width) if right else (p.y + p.height, p.x)
+                    if y >= h or x >= w:
+                        continue
+                    if plate_size and (y // plate_size, x // plate_size) != (
+                        p.y // plate_size,
+                        p.x // plate_size,
+                    ):
+                        continue
+                    j = owner[y, x]
+                    q = placements[j]
+                    if q.index != p.index:
+                        continue
+                    if right and (q.y, q.height) == (p.y, p.height):
+                        height, width = p.height, p.width + q.width
+                    elif not right and (q.x, q.width) == (p.x, p.width):
+                        height, width = p.height + q.height, p.width
+                    else:
+                        continue
+                    part = self._part_for(board, height, width, p.index)
+                    if part is None:
+                        continue
+                    p.height, p.width = height, width
+                    p.reference, p.item = part
+                    owner[q.y : q.y + q.height, q.x : q.x + q.width] = i
+                    placements[j] = None
+                    merged = True
@@ -1,11 +1,16 @@
+from __future__ import annotations
 from functools import lru_cache
-from BrickLink.Color import Color
+from typing import TYPE_CHECKING
 from BrickLink.Item import Item
 from Brick.Type import Type
 from urllib.parse import urlencode, urlparse, urlunparse
 
+if TYPE_CHECKING:
+    from BrickLink.Color import Color
+
 
 class Piece:
+    __slots__ = ("reference", "color", "size", "id")
 
     baseUrl = "https://www.bricklink.com/v2/catalog/catalogitem.page"
 
@@ -15,16 +20,23 @@ class Piece:
         self.size = size  # e.g., (2, 4) for a 2x4 brick
         self.id = id
 
+    @staticmethod
+    def get_baseplate_sizes() -> list[int]:
+        return list(lego_baseplates)
+
     @staticmethod
     @lru_cache(maxsize=256)
     def get_baseplate_by_size(size: int) -> "Piece":
-        size = (size, size)
-        for lego_baseplate in lego_baseplates:
-            if lego_baseplate.size == size:
-                return lego_baseplate
-        raise ValueError(
-            f"No baseplate with size {size}. Supported sizes: {[bp.size for bp in lego_baseplates]}"
-        )
+        if size not in lego_baseplates:
+            raise ValueError(
+                f"No baseplate with size {(size, size)}. Supported sizes: {[(s, s) for s in lego_baseplates]}"
+            )
+        # colors are resolved on first use, importing this module does no network I/O
+        from BrickLink.Color import Color
+
+        reference, color_name, item = lego_baseplates[size]
+        color = Color.get_bricklink_color_by_name(color_name, reference)
+        return Piece(reference, color, (size, size), item)
 
     def get_bricklink_url(self):
         baseUrl = urlparse(self.baseUrl)
@@ -35,41 +47,12 @@ class Piece:
         return urlunparse(baseUrl._replace(query=query_parameters, fragment=fragment))
 
 
-lego_baseplates = [
-    Piece(
-        Type.BASEPLATE_14_14,
-        Color.get_bricklink_color_by_name("Green", Type.BASEPLATE_14_14),
-        (14, 14),
-        Item.BASEPLATE_14_14,
-    ),
-    Piece(
-        Type.BASEPLATE_16_16,
-        Color.get_bricklink_color_by_name("White", Type.BASEPLATE_16_16),
-        (16, 16),
-        Item.BASEPLATE_16_16,
-    ),
-    Piece(
-        Type.BASEPLATE_24_24,
-        Color.get_bricklink_color_by_name("Light Gray", Type.BASEPLATE_24_24),
-        (24, 24),
-        Item.BASEPLATE_24_24,
-    ),
-    Piece(
-        Type.BASEPLATE_32_32,
-        Color.get_bricklink_color_by_name("White", Type.BASEPLATE_32_32),
-        (32, 32),
-        Item.BASEPLATE_32_32,
-    ),
-    Piece(
-        Type.BASEPLATE_40_40,
-        Color.get_bricklink_color_by_name("Green", Type.BASEPLATE_40_40),
-        (40, 40),
-        Item.BASEPLATE_40_40,
-    ),
-    Piece(
-        Type.BASEPLATE_48_48,
-        Color.get_bricklink_color_by_name("White", Type.BASEPLATE_48_48),
-        (48, 48),
-        Item.BASEPLATE_48_48,
-    ),
-]
+# size -> (reference, color name, item)
+lego_baseplates = {
+    14: (Type.BASEPLATE_14_14, "Green", Item.BASEPLATE_14_14),
+    16: (Type.BASEPLATE_16_16, "White", Item.BASEPLATE_16_16),
+    24: (Type.BASEPLATE_24_24, "Light Gray", Item.BASEPLATE_24_24),
+    32: (Type.BASEPLATE_32_32, "White", Item.BASEPLATE_32_32),
+    40: (Type.BASEPLATE_40_40, "Green", Item.BASEPLATE_40_40),
+    48: (Type.BASEPLATE_48_48, "White", Item.BASEPLATE_48_48),
+}
@@ -10,3 +10,21 @@ class Type:
     BASEPLATE_32_32 = "3811"
     BASEPLATE_40_40 = "bb0040"
     BASEPLATE_48_48 = "4186"
+    # Larger parts used when merging 1x1 cells
+    PLATE_1_2 = "3023"
+    PLATE_1_3 = "3623"
+    PLATE_1_4 = "3710"
+    PLATE_1_6 = "3666"
+    PLATE_1_8 = "3460"
+    PLATE_2_2 = "3022"
+    PLATE_2_3 = "3021"
+    PLATE_2_4 = "3020"
+    PLATE_2_6 = "3795"
+    PLATE_2_8 = "3034"
+    TILE_1_2 = "3069b"
+    TILE_1_3 = "63864"
+    TILE_1_4 = "2431"
+    TILE_1_6 = "6636"
+    TILE_1_8 = "4162"
+    TILE_2_2 = "3068b"
+    TILE_2_4 = "87079"
@@ -0,0 +1,191 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+import aiohttp
+from Brick.Piece import Piece
+from Brick.Type import Type
+from BrickLink.Color import Color as BrickLinkColor
+from BrickLink.Connector import Connector
+from BrickLink.Wishlist import Wishlist
+from Profiler import Profiler
+
+
+class TokenBucket:
+    """
+    Allows `rate` requests per second on average, with bursts of up to `capacity`.
+    """
+
+    def __init__(self, rate: float, capacity: int = 1):
+        if rate <= 0:
+            raise ValueError(f"rate must be positive, got {rate}")
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class AsyncConnector:
+    """
+    Asynchronous counterpart of `Connector` for catalog fetches, stock checks, prices
+    and wishlist posts. Every request goes through a concurrency cap and a token bucket,
+    with a per-request timeout and retries. Parsing, caches and snapshots are shared
+    with `Connector`.
+    """
+
+    retry_statuses = (429, 502, 503, 504)
+
+    def __init__(
+        self,
+        concurrency: int = 8,
+        rate: float = 5.0,
+        timeout: float = 20,
+        retries: int = 3,
+        backoff: float = 0.5,
+    ):
+        self.concurrency = concurrency
+        self.rate = rate
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self._session = None
+        self._semaphore = None
+        self._bucket = None
+        self._executor = None
+
+    async def __aenter__(self) -> "AsyncConnector":
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._bucket = TokenBucket(self.rate, self.concurrency)
+        self._session = aiohttp.ClientSession(
+            headers=Connector.headers,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self._session.close()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    async def _request(
+        self, kind: str, method: str, url: str, **kwargs
+    ) -> tuple[int, bytes]:
+        """
+        Send one request, retried on timeouts, connection errors and 429/5xx answers.
+        A POST is only retried when it certainly did not reach the server or was
+        refused with 429, a 5xx may come after the lots were added.
+        Every attempt is recorded in the profiler under `kind`.
+        """
+        for attempt in range(self.retries + 1):
+            last = attempt == self.retries
+            async with self._semaphore:
+                await self._bucket.acquire()
+                start = time.perf_counter()
+                try:
+                    async with self._session.request(method, url, **kwargs) as response:
+                        content = await response.read()
+                        Profiler.record_request(
+                            kind, time.perf_counter() - start, response.status >= 400
+                        )
+                        retry = response.status in self.retry_statuses and (
+                            method == "GET" or response.status == 429
+                        )
+                        if not retry or last:
+                            return response.status, content
+                except aiohttp.ClientConnectorError:
+                    Profiler.record_request(kind, time.perf_counter() - start, True)
+                    if last:
+                        raise
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    Profiler.record_request(kind, time.perf_counter() - start, True)
+                    if last or method != "GET":
+                        raise
+            await asyncio.sleep(self.backoff * 2**attempt)
+
+    async def get_piece_colors_with_stock(self, ref: Type) -> list[BrickLinkColor]:
+        colors = Connector.get_snapshot_colors(ref)
+        if colors is None:
+            _, content = await self._request(
+                "catalog", "GET", Connector.get_colors_url(ref)
+            )
+            colors = Connector.store_colors(
+                ref, Connector.parse_piece_colors_with_stock(content.decode())
+            )
+        return colors
+
+    async def get_piece_price(self, piece: Piece) -> float:
+        _, content = await self._request(
+            "price", "GET", f"{Connector.buy_url}{piece.id}"
+        )
+        return Connector.parse_piece_price(content.decode())
+
+    async def _scrape_stock(self, ref: Type, color_id: int) -> int | None:
+        # stock is rendered by JavaScript, the browser pool runs in worker threads
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(Connector.browser_pool_size)
+        url = Connector.get_bricklink_url(ref, color_id, 1)
+        pool = Connector.get_browser_pool()
+        async with self._semaphore:
+            await self._bucket.acquire()
+            text = await asyncio.get_running_loop().run_in_executor(
+                self._executor, pool.get_element_text, url, "_idtxtTotalFound"
+            )
+        return Connector._store_stock(ref, color_id, text)
+
+    async def get_pieces_stock(
+        self, lookups: list[tuple[Type, int, int]]
+    ) -> list[tuple[int | None, str]]:
+        stocks, missing = Connector._get_cached_stock(lookups)
+        if missing and not Connector.offline:
+            scraped = await asyncio.gather(
+                *(self._scrape_stock(ref, color_id) for ref, color_id in missing)
+            )
+            stocks.update(zip(missing, scraped))
+        return Connector._stock_results(lookups, stocks)
+
+    async def create_wishlist(
+        self, name: str, description: str = None, jwt: str = None
+    ) -> Wishlist:
+        data = {"wantedMoreName": name, "wantedMoreDesc": description, "action": "C"}
+        status, content = await self._request(
+            "wishlist_create",
+            "POST",
+            f"{Connector.wanted_url}/editList.ajax",
+            data={k: v for k, v in data.items() if v is not None},
+            cookies={"bricklink.bricklink-account.jwt": jwt},
+        )
+        return Connector._parse_created_wishlist(status, content, name, description)
+
+    async def add_pieces_to_wishlist(
+        self, wishlist: Wishlist, pieces: list[tuple[Piece, int]], jwt: str = None
+    ) -> None:
+        headers = {"Content-Type": "application/x-www-form-urlencoded; charset=UTF-8"}
+
+        async def post(data: dict) -> None:
+            status, content = await self._request(
+                "wishlist_add",
+                "POST",
+                f"{Connector.wanted_url}/add.ajax",
+                data={k: str(v) for k, v in data.items()},
+                cookies={"bricklink.bricklink-account.jwt": jwt},
+                headers=headers,
+            )
+            Connector._check_wanted_response(status, content)
+
+        await asyncio.gather(
+            *(post(data) for data in Connector._wanted_payloads(wishlist, pieces))
+        )
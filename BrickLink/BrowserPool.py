@@ -0,0 +1,97 @@
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue
+from threading import Lock
+from typing import TYPE_CHECKING
+from Profiler import Profiler
+import time
+
+if TYPE_CHECKING:
+    from selenium import webdriver
+
+
+class BrowserPool:
+    """
+    Fixed number of reused headless browsers. Drivers are started lazily and
+    handed out to one lookup at a time, lookups run in parallel across the pool.
+    """
+
+    DEFAULT_SIZE = 4
+
+    def __init__(self, size: int = DEFAULT_SIZE, timeout: float = 15, driver_factory=None):
+        if size < 1:
+            raise ValueError(f"Browser pool size must be at least 1, got {size}")
+        self.size = size
+        self.timeout = timeout
+        self.driver_factory = driver_factory or BrowserPool.create_chrome_driver
+        self._drivers = []
+        self._idle = Queue()
+        self._lock = Lock()
+
+    @staticmethod
+    def create_chrome_driver() -> webdriver.Chrome:
+        # Selenium is only loaded once a browser is actually needed
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options
+
+        options = Options()
+        options.add_argument("--headless=new")
+        options.add_argument("--disable-gpu")
+        return webdriver.Chrome(options=options)
+
+    def _acquire(self):
+        with self._lock:
+            if self._idle.empty() and len(self._drivers) < self.size:
+                driver = self.driver_factory()
+                self._drivers.append(driver)
+                return driver
+        return self._idle.get()
+
+    def _release(self, driver) -> None:
+        self._idle.put(driver)
+
+    def get_element_text(self, url: str, element_id: str) -> str | None:
+        """
+        Load `url` and wait until the element has some text, None if it never does.
+        """
+        from selenium.common.exceptions import TimeoutException
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        driver = self._acquire()
+        start = time.perf_counter()
+        text = None
+        try:
+            driver.get(url)
+
+            def element_text(d):
+                return d.find_element(By.ID, element_id).text.strip()
+
+            try:
+                text = WebDriverWait(driver, self.timeout).until(element_text)
+            except TimeoutException:
+                pass
+            return text
+        finally:
+            # pages that never show the element count as failed requests
+            Profiler.record_request("browser", time.perf_counter() - start, text is None)
+            self._release(driver)
+
+    def map_element_text(self, urls: list[str], element_id: str) -> list[str | None]:
+        with ThreadPoolExecutor(max_workers=self.size) as executor:
+            return list(
+                executor.map(lambda url: self.get_element_text(url, element_id), urls)
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            for driver in self._drivers:
+                driver.quit()
+            self._drivers = []
+            self._idle = Queue()
+
+    def __enter__(self) -> "BrowserPool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,102 @@
+import numpy as np
+
+
+class CapsError(ValueError):
+    """
+    The color caps are invalid or leave too few pieces for the board.
+    """
+
+
+class CappedAssignment:
+    """
+    Assigns pixels to palette colors with a maximum number of pieces per color,
+    with minimal total distance (a transportation problem).
+
+    Pixels start on their nearest color. While a color is over its cap, pixels are
+    moved along the cheapest chain of color changes (successive shortest paths over
+    the palette graph, Bellman-Ford) towards a color with spare pieces. Starting from
+    the unconstrained optimum, each step keeps the assignment optimal for the pieces
+    moved so far, so the final result is optimal for the caps.
+    """
+
+    @staticmethod
+    def solve(distances, weights, caps) -> np.ndarray:
+        """
+        `distances` is (U, K) from each group of identical pixels to each color,
+        `weights` the number of pixels per group and `caps` the maximum per color
+        (np.inf for none), whole pieces of at least 1. Returns the (U, K) number of pixels
+        of each group per color.
+        """
+        distances = np.asarray(distances, dtype=np.float64)
+        weights = np.asarray(weights, dtype=np.int64)
+        caps = np.asarray(caps, dtype=np.float64)
+        groups, k = distances.shape
+        if (caps < 1).any() or (caps != np.floor(caps)).any():
+            raise CapsError("Color caps must be whole numbers of pieces, at least 1")
+        if weights.sum() > caps.sum():
+            raise CapsError(
+                f"Color caps allow {caps.sum():.0f} pieces, the board needs {weights.sum()}"
+            )
+
+        flows = np.zeros((groups, k), dtype=np.int64)
+        flows[np.arange(groups), np.argmin(distances, axis=1)] = weights
+
+        # cost[a, b]: cheapest move of one pixel currently on color a to color b,
+        # only the rows of colors touched by the last path are recomputed
+        cost = np.full((k, k), np.inf)
+        mover = np.zeros((k, k), dtype=np.intp)
+        stale = set(range(k))
+
+        while True:
+            load = flows.sum(axis=0)
+            excess = load - caps
+            if not (excess > 0).any():
+                return flows
+
+            for a in stale:
+                members = np.nonzero(flows[:, a])[0]
+                if not len(members):
+                    cost[a] = np.inf
+                    continue
+                delta = distances[members] - distances[members, a][:, None]
+                best = np.argmin(delta, axis=0)
+                cost[a] = delta[best, np.arange(k)]
+                cost[a, a] = np.inf
+                mover[a] = members[best]
+
+            # Bellman-Ford from every color over its cap at once
+            dist = np.where(excess > 0, 0.0, np.inf)
+            pred = np.full(k, -1)
+            for _ in range(k):
+                candidates = dist[:, None] + cost
+                origin = np.argmin(candidates, axis=0)
+                best = candidates[origin, np.arange(k)]
+                improved = best < dist - 1e-12
+                if not improved.any():
+                    break
+                dist[improved] = best[improved]
+                pred[improved] = origin[improved]
+
+            spare = np.where(load < caps, dist, np.inf)
+            target = int(np.argmin(spare))
+            if not np.isfinite(spare[target]):
+                raise CapsError("No way to move pixels out of over-capped colors")
+
+            path = [target]
+            while pred[path[-1]] != -1:
+                path.append(int(pred[path[-1]]))
+            path.reverse()
+            moves = [(mover[a, b], a, b) for a, b in zip(path, path[1:])]
+
+            # caps are whole numbers, so at least one pixel moves
+            amount = int(
+                min(
+                    excess[path[0]],
+                    caps[target] - load[target],
+                    *(flows[group, a] for group, a, _ in moves),
+                )
+            )
+            for group, a, b in moves:
+                flows[group, a] -= amount
+                flows[group, b] += amount
+            stale = set(path)
@@ -0,0 +1,70 @@
+from __future__ import annotations
+import json
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING
+from Cache import get_cache_dir
+
+if TYPE_CHECKING:
+    from BrickLink.Color import Color as BrickLinkColor
+
+
+class Catalog:
+    """
+    Local snapshot of the BrickLink color guide: colors and lot counts per part.
+    Loaded lazily on first use, written back whenever a part is refreshed.
+    Parts fetched more than `max_age` seconds ago are stale and downloaded again.
+    """
+
+    VERSION = 1
+    DEFAULT_MAX_AGE = 30 * 24 * 3600
+
+    def __init__(self, path: Path = None, max_age: float = DEFAULT_MAX_AGE):
+        self.path = path or get_cache_dir("catalog") / "catalog.json"
+        self.max_age = max_age
+        self._parts = None
+
+    def _load(self) -> dict:
+        if self._parts is None:
+            self._parts = {}
+            if self.path.is_file():
+                data = json.loads(self.path.read_text())
+                # snapshots from another format version are ignored and rebuilt
+                if data.get("version") == self.VERSION:
+                    self._parts = data.get("parts", {})
+        return self._parts
+
+    def get_colors(self, ref: str, allow_stale: bool = False) -> list[BrickLinkColor] | None:
+        """
+        Colors of the part, None if missing or stale (unless `allow_stale`).
+        """
+        from BrickLink.Color import Color as BrickLinkColor
+
+        part = self._load().get(str(ref))
+        if part is None:
+            return None
+        if not allow_stale and time.time() - part.get("fetched_at", 0) > self.max_age:
+            return None
+        return [
+            BrickLinkColor(c["id"], c["name"], c["hex"], c["stock"])
+            for c in part["colors"]
+        ]
+
+    def put_colors(self, ref: str, colors: list[BrickLinkColor]) -> None:
+        # an empty color guide is a failed scrape, it must not replace a good snapshot
+        if not colors:
+            return
+        self._load()[str(ref)] = {
+            "fetched_at": time.time(),
+            "colors": [
+                {"id": c.id, "name": c.name, "hex": c.hex_code, "stock": c.stock}
+                for c in colors
+            ],
+        }
+        self.save()
+
+    def save(self) -> None:
+        data = {"version": self.VERSION, "parts": self._load()}
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(data, indent=1))
+        tmp_path.replace(self.path)
@@ -0,0 +1,285 @@
+import importlib.util
+import re
+from functools import lru_cache
+from html.parser import HTMLParser
+from BrickLink.Color import Color as BrickLinkColor
+
+
+class _Node:
+    __slots__ = ("tag", "attrs", "children", "parent")
+
+    def __init__(self, tag: str, attrs: dict, parent: "_Node" = None):
+        self.tag = tag
+        self.attrs = attrs
+        self.children = []
+        self.parent = parent
+
+    def iter(self, tag: str):
+        """
+        Descendant elements named `tag`, in document order, not including this one.
+        """
+        for child in self.children:
+            if isinstance(child, _Node):
+                if child.tag == tag:
+                    yield child
+                yield from child.iter(tag)
+
+    def strings(self):
+        for child in self.children:
+            if isinstance(child, _Node):
+                yield from child.strings()
+            else:
+                yield child
+
+    def next_sibling(self, tag: str) -> "_Node | None":
+        siblings = self.parent.children
+        for sibling in siblings[siblings.index(self) + 1 :]:
+            if isinstance(sibling, _Node) and sibling.tag == tag:
+                return sibling
+        return None
+
+
+class _BlockBuilder(HTMLParser):
+    """
+    Minimal tree of one element, tokenizing stops as soon as the element is closed.
+    """
+
+    VOID = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+
+    class Done(Exception):
+        pass
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = None
+        self._stack = []
+
+    def handle_starttag(self, tag, attrs):
+        node = _Node(tag, {k: v or "" for k, v in attrs}, self._stack[-1] if self._stack else None)
+        if node.parent is None:
+            self.root = node
+        else:
+            node.parent.children.append(node)
+        if tag not in self.VOID:
+            self._stack.append(node)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in self.VOID:
+            self._stack.pop()
+
+    def handle_endtag(self, tag):
+        # unclosed children are closed with their parent, stray end tags are ignored
+        for depth in range(len(self._stack) - 1, -1, -1):
+            if self._stack[depth].tag == tag:
+                del self._stack[depth:]
+                break
+        if not self._stack:
+            raise self.Done()
+
+    def handle_data(self, data):
+        if self._stack:
+            self._stack[-1].children.append(data)
+
+
+class CatalogParser:
+    """
+    Colors and lot counts from the "Lots For Sale" block of a BrickLink catalog page.
+    Every backend returns the same list: `soup` is the reference BeautifulSoup walk,
+    `lxml` the same walk on an lxml tree (optional dependency), and `stream` only
+    tokenizes the table cell holding the block. `auto` is lxml when installed, else stream.
+    A fast backend finding no colors on a page with the block falls back to soup, so
+    layout changes they do not follow cost time instead of colors.
+    """
+
+    BACKENDS = ("auto", "stream", "lxml", "soup")
+
+    # title div holding only text, like the `string=` filter of the soup walk
+    _title = re.compile(
+        r"<div\b[^>]*\bclass\s*=\s*(?:\"[^\"]*|'[^']*|)\bpciColorTitle\b[^>]*>([^<]*)</div\s*>",
+        re.IGNORECASE,
+    )
+    _cell = re.compile(r"<td\b", re.IGNORECASE)
+
+    @staticmethod
+    def parse(html: str, backend: str = "auto") -> list[BrickLinkColor]:
+        if backend == "auto":
+            backend = "lxml" if CatalogParser.has_lxml() else "stream"
+        if backend == "soup":
+            return CatalogParser.parse_soup(html)
+        if backend == "stream":
+            colors = CatalogParser.parse_stream(html)
+        elif backend == "lxml":
+            colors = CatalogParser.parse_lxml(html)
+        else:
+            raise ValueError(
+                f"Unknown catalog parser '{backend}', must be one of {CatalogParser.BACKENDS}"
+            )
+        if not colors and "Lots For Sale:" in html:
+            return CatalogParser.parse_soup(html)
+        return colors
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def has_lxml() -> bool:
+        return importlib.util.find_spec("lxml") is not None
+
+    @staticmethod
+    def _to_color(style: str, onclick: str, name: str, text: str) -> BrickLinkColor | None:
+        match_color = re.search(r"#([0-9A-Fa-f]{6})", style)
+        color_hex = match_color.group(1) if match_color else None
+
+        match_id = re.search(r"showInventoryWithColor\(\s*(\d+)\s*\)", onclick, re.IGNORECASE)
+        color_id = int(match_id.group(1)) if match_id else None
+
+        match_stock = re.search(r"\((\d+)\)", text)
+        color_stock = int(match_stock.group(1)) if match_stock else None
+
+        # Used to filter for the first line 'Non Applicable'
+        if not color_hex:
+            return None
+        return BrickLinkColor(color_id, name, color_hex, color_stock)
+
+    @staticmethod
+    def parse_soup(html: str) -> list[BrickLinkColor]:
+        from bs4 import BeautifulSoup
+
+        soup = BeautifulSoup(html, "html.parser")
+
+        colors = []
+
+        lots_div = soup.find(
+            "div", class_="pciColorTitle", string=lambda s: s and "Lots For Sale:" in s
+        )
+        if lots_div:
+            td_parent = lots_div.find_parent("td")
+            for flex_div in td_parent.find_all(
+                "div", style=lambda s: s and "display:flex" in s
+            ):
+                color_div = flex_div.find("div", class_="pciColorTabListItem")
+                text_div = color_div.find_next_sibling("div") if color_div else None
+                if not text_div:
+                    continue
+
+                a_tag = text_div.find(lambda t: t.name and t.name.lower() == "a")
+                if not a_tag:
+                    continue
+
+                color = CatalogParser._to_color(
+                    color_div.get("style", ""),
+                    a_tag.get("onclick", ""),
+                    a_tag.get_text(strip=True),
+                    text_div.get_text(strip=True),
+                )
+                if color:
+                    colors.append(color)
+        return colors
+
+    @staticmethod
+    def parse_lxml(html: str) -> list[BrickLinkColor]:
+        import lxml.html
+
+        def has_class(element, name: str) -> bool:
+            return name in (element.get("class") or "").split()
+
+        def text(element) -> str:
+            return "".join(s.strip() for s in element.itertext())
+
+        def string(element) -> str | None:
+            # text of the only child, looking through single-child tags like soup's .string
+            while len(element) == 1 and not element.text and not element[0].tail:
+                element = element[0]
+            return element.text if len(element) == 0 else None
+
+        colors = []
+        root = lxml.html.fromstring(html)
+        lots_div = next(
+            (
+                div
+                for div in root.iter("div")
+                if has_class(div, "pciColorTitle") and "Lots For Sale:" in (string(div) or "")
+            ),
+            None,
+        )
+        td_parent = next(lots_div.iterancestors("td"), None) if lots_div is not None else None
+        if td_parent is None:
+            return colors
+
+        for flex_div in td_parent.iterdescendants("div"):
+            if "display:flex" not in (flex_div.get("style") or ""):
+                continue
+            color_div = next(
+                (d for d in flex_div.iterdescendants("div") if has_class(d, "pciColorTabListItem")),
+                None,
+            )
+            text_div = next(color_div.itersiblings("div"), None) if color_div is not None else None
+            if text_div is None:
+                continue
+            a_tag = next(text_div.iterdescendants("a"), None)
+            if a_tag is None:
+                continue
+
+            color = CatalogParser._to_color(
+                color_div.get("style") or "",
+                a_tag.get("onclick") or "",
+                text(a_tag),
+                text(text_div),
+            )
+            if color:
+                colors.append(color)
+        return colors
+
+    @staticmethod
+    def _lots_cell(html: str) -> "_Node | None":
+        """
+        Tree of the table cell around the "Lots For Sale:" title, built from that cell only.
+        """
+        for title in CatalogParser._title.finditer(html):
+            if "Lots For Sale:" not in title.group(1):
+                continue
+            starts = [m.start() for m in CatalogParser._cell.finditer(html, 0, title.start())]
+            if not starts:
+                return None
+            builder = _BlockBuilder()
+            try:
+                builder.feed(html[starts[-1] :])
+                builder.close()
+            except _BlockBuilder.Done:
+                pass
+            return builder.root
+        return None
+
+    @staticmethod
+    def parse_stream(html: str) -> list[BrickLinkColor]:
+        colors = []
+        td_parent = CatalogParser._lots_cell(html)
+        if td_parent is None:
+            return colors
+
+        for flex_div in td_parent.iter("div"):
+            if "display:flex" not in flex_div.attrs.get("style", ""):
+                continue
+            color_div = next(
+                (
+                    d
+                    for d in flex_div.iter("div")
+                    if "pciColorTabListItem" in d.attrs.get("class", "").split()
+                ),
+                None,
+            )
+            text_div = color_div.next_sibling("div") if color_div else None
+            if not text_div:
+                continue
+            a_tag = next(text_div.iter("a"), None)
+            if not a_tag:
+                continue
+
+            color = CatalogParser._to_color(
+                color_div.attrs.get("style", ""),
+                a_tag.attrs.get("onclick", ""),
+                "".join(s.strip() for s in a_tag.strings()),
+                "".join(s.strip() for s in text_div.strings()),
+            )
+            if color:
+                colors.append(color)
+        return colors
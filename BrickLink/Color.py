@@ -1,7 +1,12 @@
-from Color import Color as BaseColor, CIEDE2000
+from Color import Color as BaseColor, CIEDE2000_matrix
 from functools import lru_cache
+from hashlib import sha1
 from Brick.Type import Type
-from skimage import color
+import numpy as np
+from BrickLink.MatchCache import MatchCache
+from BrickLink.PaletteLUT import PaletteLUT
+from BrickLink.PaletteIndex import PaletteIndex
+from BrickLink.CappedAssignment import CappedAssignment
 
 
 class Color:
@@ -13,6 +18,13 @@ class Color:
     GLITTER = "glitter"
     CHROME = "chrome"
 
+    # palette filter, part of every palette fingerprint
+    MIN_STOCK = 10
+    FILTER_RULES = f"type={SOLID};stock>{MIN_STOCK}"
+
+    # LAB -> closest color, shared by all lookups
+    match_cache = MatchCache()
+
     def __init__(self, id: str, name: str, hex_code: str, stock: int):
         self.id = id
         self.name = name
@@ -45,13 +57,15 @@ class Color:
 
     @staticmethod
     def _to_lab(v) -> tuple[int, int, int]:
+        from skimage import color
+
         rgb = Color._to_rgb(v)
         rgb_normalized = [c / 255 for c in rgb]
         return color.rgb2lab(rgb_normalized)
 
     @staticmethod
     @lru_cache(maxsize=None)
-    def get_closest_bricklink_color(color: BaseColor, piece_type: Type) -> "Color":
+    def get_filtered_colors(piece_type: Type) -> list["Color"]:
         from BrickLink.Connector import Connector
 
         bricklink_colors = Connector.get_piece_colors_with_stock(piece_type)
@@ -60,18 +74,115 @@ class Color:
         filtered_colors = [
             color
             for color in bricklink_colors
-            if color.type == Color.SOLID and color.stock > 10
+            if color.type == Color.SOLID and color.stock > Color.MIN_STOCK
         ]
-        best_dist = float("inf")
-        best_color = None
-        for bricklink_color in filtered_colors:
-            dist = CIEDE2000(color.lab, bricklink_color.lab_code)
-            if dist < best_dist:
-                best_dist = dist
-                best_color = bricklink_color
-        if best_color is None:
+        if not filtered_colors:
             raise RuntimeError("No Color constants found / supported formats.")
-        return best_color
+        return filtered_colors
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def get_palette_fingerprint(piece_type: Type) -> str:
+        filtered_colors = Color.get_filtered_colors(piece_type)
+        content = Color.FILTER_RULES + "|" + ",".join(
+            f"{c.id}:{c.hex_code}" for c in filtered_colors
+        )
+        return sha1(content.encode()).hexdigest()
+
+    @staticmethod
+    def get_closest_bricklink_color(color: BaseColor, piece_type: Type) -> "Color":
+        cache = Color.match_cache
+        filtered_colors = Color.get_filtered_colors(piece_type)
+        key = cache.key(color.lab, piece_type, Color.get_palette_fingerprint(piece_type))
+        index = cache.get(key)
+        if index is None:
+            lab = cache.quantize(color.lab)
+            index = int(Color.get_palette_index(piece_type).query(lab)[0])
+            cache.put(key, index)
+        return filtered_colors[index]
+
+    @staticmethod
+    def get_closest_bricklink_indices(labs, piece_type: Type) -> np.ndarray:
+        """
+        Batched version of `get_closest_bricklink_color` for an (N, 3) LAB array,
+        returns indices into `get_filtered_colors(piece_type)`.
+        Each distinct LAB value (snapped to the grid of a cache with a resolution) is
+        looked up once, cache misses are matched in one batch.
+        """
+        cache = Color.match_cache
+        fingerprint = Color.get_palette_fingerprint(piece_type)
+
+        quantized = cache.quantize(np.asarray(labs).reshape(-1, 3))
+        uniques, inverse = np.unique(quantized, axis=0, return_inverse=True)
+        keys = [cache.key(lab, piece_type, fingerprint) for lab in uniques]
+        resolved = [cache.get(key) for key in keys]
+
+        missing = [i for i, value in enumerate(resolved) if value is None]
+        if missing:
+            indices = Color.get_palette_index(piece_type).query(uniques[missing])
+            for i, index in zip(missing, indices):
+                resolved[i] = int(index)
+                cache.put(keys[i], resolved[i])
+
+        return np.array(resolved, dtype=np.intp)[inverse.reshape(-1)]
+
+    @staticmethod
+    def get_closest_bricklink_colors(labs, piece_type: Type) -> list["Color"]:
+        filtered_colors = Color.get_filtered_colors(piece_type)
+        indices = Color.get_closest_bricklink_indices(labs, piece_type)
+        return [filtered_colors[i] for i in indices]
+
+    @staticmethod
+    def get_capped_indices(
+        labs, piece_type: Type, caps: dict, max_per_color: int = None
+    ) -> tuple[np.ndarray, float, float]:
+        """
+        Closest colors for an (N, 3) LAB array when each color can only be used a limited
+        number of times. `caps` maps color ids or names to a maximum number of pieces.
+        Returns the indices, and the total CIEDE2000 error without and with the caps.
+        """
+        filtered_colors = Color.get_filtered_colors(piece_type)
+        cap_vector = np.full(len(filtered_colors), np.inf)
+        for i, c in enumerate(filtered_colors):
+            if max_per_color is not None:
+                cap_vector[i] = max_per_color
+            for key in (c.id, str(c.id), c.name):
+                if key in caps:
+                    cap_vector[i] = min(cap_vector[i], caps[key])
+
+        # identical pixels are grouped, the solver moves whole groups when it can
+        quantized = Color.match_cache.quantize(np.asarray(labs).reshape(-1, 3))
+        uniques, inverse, weights = np.unique(
+            quantized, axis=0, return_inverse=True, return_counts=True
+        )
+        inverse = inverse.reshape(-1)
+        palette = np.array([c.lab_code for c in filtered_colors])
+        distances = CIEDE2000_matrix(uniques, palette)
+        flows = CappedAssignment.solve(distances, weights, cap_vector)
+
+        indices = np.empty(len(inverse), dtype=np.intp)
+        order = np.argsort(inverse, kind="stable")
+        starts = np.concatenate([[0], np.cumsum(weights)])
+        for group in range(len(uniques)):
+            pixels = order[starts[group] : starts[group + 1]]
+            indices[pixels] = np.repeat(np.arange(len(palette)), flows[group])
+
+        base_error = float((distances.min(axis=1) * weights).sum())
+        capped_error = float((distances * flows).sum())
+        return indices, base_error, capped_error
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def get_palette_index(piece_type: Type) -> PaletteIndex:
+        filtered_colors = Color.get_filtered_colors(piece_type)
+        return PaletteIndex([c.lab_code for c in filtered_colors])
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def get_palette_lut(piece_type: Type) -> PaletteLUT:
+        return PaletteLUT(
+            piece_type, Color.get_filtered_colors(piece_type), Color.FILTER_RULES
+        )
 
     @staticmethod
     @lru_cache(maxsize=256)
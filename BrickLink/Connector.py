@@ -1,22 +1,29 @@
+from __future__ import annotations
 from Brick.Piece import Piece
 from Brick.Type import Type
-import requests
-from bs4 import BeautifulSoup
-import re
 from functools import lru_cache
 from urllib.parse import urlencode, quote
 from json import dumps
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-import time
+from threading import RLock
+from BrickLink.BrowserPool import BrowserPool
+from BrickLink.StockCache import StockCache
+from BrickLink.Catalog import Catalog
+from BrickLink.CatalogParser import CatalogParser
 from BrickLink.Wishlist import Wishlist
 from BrickLink.Color import Color as BrickLinkColor
+from Profiler import Profiler
+from typing import TYPE_CHECKING
 import json
 
+if TYPE_CHECKING:
+    import requests
+
 
 class Connector:
     buy_url = "https://www.bricklink.com/v2/catalog/catalogitem.page"
     color_url = "https://v2.bricklink.com/en-fr/catalog/color-guide"
+    wanted_url = "https://www.bricklink.com/ajax/clone/wanted"
+    wishlist_chunk_size = 100
     headers = {
         "User-Agent": (
             "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
@@ -24,12 +31,36 @@ class Connector:
             "Chrome/130.0.0.0 Safari/537.36"
         ),
     }
+    browser_pool_size = BrowserPool.DEFAULT_SIZE
+    _browser_pool = None
+    # stock lookups go through the on-disk cache first
+    stock_ttl = StockCache.DEFAULT_TTL
+    offline = False
+    refresh_stock = False
+    _stock_cache = None
+    # color guides come from the local catalog snapshot unless refreshed
+    refresh_catalog = False
+    catalog_max_age = Catalog.DEFAULT_MAX_AGE
+    catalog_parser = "auto"
+    _catalog = None
+    _session = None
+    # server and stock lookup threads may create the shared objects at the same time
+    _lock = RLock()
 
     @staticmethod
     def get_piece_price(piece: Piece) -> float:
+        import requests
+
         url = f"{Connector.buy_url}{piece.id}"
-        response = requests.get(url)
-        soup = BeautifulSoup(response.text, "html.parser")
+        with Profiler.request("price"):
+            response = requests.get(url)
+        return Connector.parse_piece_price(response.text)
+
+    @staticmethod
+    def parse_piece_price(html: str) -> float:
+        from bs4 import BeautifulSoup
+
+        soup = BeautifulSoup(html, "html.parser")
 
         # Find the price element in the HTML (this is an example, actual implementation may vary)
         price_element = soup.find("span", class_="price")
@@ -51,113 +82,280 @@ class Connector:
         return f"{cls.buy_url}?{urlencode(query_params)}#T=S&C={color_id}&O={fragment_encoded}"
 
     @classmethod
-    @lru_cache(maxsize=None)
-    def get_piece_stock(
-        cls, ref: Type, color_id: int, quantity: int
-    ) -> tuple[int, str]:
-        options = Options()
-        options.add_argument("--headless=new")
-        options.add_argument("--disable-gpu")
+    def get_browser_pool(cls) -> BrowserPool:
+        if cls._browser_pool is None:
+            with cls._lock:
+                if cls._browser_pool is None:
+                    cls._browser_pool = BrowserPool(cls.browser_pool_size)
+        return cls._browser_pool
 
-        driver = webdriver.Chrome(options=options)
+    @classmethod
+    def get_stock_cache(cls) -> StockCache:
+        if cls._stock_cache is None:
+            with cls._lock:
+                if cls._stock_cache is None:
+                    cls._stock_cache = StockCache(ttl=cls.stock_ttl)
+        return cls._stock_cache
 
-        url = cls.get_bricklink_url(ref, color_id, quantity)
-        driver.get(url)
-        time.sleep(3)  # Wait for JS to load
+    @classmethod
+    def get_session(cls) -> requests.Session:
+        """
+        Shared keep-alive session. Failed connections and 429/5xx answers are retried
+        with backoff, a request that may have reached the server is never replayed:
+        POSTs are only retried on 429, a 5xx may come after the lots were added.
+        """
+        if cls._session is None:
+            with cls._lock:
+                if cls._session is None:
+                    cls._session = cls._create_session()
+        return cls._session
 
-        html = driver.page_source
-        driver.quit()
+    @classmethod
+    def _create_session(cls) -> requests.Session:
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
 
-        soup = BeautifulSoup(html, "html.parser")
-        element = soup.find("span", {"id": "_idtxtTotalFound"})
-        if element and element.text.strip():
-            text = element.text.strip()
-            number = int(text.split()[0].replace(",", ""))
-            return number, url
+        class IdempotentRetry(Retry):
+            def is_retry(self, method, status_code, has_retry_after=False):
+                if method.upper() not in Retry.DEFAULT_ALLOWED_METHODS and status_code != 429:
+                    return False
+                return super().is_retry(method, status_code, has_retry_after)
 
-        return 0, url
+        retry = IdempotentRetry(
+            total=3,
+            connect=3,
+            read=0,
+            status=3,
+            status_forcelist=(429, 502, 503, 504),
+            allowed_methods=None,
+            backoff_factor=0.5,
+        )
+        session = requests.Session()
+        session.headers.update(cls.headers)
+        session.mount("https://", HTTPAdapter(max_retries=retry))
+        session.mount("http://", HTTPAdapter(max_retries=retry))
+        return session
+
+    @classmethod
+    def close(cls) -> None:
+        with cls._lock:
+            if cls._session is not None:
+                cls._session.close()
+                cls._session = None
+            if cls._browser_pool is not None:
+                cls._browser_pool.close()
+                cls._browser_pool = None
+            if cls._stock_cache is not None:
+                cls._stock_cache.close()
+                cls._stock_cache = None
 
     @staticmethod
-    @lru_cache(maxsize=None)
-    def get_piece_colors_with_stock(ref: Type) -> list[BrickLinkColor]:
-        url = f"{Connector.buy_url}?P={ref}#T=C"
-        response = requests.get(url, headers=Connector.headers)
-        soup = BeautifulSoup(response.text, "html.parser")
+    def _parse_stock(text: str | None) -> int | None:
+        """
+        Lot count from the "N items" text, None when the page never showed it.
+        """
+        words = text.split() if text else []
+        count = words[0].replace(",", "") if words else ""
+        return int(count) if count.isdigit() else None
+
+    @classmethod
+    def get_piece_stock(
+        cls, ref: Type, color_id: int, quantity: int
+    ) -> tuple[int | None, str]:
+        return cls.get_pieces_stock([(ref, color_id, quantity)])[0]
+
+    @classmethod
+    def get_pieces_stock(
+        cls, lookups: list[tuple[Type, int, int]]
+    ) -> list[tuple[int | None, str]]:
+        """
+        Lot count and quantity-specific URL for several (ref, color_id, quantity) lookups.
+        Counts come from the stock cache, missing or expired ones are scraped in parallel
+        across the browser pool. Offline, expired entries are used and missing ones are None.
+        """
+        stocks, missing = cls._get_cached_stock(lookups)
+        if missing and not cls.offline:
+            # every lot for the color, whatever the quantity needed
+            urls = [cls.get_bricklink_url(ref, color_id, 1) for ref, color_id in missing]
+            texts = cls.get_browser_pool().map_element_text(urls, "_idtxtTotalFound")
+            for (ref, color_id), text in zip(missing, texts):
+                stocks[(ref, color_id)] = cls._store_stock(ref, color_id, text)
 
-        colors = []
+        return cls._stock_results(lookups, stocks)
 
-        lots_div = soup.find(
-            "div", class_="pciColorTitle", string=lambda s: s and "Lots For Sale:" in s
+    @classmethod
+    def _get_cached_stock(
+        cls, lookups: list[tuple[Type, int, int]]
+    ) -> tuple[dict, list[tuple[Type, int]]]:
+        """
+        Cached lot counts by (ref, color_id), and the distinct pairs still to scrape.
+        """
+        cache = cls.get_stock_cache()
+        stocks = {}
+        for ref, color_id, _ in lookups:
+            if cls.refresh_stock and not cls.offline:
+                continue
+            lots = cache.get(ref, color_id, allow_stale=cls.offline)
+            if lots is not None:
+                stocks[(ref, color_id)] = lots
+        Profiler.count("stock", hits=len(stocks), misses=len(lookups) - len(stocks))
+
+        missing = list(
+            dict.fromkeys(
+                (ref, color_id)
+                for ref, color_id, _ in lookups
+                if (ref, color_id) not in stocks
+            )
         )
-        if lots_div:
-            td_parent = lots_div.find_parent("td")
-            for flex_div in td_parent.find_all(
-                "div", style=lambda s: s and "display:flex" in s
-            ):
-                color_div = flex_div.find("div", class_="pciColorTabListItem")
-                text_div = color_div.find_next_sibling("div") if color_div else None
-                if not text_div:
-                    continue
-
-                a_tag = text_div.find(lambda t: t.name and t.name.lower() == "a")
-                if not a_tag:
-                    continue
-
-                style = color_div.get("style", "")
-                match_color = re.search(r"#([0-9A-Fa-f]{6})", style)
-                color_hex = match_color.group(1) if match_color else None
-
-                onclick = a_tag.get("onclick", "")
-                match_id = re.search(
-                    r"showInventoryWithColor\(\s*(\d+)\s*\)", onclick, re.IGNORECASE
-                )
-                color_id = int(match_id.group(1)) if match_id else None
-
-                color_name = a_tag.get_text(strip=True)
-                text = text_div.get_text(strip=True)
-                match_stock = re.search(r"\((\d+)\)", text)
-                color_stock = int(match_stock.group(1)) if match_stock else None
-
-                if color_hex:
-                    # Used to filter for the first line 'Non Applicable'
-                    colors.append(
-                        BrickLinkColor(color_id, color_name, color_hex, color_stock)
-                    )
+        return stocks, missing
+
+    @classmethod
+    def _store_stock(cls, ref: Type, color_id: int, text: str | None) -> int | None:
+        lots = cls._parse_stock(text)
+        # a timed out page is unknown, not out of stock, and is scraped again next time
+        if lots is not None:
+            cls.get_stock_cache().put(ref, color_id, lots)
+        return lots
+
+    @classmethod
+    def _stock_results(
+        cls, lookups: list[tuple[Type, int, int]], stocks: dict
+    ) -> list[tuple[int | None, str]]:
+        return [
+            (stocks.get((ref, color_id)), cls.get_bricklink_url(ref, color_id, quantity))
+            for ref, color_id, quantity in lookups
+        ]
+
+    @classmethod
+    def get_catalog(cls) -> Catalog:
+        if cls._catalog is None:
+            with cls._lock:
+                if cls._catalog is None:
+                    cls._catalog = Catalog(max_age=cls.catalog_max_age)
+        return cls._catalog
+
+    @classmethod
+    def get_snapshot_colors(cls, ref: Type) -> list[BrickLinkColor] | None:
+        """
+        Colors of the part from the catalog snapshot, None if they must be downloaded.
+        Offline, stale parts are used as they are.
+        """
+        catalog = cls.get_catalog()
+        colors = None if cls.refresh_catalog else catalog.get_colors(ref, allow_stale=cls.offline)
+        Profiler.count("catalog", hits=colors is not None, misses=colors is None)
+        if colors is None and cls.offline:
+            raise RuntimeError(
+                f"Part {ref} is not in the catalog snapshot {catalog.path}, run once without --offline"
+            )
+        return colors
+
+    @classmethod
+    @lru_cache(maxsize=None)
+    def get_piece_colors_with_stock(cls, ref: Type) -> list[BrickLinkColor]:
+        colors = cls.get_snapshot_colors(ref)
+        if colors is None:
+            colors = cls.store_colors(ref, cls.fetch_piece_colors_with_stock(ref))
         return colors
 
+    @classmethod
+    def store_colors(cls, ref: Type, colors: list[BrickLinkColor]) -> list[BrickLinkColor]:
+        """
+        Save downloaded colors to the snapshot. A page without colors is not saved,
+        the previous snapshot of the part is used instead, however old.
+        """
+        catalog = cls.get_catalog()
+        if colors:
+            catalog.put_colors(ref, colors)
+            return colors
+        previous = catalog.get_colors(ref, allow_stale=True)
+        if previous:
+            print(f"No colors found on the color guide of part {ref}, using the saved snapshot")
+            return previous
+        return colors
+
+    @classmethod
+    def get_colors_url(cls, ref: Type) -> str:
+        return f"{cls.buy_url}?P={ref}#T=C"
+
+    @staticmethod
+    def fetch_piece_colors_with_stock(ref: Type) -> list[BrickLinkColor]:
+        import requests
+
+        with Profiler.request("catalog"):
+            response = requests.get(
+                Connector.get_colors_url(ref), headers=Connector.headers
+            )
+        return Connector.parse_piece_colors_with_stock(response.text)
+
+    @classmethod
+    def parse_piece_colors_with_stock(cls, html: str) -> list[BrickLinkColor]:
+        return CatalogParser.parse(html, cls.catalog_parser)
+
     @staticmethod
     def get_wishlist_url(wishlist: Wishlist) -> str:
         return f"https://www.bricklink.com/v2/wanted/search.page?wantedMoreID={wishlist.id}"
 
-    @staticmethod
-    def create_wishlist(name: str, description: str = None, jwt: str = None) -> str:
-        url = "https://www.bricklink.com/ajax/clone/wanted/editList.ajax"
+    @classmethod
+    def create_wishlist(
+        cls, name: str, description: str = None, jwt: str = None
+    ) -> Wishlist:
+        url = f"{cls.wanted_url}/editList.ajax"
         data = {"wantedMoreName": name, "wantedMoreDesc": description, "action": "C"}
         cookies = {"bricklink.bricklink-account.jwt": jwt}
-        response = requests.post(
-            url, data=data, cookies=cookies, headers=Connector.headers
+        with Profiler.request("wishlist_create"):
+            response = cls.get_session().post(url, data=data, cookies=cookies)
+        return cls._parse_created_wishlist(
+            response.status_code, response.content, name, description
         )
-        if response.status_code == 200:
-            result = response.json()
+
+    @staticmethod
+    def _parse_created_wishlist(
+        status_code: int, content: bytes, name: str, description: str = None
+    ) -> Wishlist:
+        if status_code == 200:
+            result = json.loads(content)
             id = result.get("wantedMoreID")
             if not id:
                 raise Exception(
-                    f"An error occured while creating wishlist : [{response.status_code}] {result.get('returnMessage', response.content)}"
+                    f"An error occured while creating wishlist : [{status_code}] {result.get('returnMessage', content)}"
                 )
 
             return Wishlist(id, name, description)
         else:
             raise Exception(
-                f"An error occured while creating wishlist : [{response.status_code}] {response.content}"
+                f"An error occured while creating wishlist : [{status_code}] {content}"
             )
 
-    @staticmethod
+    @classmethod
     def add_piece_to_wishlist(
-        wishlist: Wishlist, piece: Piece, quantity: int, jwt: str = None
-    ) -> bool:
-        url = "https://www.bricklink.com/ajax/clone/wanted/add.ajax"
+        cls, wishlist: Wishlist, piece: Piece, quantity: int, jwt: str = None
+    ) -> None:
+        cls.add_pieces_to_wishlist(wishlist, [(piece, quantity)], jwt)
+
+    @classmethod
+    def add_pieces_to_wishlist(
+        cls, wishlist: Wishlist, pieces: list[tuple[Piece, int]], jwt: str = None
+    ) -> None:
+        """
+        Add every (piece, quantity) lot to the wishlist, `wishlist_chunk_size` lots per request.
+        """
+        url = f"{cls.wanted_url}/add.ajax"
+        cookies = {"bricklink.bricklink-account.jwt": jwt}
+        headers = {"Content-Type": "application/x-www-form-urlencoded; charset=UTF-8"}
+
+        for data in cls._wanted_payloads(wishlist, pieces):
+            with Profiler.request("wishlist_add"):
+                response = cls.get_session().post(
+                    url, data=data, cookies=cookies, headers=headers
+                )
+            cls._check_wanted_response(response.status_code, response.content)
 
-        wanted_item = [
+    @classmethod
+    def _wanted_payloads(
+        cls, wishlist: Wishlist, pieces: list[tuple[Piece, int]]
+    ) -> list[dict]:
+        wanted_items = [
             {
                 "itemID": piece.id,
                 "colorID": piece.color.id,
@@ -168,22 +366,27 @@ class Connector:
                 "wantedRemarks": None,
                 "wantedPrice": None,
             }
+            for piece, quantity in pieces
         ]
 
-        data = {
-            "wantedItemStr": json.dumps(wanted_item),
-            "wantedMoreID": wishlist.id,
-            "sourceLocation": 1300,
-        }
-
-        cookies = {"bricklink.bricklink-account.jwt": jwt}
-
-        headers = Connector.headers
-        headers["Content-Type"] = "application/x-www-form-urlencoded; charset=UTF-8"
-
-        response = requests.post(url, data=data, cookies=cookies, headers=headers)
+        return [
+            {
+                "wantedItemStr": json.dumps(
+                    wanted_items[start : start + cls.wishlist_chunk_size]
+                ),
+                "wantedMoreID": wishlist.id,
+                "sourceLocation": 1300,
+            }
+            for start in range(0, len(wanted_items), cls.wishlist_chunk_size)
+        ]
 
-        if response.status_code != 200 or response.json().get("returnCode") != 0:
+    @staticmethod
+    def _check_wanted_response(status_code: int, content: bytes) -> None:
+        try:
+            return_code = json.loads(content).get("returnCode")
+        except ValueError:
+            return_code = None
+        if status_code != 200 or return_code != 0:
             raise Exception(
-                f"An error occured when adding an item to wishlist : [{response.status_code}] {response.content}."
+                f"An error occured when adding an item to wishlist : [{status_code}] {content}."
             )
@@ -10,3 +10,21 @@ class Item:
     BASEPLATE_32_32 = "710"
     BASEPLATE_40_40 = None  # not found
     BASEPLATE_48_48 = "824"
+    # not found yet, Optimizer.merge_parts leaves these sizes out until they are filled in
+    PLATE_1_2 = None
+    PLATE_1_3 = None
+    PLATE_1_4 = None
+    PLATE_1_6 = None
+    PLATE_1_8 = None
+    PLATE_2_2 = None
+    PLATE_2_3 = None
+    PLATE_2_4 = None
+    PLATE_2_6 = None
+    PLATE_2_8 = None
+    TILE_1_2 = None
+    TILE_1_3 = None
+    TILE_1_4 = None
+    TILE_1_6 = None
+    TILE_1_8 = None
+    TILE_2_2 = None
+    TILE_2_4 = None
@@ -0,0 +1,62 @@
+from collections import OrderedDict, namedtuple
+import numpy as np
+
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+
+class MatchCache:
+    """
+    Bounded LRU cache of palette matches, keyed by LAB value, piece type and palette
+    fingerprint. By default keys are exact and matches stay exact CIEDE2000; with a
+    `resolution`, LAB values are snapped to a grid of that step before matching, so
+    more pixels share an entry at the cost of exactness.
+    """
+
+    def __init__(self, resolution: float = None, maxsize: int = 65536):
+        if resolution is not None and resolution <= 0:
+            raise ValueError(f"resolution must be positive, got {resolution}")
+        self.resolution = resolution
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def quantize(self, labs) -> np.ndarray:
+        """
+        Snap LAB values to the cache grid, the result is the value actually matched.
+        """
+        labs = np.asarray(labs, dtype=np.float64)
+        if self.resolution is None:
+            return labs
+        return np.round(labs / self.resolution) * self.resolution
+
+    def key(self, lab, piece_type: str, fingerprint: str) -> tuple:
+        if self.resolution is None:
+            cell = tuple(float(v) for v in np.asarray(lab, dtype=np.float64))
+        else:
+            cell = tuple(int(v) for v in np.round(np.asarray(lab) / self.resolution))
+        return (cell, piece_type, fingerprint)
+
+    def get(self, key: tuple):
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: tuple, value) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._entries))
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
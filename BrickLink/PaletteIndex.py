@@ -0,0 +1,86 @@
+import numpy as np
+from Color import CIEDE2000_matrix, CIEDE2000_pairs
+
+
+class PaletteIndex:
+    """
+    Nearest palette color search that skips most CIEDE2000 evaluations.
+
+    A few candidates picked by Euclidean distance (delta E 1976) give an upper bound
+    on the best CIEDE2000 distance. CIEDE2000 is at least |dL| / S_L, and S_L is
+    bounded by the lightness range, so every palette color whose lightness is too far
+    away is pruned without being evaluated. The winner is the same as an exhaustive scan.
+
+    Pruning saves CIEDE2000 evaluations, not memory: every chunk of rows still builds
+    dense (rows, palette) Euclidean, bound and distance arrays.
+    """
+
+    # rows matched at once, the (rows, palette) work arrays grow with it, not with the image
+    chunk_size = 4096
+
+    def __init__(self, palette_labs, seeds: int = 3):
+        self.palette = np.asarray(palette_labs, dtype=np.float64).reshape(-1, 3)
+        if not len(self.palette):
+            raise ValueError("Cannot index an empty palette")
+        self.seeds = min(seeds, len(self.palette))
+        self.evaluated = 0
+        self.total = 0
+
+    @staticmethod
+    def _max_S_L(lightness: np.ndarray) -> float:
+        # S_L grows with |L_ave - 50| and L_ave lies between the two compared lightnesses
+        Lm50s = float(np.max(np.abs(lightness - 50))) ** 2
+        return 1 + 0.015 * Lm50s / np.sqrt(20 + Lm50s)
+
+    def query(self, labs) -> np.ndarray:
+        """
+        Index of the nearest palette entry (CIEDE2000) for every row of an (N, 3) LAB array.
+        """
+        labs = np.asarray(labs, dtype=np.float64).reshape(-1, 3)
+        if len(labs) > self.chunk_size:
+            return np.concatenate(
+                [
+                    self.query(labs[start : start + self.chunk_size])
+                    for start in range(0, len(labs), self.chunk_size)
+                ]
+            )
+        n, k = len(labs), len(self.palette)
+        if not n:
+            return np.empty(0, dtype=np.intp)
+
+        # upper bound: exact distance to the closest colors in delta E 1976
+        euclidean = ((labs[:, None, :] - self.palette[None, :, :]) ** 2).sum(axis=2)
+        seeds = np.argpartition(euclidean, self.seeds - 1, axis=1)[:, : self.seeds]
+        rows = np.repeat(np.arange(n), self.seeds)
+        seed_dist = CIEDE2000_pairs(labs[rows], self.palette[seeds.reshape(-1)])
+        upper = seed_dist.reshape(n, self.seeds).min(axis=1)
+
+        # lower bound from lightness only, kept strict so pruned colors can never tie
+        max_S_L = self._max_S_L(np.concatenate([labs[:, 0], self.palette[:, 0]]))
+        lower = np.abs(labs[:, 0:1] - self.palette[None, :, 0]) / max_S_L
+        candidates = lower <= upper[:, None] * (1 + 1e-9) + 1e-9
+
+        cand_rows, cand_cols = np.nonzero(candidates)
+        distances = np.full((n, k), np.inf)
+        distances[cand_rows, cand_cols] = CIEDE2000_pairs(
+            labs[cand_rows], self.palette[cand_cols]
+        )
+
+        self.evaluated += len(cand_rows) + len(rows)
+        self.total += n * k
+        return np.argmin(distances, axis=1)
+
+    def verify(self, samples: int = 10000, seed: int = 0) -> bool:
+        """
+        Check on random LAB values that the index returns the exhaustive scan winner.
+        """
+        rng = np.random.default_rng(seed)
+        labs = np.column_stack(
+            [
+                rng.uniform(0, 100, samples),
+                rng.uniform(-128, 128, samples),
+                rng.uniform(-128, 128, samples),
+            ]
+        )
+        exhaustive = np.argmin(CIEDE2000_matrix(labs, self.palette), axis=1)
+        return bool(np.array_equal(self.query(labs), exhaustive))
@@ -0,0 +1,109 @@
+from pathlib import Path
+from hashlib import sha1
+import numpy as np
+from Brick.Type import Type
+from Cache import get_cache_dir
+from Color import CIEDE2000_matrix, closest_palette_indices
+
+
+class PaletteLUT:
+    """
+    RGB -> palette index lookup table, one uint8 cell per quantized RGB value.
+    Stored on disk under a hash of the palette and its filter rules.
+    """
+
+    chunk_size = 16384
+
+    def __init__(self, piece_type: Type, palette: list, filter_rules: str, bits: int = 6):
+        if not 1 <= bits <= 8:
+            raise ValueError(f"bits must be between 1 and 8, got {bits}")
+        if len(palette) > 256:
+            raise ValueError(f"palette too large for uint8 indices: {len(palette)}")
+        self.piece_type = piece_type
+        self.palette = palette
+        self.filter_rules = filter_rules
+        self.bits = bits
+        self.table = None
+
+    @property
+    def fingerprint(self) -> str:
+        content = "|".join(
+            [
+                str(self.piece_type),
+                self.filter_rules,
+                str(self.bits),
+                ",".join(c.hex_code.upper() for c in self.palette),
+            ]
+        )
+        return sha1(content.encode()).hexdigest()
+
+    @property
+    def path(self) -> Path:
+        return get_cache_dir("lut") / f"{self.fingerprint}.npy"
+
+    def _cell_centers(self) -> np.ndarray:
+        """
+        RGB value (0-255) at the center of every cell, in table order.
+        """
+        step = 1 << (8 - self.bits)
+        axis = np.arange(1 << self.bits) * step + (step - 1) / 2
+        r, g, b = np.meshgrid(axis, axis, axis, indexing="ij")
+        return np.stack([r, g, b], axis=-1).reshape(-1, 3)
+
+    def _palette_lab(self) -> np.ndarray:
+        return np.array([c.lab_code for c in self.palette])
+
+    def build(self) -> np.ndarray:
+        from skimage import color
+
+        centers = self._cell_centers()
+        labs = color.rgb2lab(centers / 255)
+        palette = self._palette_lab()
+        table = np.empty(len(labs), dtype=np.uint8)
+        for start in range(0, len(labs), self.chunk_size):
+            chunk = labs[start : start + self.chunk_size]
+            table[start : start + len(chunk)] = closest_palette_indices(chunk, palette)
+        side = 1 << self.bits
+        self.table = table.reshape(side, side, side)
+        np.save(self.path, self.table)
+        return self.table
+
+    def load(self, rebuild: bool = False) -> np.ndarray:
+        path = self.path
+        if not rebuild and path.is_file():
+            self.table = np.load(path)
+        else:
+            self.table = self.build()
+        return self.table
+
+    def lookup(self, rgb) -> np.ndarray:
+        """
+        Palette indices for a uint8 RGB array of any shape (..., 3).
+        """
+        if self.table is None:
+            self.load()
+        cells = np.asarray(rgb, dtype=np.uint8) >> (8 - self.bits)
+        return self.table[cells[..., 0], cells[..., 1], cells[..., 2]]
+
+    def verify(self, samples: int = 10000, seed: int = 0) -> dict:
+        """
+        Compare the table against an exact CIEDE2000 scan on random RGB values.
+        Returns the agreement rate and the worst extra error caused by the table.
+        """
+        from skimage import color
+
+        rng = np.random.default_rng(seed)
+        rgb = rng.integers(0, 256, size=(samples, 3), dtype=np.uint8)
+        labs = color.rgb2lab(rgb / 255)
+        distances = CIEDE2000_matrix(labs, self._palette_lab())
+
+        exact = np.argmin(distances, axis=1)
+        approx = self.lookup(rgb)
+        rows = np.arange(samples)
+        extra = distances[rows, approx] - distances[rows, exact]
+        return {
+            "samples": samples,
+            "agreement": float(np.mean(exact == approx)),
+            "max_extra_delta_e": float(extra.max()),
+            "mean_extra_delta_e": float(extra.mean()),
+        }
@@ -0,0 +1,59 @@
+import sqlite3
+import time
+from pathlib import Path
+from threading import Lock
+from Cache import get_cache_dir
+
+
+class StockCache:
+    """
+    On-disk cache of BrickLink lot counts, keyed by part and color.
+    """
+
+    DEFAULT_TTL = 24 * 3600
+
+    def __init__(self, path: Path = None, ttl: float = DEFAULT_TTL):
+        self.path = path or get_cache_dir("stock") / "stock.sqlite3"
+        self.ttl = ttl
+        self._lock = Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS stock ("
+                " ref TEXT NOT NULL,"
+                " color_id TEXT NOT NULL,"
+                " lots INTEGER NOT NULL,"
+                " fetched_at REAL NOT NULL,"
+                " PRIMARY KEY (ref, color_id))"
+            )
+
+    def get(self, ref: str, color_id: int, allow_stale: bool = False) -> int | None:
+        """
+        Cached lot count, None if missing or older than the TTL (unless `allow_stale`).
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT lots, fetched_at FROM stock WHERE ref = ? AND color_id = ?",
+                (str(ref), str(color_id)),
+            ).fetchone()
+        if row is None:
+            return None
+        lots, fetched_at = row
+        if not allow_stale and time.time() - fetched_at > self.ttl:
+            return None
+        return lots
+
+    def put(self, ref: str, color_id: int, lots: int) -> None:
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO stock (ref, color_id, lots, fetched_at) VALUES (?, ?, ?, ?)",
+                (str(ref), str(color_id), lots, time.time()),
+            )
+
+    def clear(self) -> None:
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM stock")
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
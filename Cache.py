@@ -0,0 +1,15 @@
+import os
+from pathlib import Path
+
+
+CACHE_DIR = Path(
+    os.environ.get(
+        "IMAGE_TO_LEGO_CACHE", Path.home() / ".cache" / "image-to-lego-board"
+    )
+)
+
+
+def get_cache_dir(name: str) -> Path:
+    path = CACHE_DIR / name
+    path.mkdir(parents=True, exist_ok=True)
+    return path
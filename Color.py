@@ -1,10 +1,17 @@
 import math
+import numpy as np
 
 
 class Color:
     def __init__(self, l: float, a: float, b: float):
         self.lab = (l, a, b)
 
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Color) and self.lab == other.lab
+
+    def __hash__(self) -> int:
+        return hash(self.lab)
+
 
 def CIEDE2000(Lab_1, Lab_2):
     """
@@ -98,3 +105,124 @@ def CIEDE2000(Lab_1, Lab_2):
 
     dE_00 = math.sqrt(f_L**2 + f_C**2 + f_H**2 + R_T * f_C * f_H)
     return dE_00
+
+
+def CIEDE2000_matrix(labs, palette):
+    """
+    Vectorized CIEDE2000, same formula as `CIEDE2000` above.
+    `labs` is an (N, 3) array, `palette` a (K, 3) array, returns the (N, K) distance matrix.
+    """
+    labs = np.asarray(labs, dtype=np.float64).reshape(-1, 3)
+    palette = np.asarray(palette, dtype=np.float64).reshape(-1, 3)
+    return _CIEDE2000_broadcast(labs[:, None, :], palette[None, :, :])
+
+
+def CIEDE2000_pairs(labs_1, labs_2):
+    """
+    Vectorized CIEDE2000 between matching rows of two (M, 3) arrays, returns M distances.
+    """
+    labs_1 = np.asarray(labs_1, dtype=np.float64).reshape(-1, 3)
+    labs_2 = np.asarray(labs_2, dtype=np.float64).reshape(-1, 3)
+    return _CIEDE2000_broadcast(labs_1, labs_2)
+
+
+def _CIEDE2000_broadcast(Lab_1, Lab_2):
+    C_25_7 = 6103515625
+
+    L1, a1, b1 = Lab_1[..., 0], Lab_1[..., 1], Lab_1[..., 2]
+    L2, a2, b2 = Lab_2[..., 0], Lab_2[..., 1], Lab_2[..., 2]
+    C1 = np.sqrt(a1**2 + b1**2)
+    C2 = np.sqrt(a2**2 + b2**2)
+    C_ave = (C1 + C2) / 2
+    G = 0.5 * (1 - np.sqrt(C_ave**7 / (C_ave**7 + C_25_7)))
+
+    L1_, L2_ = L1, L2
+    a1_, a2_ = (1 + G) * a1, (1 + G) * a2
+    b1_, b2_ = np.broadcast_to(b1, G.shape), np.broadcast_to(b2, G.shape)
+
+    C1_ = np.sqrt(a1_**2 + b1_**2)
+    C2_ = np.sqrt(a2_**2 + b2_**2)
+
+    def hue(a_, b_):
+        h = np.arctan2(b_, a_)
+        h = np.where(a_ >= 0, h, h + 2 * math.pi)
+        return np.where((b_ == 0) & (a_ == 0), 0.0, h)
+
+    h1_ = hue(a1_, b1_)
+    h2_ = hue(a2_, b2_)
+
+    dL_ = L2_ - L1_
+    dC_ = C2_ - C1_
+    dh_ = h2_ - h1_
+    C1C2 = C1_ * C2_
+    dh_ = np.where(
+        C1C2 == 0,
+        0.0,
+        np.where(
+            dh_ > math.pi,
+            dh_ - 2 * math.pi,
+            np.where(dh_ < -math.pi, dh_ + 2 * math.pi, dh_),
+        ),
+    )
+    dH_ = 2 * np.sqrt(C1C2) * np.sin(dh_ / 2)
+
+    L_ave = (L1_ + L2_) / 2
+    C_ave = (C1_ + C2_) / 2
+
+    _dh = np.abs(h1_ - h2_)
+    _sh = h1_ + h2_
+
+    h_ave = np.where(
+        C1C2 == 0,
+        h1_ + h2_,
+        np.where(
+            _dh <= math.pi,
+            (h1_ + h2_) / 2,
+            np.where(
+                _sh < 2 * math.pi,
+                (h1_ + h2_) / 2 + math.pi,
+                (h1_ + h2_) / 2 - math.pi,
+            ),
+        ),
+    )
+
+    T = (
+        1
+        - 0.17 * np.cos(h_ave - math.pi / 6)
+        + 0.24 * np.cos(2 * h_ave)
+        + 0.32 * np.cos(3 * h_ave + math.pi / 30)
+        - 0.2 * np.cos(4 * h_ave - 63 * math.pi / 180)
+    )
+
+    h_ave_deg = h_ave * 180 / math.pi
+    h_ave_deg = np.where(
+        h_ave_deg < 0,
+        h_ave_deg + 360,
+        np.where(h_ave_deg > 360, h_ave_deg - 360, h_ave_deg),
+    )
+    dTheta = 30 * np.exp(-(((h_ave_deg - 275) / 25) ** 2))
+
+    R_C = 2 * np.sqrt(C_ave**7 / (C_ave**7 + C_25_7))
+    S_C = 1 + 0.045 * C_ave
+    S_H = 1 + 0.015 * C_ave * T
+
+    Lm50s = (L_ave - 50) ** 2
+    S_L = 1 + 0.015 * Lm50s / np.sqrt(20 + Lm50s)
+    R_T = -np.sin(dTheta * math.pi / 90) * R_C
+
+    k_L, k_C, k_H = 1, 1, 1
+
+    f_L = dL_ / k_L / S_L
+    f_C = dC_ / k_C / S_C
+    f_H = dH_ / k_H / S_H
+
+    dE_00 = np.sqrt(f_L**2 + f_C**2 + f_H**2 + R_T * f_C * f_H)
+    return dE_00
+
+
+def closest_palette_indices(labs, palette) -> "np.ndarray":
+    """
+    Index of the nearest palette entry (CIEDE2000) for every LAB value in `labs`.
+    Ties resolve to the first palette entry, like the scalar scan.
+    """
+    return np.argmin(CIEDE2000_matrix(labs, palette), axis=1)
@@ -0,0 +1,139 @@
+import math
+from functools import lru_cache
+import numpy as np
+from Color import CIEDE2000
+
+
+METHODS = ("bayer", "rows", "floyd-steinberg")
+
+
+def bayer_matrix(size: int) -> np.ndarray:
+    """
+    Ordered dithering thresholds in [0, 1) for a power of two `size`.
+    """
+    matrix = np.zeros((1, 1))
+    while matrix.shape[0] < size:
+        matrix = np.block(
+            [[4 * matrix, 4 * matrix + 2], [4 * matrix + 3, 4 * matrix + 1]]
+        )
+    return matrix / matrix.size
+
+
+def palette_spacing(palette) -> float:
+    """
+    Median distance (delta E 1976) from each palette color to its nearest neighbour.
+    """
+    palette = np.asarray(palette, dtype=np.float64)
+    if len(palette) < 2:
+        return 0.0
+    distances = np.sqrt(((palette[:, None] - palette[None, :]) ** 2).sum(axis=2))
+    np.fill_diagonal(distances, np.inf)
+    return float(np.median(distances.min(axis=1)))
+
+
+def ordered_dither(labs, palette, nearest, strength: float = None, size: int = 4):
+    """
+    Bayer dithering of an (H, W, 3) LAB image, fully vectorized.
+    The lightness of each pixel is offset by its threshold times `strength` before the
+    nearest color is picked with `nearest`, a and b are left alone so the offsets never
+    shift hues. The default is a quarter of the palette spacing: BrickLink palettes are
+    dense around neutrals, larger offsets mostly add noise there.
+    """
+    labs = np.asarray(labs, dtype=np.float64)
+    h, w, _ = labs.shape
+    if strength is None:
+        strength = palette_spacing(palette) / 4
+    thresholds = np.tile(bayer_matrix(size), (h // size + 1, w // size + 1))[:h, :w]
+    offset = labs.copy()
+    offset[..., 0] += (thresholds - 0.5) * strength
+    return nearest(offset.reshape(-1, 3)).reshape(h, w)
+
+
+def row_error_diffusion(labs, palette, nearest):
+    """
+    Error diffusion where a pixel only passes its error to the next row
+    (1/4 down-left, 1/2 down, 1/4 down-right), so each row is matched in one call.
+    """
+    labs = np.asarray(labs, dtype=np.float64)
+    palette = np.asarray(palette, dtype=np.float64)
+    h, w, _ = labs.shape
+    indices = np.empty((h, w), dtype=np.intp)
+    error = np.zeros((w, 3))
+    for y in range(h):
+        values = labs[y] + error
+        indices[y] = nearest(values)
+        diff = values - palette[indices[y]]
+        error = diff / 2
+        error[1:] += diff[:-1] / 4
+        error[:-1] += diff[1:] / 4
+        # edges keep the share that would fall outside the board
+        error[0] += diff[0] / 4
+        error[-1] += diff[-1] / 4
+    return indices
+
+
+def _floyd_steinberg_kernel(distance):
+    def kernel(labs, palette, indices):
+        h, w = indices.shape
+        k = palette.shape[0]
+        work = labs.copy()
+        for y in range(h):
+            # serpentine scan: even rows left to right, odd rows right to left
+            step = 1 if y % 2 == 0 else -1
+            start = 0 if step == 1 else w - 1
+            for i in range(w):
+                x = start + i * step
+                best = 0
+                best_dist = math.inf
+                for c in range(k):
+                    dist = distance(work[y, x], palette[c])
+                    if dist < best_dist:
+                        best_dist = dist
+                        best = c
+                indices[y, x] = best
+                for j in range(3):
+                    e = work[y, x, j] - palette[best, j]
+                    if 0 <= x + step < w:
+                        work[y, x + step, j] += e * 7 / 16
+                    if y + 1 < h:
+                        if 0 <= x - step < w:
+                            work[y + 1, x - step, j] += e * 3 / 16
+                        work[y + 1, x, j] += e * 5 / 16
+                        if 0 <= x + step < w:
+                            work[y + 1, x + step, j] += e * 1 / 16
+        return indices
+
+    return kernel
+
+
+@lru_cache(maxsize=None)
+def get_floyd_steinberg_kernel():
+    """
+    The serial scan, compiled with numba on first use.
+    """
+    try:
+        from numba import njit
+    except ImportError:  # in requirements.txt, without it the scan runs in plain Python
+        return _floyd_steinberg_kernel(CIEDE2000)
+    return njit(cache=True)(_floyd_steinberg_kernel(njit(cache=True)(CIEDE2000)))
+
+
+def floyd_steinberg(labs, palette):
+    """
+    Serpentine Floyd-Steinberg error diffusion with exact CIEDE2000 matching.
+    The scan is serial, it is compiled with numba.
+    """
+    labs = np.ascontiguousarray(labs, dtype=np.float64)
+    palette = np.ascontiguousarray(palette, dtype=np.float64)
+    indices = np.empty(labs.shape[:2], dtype=np.intp)
+    return get_floyd_steinberg_kernel()(labs, palette, indices)
+
+
+def dither(method: str, labs, palette, nearest, strength: float = None) -> np.ndarray:
+    if method == "bayer":
+        return ordered_dither(labs, palette, nearest, strength)
+    if method == "rows":
+        return row_error_diffusion(labs, palette, nearest)
+    if method == "floyd-steinberg":
+        return floyd_steinberg(labs, palette)
+    raise ValueError(f"Unknown dithering method '{method}', must be one of {METHODS}")
@@ -0,0 +1,446 @@
+from __future__ import annotations
+from Brick.Type import Type
+from pathlib import Path
+from Profiler import Profiler
+from StageCache import StageCache
+from functools import lru_cache
+from typing import TYPE_CHECKING
+import time
+
+# Shared by the command line (main.py) and the service (Server.py), so both run the
+# same stages with one set of caches. Stages import their dependencies (NumPy,
+# scikit-image, PIL...) when they run, so --help returns without loading them
+if TYPE_CHECKING:
+    import numpy as np
+    from PIL import Image
+    from Brick.Board import Board
+    from Brick.Optimizer import Optimizer
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+PIECE_TYPES = {
+    "plate": Type.PLATE,
+    "plate_round": Type.PLATE_ROUND,
+    "slope": Type.SLOPE,
+    "tile": Type.TILE,
+}
+
+
+def peak_memory_mb() -> float | None:
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def load_image(
+    image_path: Path, size: tuple[int, int], large_input: int = 4_000_000
+) -> Image.Image:
+    """
+    Open and resize an image, letting the decoder downscale where the format allows it:
+    JPEG is decoded at a reduced scale with `draft()`, and `reduce()` runs before the
+    final LANCZOS resample (through `reducing_gap`), so memory follows the target size.
+    """
+    from PIL import Image
+
+    w, h = size
+    start = time.perf_counter()
+    img = Image.open(image_path)
+    source_size = img.size
+
+    # Keep at least 3 times the target resolution for the final resample
+    img.draft("RGB", (w * 3, h * 3))
+    decoded_size = img.size
+    img = img.convert("RGB").resize((w, h), Image.LANCZOS, reducing_gap=3.0)
+
+    if source_size[0] * source_size[1] >= large_input:
+        elapsed = time.perf_counter() - start
+        peak = peak_memory_mb()
+        peak_str = f", peak memory {peak:.0f} MB" if peak is not None else ""
+        print(
+            f"Decoded {source_size[0]}x{source_size[1]} image at "
+            f"{decoded_size[0]}x{decoded_size[1]} in {elapsed:.2f}s{peak_str}"
+        )
+    return img
+
+
+def load_lab(
+    image_path: Path, size: tuple[int, int], save_resized: bool = False
+) -> tuple[np.ndarray, np.ndarray, str | None]:
+    """
+    Resized RGB and LAB arrays of the image, and their stage cache key.
+    """
+    import numpy as np
+    from skimage import color
+
+    w, h = size
+    # each stage is looked up by the hash of its inputs, see StageCache
+    lab_key = None
+    if StageCache.enabled:
+        lab_key = StageCache.key(StageCache.hash_image(image_path), w, h)
+
+    with Profiler.stage("load_image"):
+        cached = StageCache.get_arrays("lab", lab_key)
+        if cached is not None:
+            rgb, pixels = cached["rgb"], cached["lab"]
+        else:
+            rgb = np.asarray(load_image(image_path, size))
+            pixels = color.rgb2lab(rgb)
+            StageCache.put_arrays("lab", lab_key, rgb=rgb, lab=pixels)
+        if save_resized:
+            from PIL import Image
+
+            resized_path = image_path.parent / f"{image_path.stem}_resized_{w}x{h}.png"
+            Image.fromarray(rgb).save(resized_path)
+    return rgb, pixels, lab_key
+
+
+def get_indices_key(
+    lab_key: str | None,
+    piece_type: Type,
+    use_lut: bool = False,
+    dither: str = None,
+    dither_strength: float = None,
+    caps: dict = None,
+    max_per_color: int = None,
+) -> str | None:
+    from BrickLink.Color import Color as BrickLinkColor
+
+    if lab_key is None:
+        return None
+    return StageCache.key(
+        lab_key,
+        piece_type,
+        BrickLinkColor.get_palette_fingerprint(piece_type),
+        BrickLinkColor.match_cache.resolution,
+        use_lut,
+        dither,
+        dither_strength,
+        sorted((str(k), v) for k, v in (caps or {}).items()),
+        max_per_color,
+    )
+
+
+def image_to_matrix(
+    image_path: Path,
+    size: tuple[int, int],
+    piece_type: Type,
+    use_lut: bool = False,
+    rebuild_lut: bool = False,
+    save_resized: bool = False,
+    caps: dict = None,
+    max_per_color: int = None,
+    dither: str = None,
+    dither_strength: float = None,
+    plate_size: int = None,
+) -> Board:
+    """
+    Board of the image resized to `size` studs. With a `plate_size`, a mural is matched
+    one baseplate at a time, except with dithering or caps: error diffusion and color
+    caps span the whole mural, so they still need all of it at once.
+    """
+    from Brick.Board import Board
+    from BrickLink.Color import Color as BrickLinkColor
+    from BrickLink.Item import Item
+
+    w, h = size
+    rgb, pixels, lab_key = load_lab(image_path, size, save_resized)
+
+    with Profiler.stage("palette"):
+        palette = BrickLinkColor.get_filtered_colors(piece_type)
+
+    capped = caps or max_per_color is not None
+    indices_key = None
+    if not rebuild_lut:
+        indices_key = get_indices_key(
+            lab_key, piece_type, use_lut, dither, dither_strength, caps, max_per_color
+        )
+    cached = StageCache.get_arrays("indices", indices_key)
+    if cached is not None:
+        indices = cached["indices"]
+        if capped:
+            base_error, capped_error = cached["errors"]
+    else:
+        if plate_size and not (dither or capped or rebuild_lut):
+            indices = match_plates(rgb, pixels, plate_size, piece_type, use_lut)
+            base_error = capped_error = float("nan")
+        else:
+            indices, base_error, capped_error = match_colors(
+                rgb, pixels, piece_type, use_lut, rebuild_lut, caps, max_per_color, dither, dither_strength
+            )
+        StageCache.put_arrays(
+            "indices", indices_key, indices=indices, errors=[base_error, capped_error]
+        )
+    if capped:
+        print(
+            f"Color caps added {capped_error - base_error:.1f} total CIEDE2000 error "
+            f"({base_error:.1f} -> {capped_error:.1f}, "
+            f"{(capped_error - base_error) / indices.size:.3f} per piece)"
+        )
+
+    return Board(indices.reshape(h, w), palette, piece_type, Item.PLATE)
+
+
+def match_plates(
+    rgb: np.ndarray, pixels: np.ndarray, plate_size: int, piece_type: Type, use_lut: bool = False
+) -> np.ndarray:
+    """
+    Palette indices of a mural matched one baseplate at a time, so the matching work
+    follows the baseplate size, not the mural size. The shared match cache still maps
+    each distinct color once for the whole mural.
+    """
+    import numpy as np
+
+    h, w = pixels.shape[:2]
+    indices = np.empty((h, w), dtype=np.intp)
+    for y in range(0, h, plate_size):
+        for x in range(0, w, plate_size):
+            plate = (slice(y, y + plate_size), slice(x, x + plate_size))
+            plate_indices, _, _ = match_colors(rgb[plate], pixels[plate], piece_type, use_lut)
+            indices[plate] = plate_indices.reshape(indices[plate].shape)
+    return indices.reshape(-1)
+
+
+def match_colors(
+    rgb: np.ndarray,
+    pixels: np.ndarray,
+    piece_type: Type,
+    use_lut: bool = False,
+    rebuild_lut: bool = False,
+    caps: dict = None,
+    max_per_color: int = None,
+    dither: str = None,
+    dither_strength: float = None,
+) -> tuple[np.ndarray, float, float]:
+    """
+    Palette indices of the pixels, and the total error without and with color caps
+    (NaN when no cap applies). With caps, the capped assignment replaces the nearest
+    color match, it starts from the nearest colors itself.
+    """
+    import numpy as np
+    from BrickLink.Color import Color as BrickLinkColor
+    import Dither
+
+    if caps or max_per_color is not None:
+        with Profiler.stage("color_caps"):
+            # reassign pixels of colors without enough supply to their next best colors
+            indices, base_error, capped_error = BrickLinkColor.get_capped_indices(
+                pixels.reshape(-1, 3), piece_type, caps or {}, max_per_color
+            )
+        return np.asarray(indices).reshape(-1), base_error, capped_error
+
+    with Profiler.stage("color_matching"):
+        if use_lut or rebuild_lut:
+            # one table lookup per pixel, the table is built once per palette
+            lut = BrickLinkColor.get_palette_lut(piece_type)
+            lut.load(rebuild=rebuild_lut)
+            if rebuild_lut:
+                report = lut.verify()
+                print(
+                    f"Lookup table rebuilt: {report['agreement']:.2%} agreement with CIEDE2000, "
+                    f"max extra error {report['max_extra_delta_e']:.2f}"
+                )
+            indices = lut.lookup(rgb)
+        elif dither:
+            palette = BrickLinkColor.get_filtered_colors(piece_type)
+            palette_labs = np.array([c.lab_code for c in palette], dtype=np.float64)
+            nearest = BrickLinkColor.get_palette_index(piece_type).query
+            indices = Dither.dither(dither, pixels, palette_labs, nearest, dither_strength)
+        else:
+            # transform colors for each pixel to nearest Lego color, in one batch
+            indices = BrickLinkColor.get_closest_bricklink_indices(
+                pixels.reshape(-1, 3), piece_type
+            )
+    return np.asarray(indices).reshape(-1), float("nan"), float("nan")
+
+
+@lru_cache(maxsize=None)
+def get_optimizer(piece_type: Type) -> Optimizer:
+    from Brick.Optimizer import Optimizer
+
+    return Optimizer.for_piece_type(piece_type)
+
+
+def optimize_board(
+    board: Board, piece_type: Type, time_budget: float = 0.5, plate_size: int = None
+) -> None:
+    """
+    Replace the 1x1 cells of the board by larger parts where colors and stock allow it.
+    """
+    optimizer = get_optimizer(piece_type)
+    if not optimizer.parts:
+        print(
+            f"No part larger than {piece_type} has a known BrickLink item id yet, "
+            "keeping 1x1 parts."
+        )
+    optimizer.time_budget = time_budget
+    start = time.perf_counter()
+    with Profiler.stage("merge_parts"):
+        board.placements = optimizer.optimize(board, plate_size)
+    print(
+        f"Merged {board.height * board.width} cells into {len(board.placements)} pieces "
+        f"in {time.perf_counter() - start:.2f}s"
+    )
+
+
+@lru_cache(maxsize=1024)
+def render_stud_tile(
+    rgb_code: tuple[int, int, int], stud_size: int, show_studs: bool
+) -> np.ndarray:
+    """
+    One board cell as a (stud_size, stud_size, 3) array, drawn exactly like a cell of the board.
+    """
+    import numpy as np
+    from PIL import Image, ImageDraw
+
+    tile = Image.new("RGB", (stud_size + 1, stud_size + 1))
+    draw = ImageDraw.Draw(tile)
+
+    # brick body
+    draw.rectangle([0, 0, stud_size, stud_size], fill=rgb_code)
+
+    if show_studs:
+        # stud: centered circle with slight highlight
+        cx = stud_size / 2
+        cy = stud_size / 2
+        r = stud_size * 0.35
+        stud_fill = tuple(min(255, int(c * 1.15)) for c in rgb_code)
+        outline = (0, 0, 0)
+        draw.ellipse([cx - r, cy - r, cx + r, cy + r], fill=stud_fill, outline=outline)
+
+    # the extra row and column are covered by the next cells on the board
+    return np.asarray(tile)[:stud_size, :stud_size]
+
+
+def render_matrix_to_image(
+    board: Board, stud_size: int = 20, show_studs: bool = True
+) -> Image.Image:
+    import numpy as np
+    from PIL import Image, ImageDraw, ImageFont
+
+    h = board.height
+    w = board.width
+
+    index_space = stud_size * 2 // 3
+    img_w = w * stud_size + index_space
+    img_h = h * stud_size + index_space
+
+    # The image is composed as a NumPy array, PIL only draws the index strips
+    canvas = np.full((img_h, img_w, 3), 240, dtype=np.uint8)
+    font = ImageFont.load_default()
+    text_sizes = {}
+
+    def draw_index(draw: ImageDraw.ImageDraw, text: str, tx: int, ty: int):
+        if text not in text_sizes:
+            bbox = draw.textbbox((0, 0), text, font=font)
+            text_sizes[text] = (bbox[2] - bbox[0], bbox[3] - bbox[1])
+        text_w, text_h = text_sizes[text]
+        draw.text(
+            (tx - text_w // 2, ty - text_h // 2),
+            text,
+            fill=(0, 0, 0),
+            font=font,
+        )
+
+    top = Image.fromarray(canvas[:index_space])
+    draw = ImageDraw.Draw(top)
+    for x in range(w):
+        tx = index_space + x * stud_size + stud_size // 2
+        ty = index_space // 4
+        draw_index(draw, str(x + 1), tx, ty)
+    canvas[:index_space] = np.asarray(top)
+
+    left = Image.fromarray(np.ascontiguousarray(canvas[:, :index_space]))
+    draw = ImageDraw.Draw(left)
+    for y in range(h):
+        tx = index_space // 4
+        ty = index_space + y * stud_size + stud_size // 2
+        draw_index(draw, str(y + 1), tx, ty)
+    canvas[:, :index_space] = np.asarray(left)
+
+    if h and w:
+        # one pre-rendered tile per palette color, copied row by row into the board area
+        tiles = np.stack(
+            [
+                render_stud_tile(tuple(c.rgb_code), stud_size, show_studs)
+                for c in board.palette
+            ]
+        )
+        # tile_rows[i, k] is pixel row i of the tile of color k
+        tile_rows = np.ascontiguousarray(tiles.transpose(1, 0, 2, 3)).reshape(
+            stud_size, len(board.palette), stud_size * 3
+        )
+        cells = canvas[index_space:, index_space:].view()
+        cells.shape = (h, stud_size, w, stud_size * 3)
+        for i in range(stud_size):
+            cells[:, i] = tile_rows[i][board.indices]
+
+        # outline of every part larger than 1x1
+        for p in board.placements or ():
+            if p.height == 1 and p.width == 1:
+                continue
+            x0 = index_space + p.x * stud_size
+            y0 = index_space + p.y * stud_size
+            x1 = x0 + p.width * stud_size - 1
+            y1 = y0 + p.height * stud_size - 1
+            canvas[y0, x0 : x1 + 1] = (0, 0, 0)
+            canvas[y1, x0 : x1 + 1] = (0, 0, 0)
+            canvas[y0 : y1 + 1, x0] = (0, 0, 0)
+            canvas[y0 : y1 + 1, x1] = (0, 0, 0)
+
+    img = Image.new("RGB", (img_w, img_h), None)
+    img.frombytes(canvas)
+    return img
+
+
+def render_png(board: Board, stud_size: int = 20, show_studs: bool = True) -> bytes:
+    """
+    PNG of `render_matrix_to_image`, taken from the stage cache when the same board
+    was already rendered.
+    """
+    import io
+
+    key = None
+    if StageCache.enabled:
+        key = StageCache.key(
+            board.indices,
+            [c.rgb_code for c in board.palette],
+            [(p.y, p.x, p.height, p.width) for p in board.placements or ()],
+            stud_size,
+            show_studs,
+        )
+    png = StageCache.get_bytes("render", key)
+    if png is None:
+        buffer = io.BytesIO()
+        render_matrix_to_image(board, stud_size, show_studs).save(buffer, "PNG")
+        png = buffer.getvalue()
+        StageCache.put_bytes("render", key, png)
+    return png
+
+
+def warm_palette(
+    piece_type: Type,
+    use_lut: bool = False,
+    rebuild_lut: bool = False,
+    optimize: bool = False,
+    match_resolution: float = None,
+):
+    """
+    Load palette, match index and lookup table in this process, forked workers inherit them.
+    Spawned workers get the `match_resolution` of the parent here.
+    """
+    from BrickLink.Color import Color as BrickLinkColor
+    from BrickLink.MatchCache import MatchCache
+
+    if match_resolution != BrickLinkColor.match_cache.resolution:
+        BrickLinkColor.match_cache = MatchCache(match_resolution)
+    BrickLinkColor.get_palette_fingerprint(piece_type)
+    BrickLinkColor.get_palette_index(piece_type)
+    if use_lut or rebuild_lut:
+        BrickLinkColor.get_palette_lut(piece_type).load(rebuild=rebuild_lut)
+    if optimize:
+        get_optimizer(piece_type)
@@ -0,0 +1,159 @@
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+
+
+class Profiler:
+    """
+    Process-wide counters of a run: wall and CPU time per stage, count and latency of
+    network requests by kind, and cache hits and misses. Cheap enough to stay always on,
+    `report()` turns them into a JSON-friendly dict.
+    CPU time is the process time, so it includes the threads running during the stage.
+    Latency percentiles cover the last `window` requests of a kind, so a long-running
+    server keeps bounded memory.
+    """
+
+    window = 10000
+    _lock = threading.Lock()
+    stages = {}
+    requests = {}
+    caches = {}
+
+    @classmethod
+    @contextmanager
+    def stage(cls, name: str):
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            with cls._lock:
+                stage = cls.stages.setdefault(name, {"calls": 0, "wall": 0.0, "cpu": 0.0})
+                stage["calls"] += 1
+                stage["wall"] += wall
+                stage["cpu"] += cpu
+
+    @classmethod
+    @contextmanager
+    def request(cls, kind: str):
+        """
+        Time one network request, an exception raised inside counts it as failed.
+        """
+        start = time.perf_counter()
+        failed = True
+        try:
+            yield
+            failed = False
+        finally:
+            cls.record_request(kind, time.perf_counter() - start, failed)
+
+    @classmethod
+    def record_request(cls, kind: str, latency: float, failed: bool = False) -> None:
+        with cls._lock:
+            entry = cls.requests.get(kind)
+            if entry is None:
+                entry = cls.requests[kind] = {
+                    "count": 0,
+                    "failures": 0,
+                    "total": 0.0,
+                    "max": 0.0,
+                    "latencies": deque(maxlen=cls.window),
+                }
+            entry["count"] += 1
+            entry["failures"] += failed
+            entry["total"] += latency
+            entry["max"] = max(entry["max"], latency)
+            entry["latencies"].append(latency)
+
+    @classmethod
+    def count(cls, cache: str, hits: int = 0, misses: int = 0) -> None:
+        with cls._lock:
+            entry = cls.caches.setdefault(cache, {"hits": 0, "misses": 0})
+            entry["hits"] += hits
+            entry["misses"] += misses
+
+    @staticmethod
+    def _percentile(values: list[float], q: float) -> float:
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    @classmethod
+    def report(cls) -> dict:
+        with cls._lock:
+            requests = {}
+            for kind, entry in cls.requests.items():
+                latencies = entry["latencies"]
+                requests[kind] = {
+                    "count": entry["count"],
+                    "failures": entry["failures"],
+                    "total": entry["total"],
+                    "mean": entry["total"] / entry["count"],
+                    "p50": cls._percentile(latencies, 0.5),
+                    "p95": cls._percentile(latencies, 0.95),
+                    "p99": cls._percentile(latencies, 0.99),
+                    "max": entry["max"],
+                }
+            caches = {}
+            for name, entry in cls.caches.items():
+                lookups = entry["hits"] + entry["misses"]
+                caches[name] = dict(entry, hit_rate=entry["hits"] / lookups if lookups else None)
+            return {
+                "stages": {name: dict(stage) for name, stage in cls.stages.items()},
+                "requests": requests,
+                "caches": caches,
+            }
+
+    @classmethod
+    def counters(cls) -> dict:
+        """
+        Copy of the stage and cache counters, for `since` to diff in a worker process.
+        """
+        with cls._lock:
+            return {
+                "stages": {name: dict(stage) for name, stage in cls.stages.items()},
+                "caches": {name: dict(entry) for name, entry in cls.caches.items()},
+            }
+
+    @classmethod
+    def since(cls, before: dict) -> dict:
+        """
+        Stage and cache counters added since `before`, what a worker sends back to `merge`.
+        """
+        after = cls.counters()
+        for kind, entries in after.items():
+            for name, entry in entries.items():
+                previous = before[kind].get(name, {})
+                for field in entry:
+                    entry[field] -= previous.get(field, 0)
+        return after
+
+    @classmethod
+    def merge(cls, counters: dict) -> None:
+        """
+        Add stage and cache counters collected in another process.
+        """
+        with cls._lock:
+            for name, stage in counters["stages"].items():
+                entry = cls.stages.setdefault(name, {"calls": 0, "wall": 0.0, "cpu": 0.0})
+                for field in entry:
+                    entry[field] += stage[field]
+            for name, cache in counters["caches"].items():
+                entry = cls.caches.setdefault(name, {"hits": 0, "misses": 0})
+                for field in entry:
+                    entry[field] += cache[field]
+
+    @classmethod
+    def write(cls, path: Path, **extra) -> dict:
+        report = dict(cls.report(), **extra)
+        Path(path).write_text(json.dumps(report, indent=1))
+        return report
+
+    @classmethod
+    def reset(cls) -> None:
+        with cls._lock:
+            cls.stages.clear()
+            cls.requests.clear()
+            cls.caches.clear()
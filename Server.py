@@ -0,0 +1,332 @@
+import io
+import json
+import multiprocessing
+import re
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock
+from urllib.parse import parse_qs, urlparse
+from Brick.Piece import Piece
+from Brick.Type import Type
+from BrickLink.Color import Color as BrickLinkColor
+from BrickLink.Connector import Connector
+from Profiler import Profiler
+import Dither
+from Pipeline import (
+    PIECE_TYPES,
+    image_to_matrix,
+    optimize_board,
+    render_png,
+    warm_palette,
+)
+
+
+def convert_image(
+    data: bytes,
+    size: int,
+    piece_type: Type,
+    use_lut: bool = False,
+    optimize: bool = False,
+    merge_budget: float = 0.5,
+    dither: str = None,
+) -> dict:
+    """
+    Map and render one uploaded image in a worker, returns the PNG, piece counts and
+    the profiler counters of the worker for it.
+    """
+    before = Profiler.counters()
+    board = image_to_matrix(
+        io.BytesIO(data), (size, size), piece_type, use_lut, dither=dither
+    )
+    if optimize:
+        optimize_board(board, piece_type, merge_budget)
+    counts = [
+        (piece.reference, piece.size, piece.color.id, piece.id, count)
+        for piece, count in board.piece_counts()
+    ]
+    png = render_png(board, stud_size=20, show_studs=True)
+    return {"png": png, "counts": counts, "profile": Profiler.since(before)}
+
+
+class RequestError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class Server:
+    """
+    Local HTTP service around the pipeline. Palettes, match indexes and the BrickLink
+    session stay loaded between requests, conversions run in a pool of worker processes
+    forked once the palettes are warm.
+
+        POST /convert?size=32&type=plate[&merge=1&dither=rows&stock=1&wishlist=1]
+             body: image bytes, header X-BrickLink-JWT for wishlists
+        GET  /renders/<id>.png
+        GET  /health
+    """
+
+    max_upload = 32 * 2**20
+    max_renders = 64
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8080,
+        workers: int = None,
+        piece_types: tuple[Type, ...] = (Type.PLATE,),
+        use_lut: bool = False,
+        optimize: bool = False,
+        merge_budget: float = 0.5,
+    ):
+        self.host = host
+        self.port = port
+        self.workers = max(1, workers or 1)
+        self.piece_types = piece_types
+        self.use_lut = use_lut
+        self.optimize = optimize
+        self.merge_budget = merge_budget
+        self.started = None
+        self._renders = OrderedDict()
+        self._renders_lock = Lock()
+        self._executor = None
+        self._httpd = None
+
+    def start(self) -> None:
+        for piece_type in self.piece_types:
+            warm_palette(piece_type, self.use_lut, False, self.optimize)
+
+        if "fork" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("fork")
+            initializer, initargs = None, ()
+        else:
+            context = None
+            initializer, initargs = warm_palette, (
+                self.piece_types[0],
+                self.use_lut,
+                False,
+                self.optimize,
+                BrickLinkColor.match_cache.resolution,
+            )
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=context,
+            initializer=initializer,
+            initargs=initargs,
+        )
+        self._httpd = ThreadingHTTPServer((self.host, self.port), _Handler)
+        self._httpd.app = self
+        self.port = self._httpd.server_address[1]
+        self.started = time.time()
+
+    def serve_forever(self) -> None:
+        if self._httpd is None:
+            self.start()
+        print(f"Serving on http://{self.host}:{self.port} with {self.workers} workers")
+        try:
+            self._httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        if self._httpd is not None:
+            self._httpd.server_close()
+            self._httpd = None
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+        Connector.close()
+
+    @staticmethod
+    def _flag(params: dict, name: str) -> bool:
+        return params.get(name, ["0"])[0].lower() in ("1", "true", "yes")
+
+    def _options(self, params: dict) -> tuple[int, Type, str | None]:
+        size_param = params.get("size", ["32"])[0]
+        if not size_param.isdigit() or int(size_param) not in Piece.get_baseplate_sizes():
+            raise RequestError(
+                400, f"size must be one of {Piece.get_baseplate_sizes()}, got '{size_param}'"
+            )
+        type_param = params.get("type", ["plate"])[0]
+        if type_param not in PIECE_TYPES:
+            raise RequestError(
+                400, f"type must be one of {', '.join(PIECE_TYPES)}, got '{type_param}'"
+            )
+        dither = params.get("dither", [None])[0]
+        if dither is not None and dither not in Dither.METHODS:
+            raise RequestError(
+                400, f"dither must be one of {', '.join(Dither.METHODS)}, got '{dither}'"
+            )
+        return int(size_param), PIECE_TYPES[type_param], dither
+
+    def convert(self, data: bytes, params: dict, jwt: str = None) -> dict:
+        size, piece_type, dither = self._options(params)
+        optimize = self.optimize or self._flag(params, "merge")
+        wishlist = self._flag(params, "wishlist")
+        if wishlist and not jwt:
+            raise RequestError(400, "wishlist needs the X-BrickLink-JWT header")
+        with Profiler.stage("convert"):
+            future = self._executor.submit(
+                convert_image,
+                data,
+                size,
+                piece_type,
+                self.use_lut,
+                optimize,
+                self.merge_budget,
+                dither,
+            )
+            try:
+                result = future.result()
+            except OSError:
+                # PIL could not decode the upload
+                raise RequestError(400, "cannot read the image")
+            Profiler.merge(result.pop("profile"))
+
+        render_id = uuid.uuid4().hex
+        with self._renders_lock:
+            self._renders[render_id] = result["png"]
+            while len(self._renders) > self.max_renders:
+                self._renders.popitem(last=False)
+
+        counts = result["counts"]
+        stocks = [(None, None)] * len(counts)
+        if self._flag(params, "stock"):
+            with Profiler.stage("stock"):
+                stocks = Connector.get_pieces_stock(
+                    [(ref, color_id, count) for ref, _, color_id, _, count in counts]
+                )
+        parts = [
+            {
+                "ref": ref,
+                "size": f"{part_size[0]}x{part_size[1]}",
+                "color": color_id,
+                "count": count,
+                "stock": stock,
+                "url": Connector.get_bricklink_url(ref, color_id, count),
+            }
+            for (ref, part_size, color_id, _, count), (stock, _) in zip(counts, stocks)
+        ]
+        response = {
+            "id": render_id,
+            "render_url": f"/renders/{render_id}.png",
+            "parts": parts,
+        }
+
+        if wishlist:
+            name = params.get("name", ["upload"])[0]
+            with Profiler.stage("wishlist"):
+                response["wishlist_url"] = self._create_wishlist(
+                    name, size, piece_type, counts, jwt
+                )
+        return response
+
+    def _create_wishlist(
+        self, name: str, size: int, piece_type: Type, counts: list, jwt: str
+    ) -> str:
+        colors = {c.id: c for c in BrickLinkColor.get_filtered_colors(piece_type)}
+        wanted = [(Piece.get_baseplate_by_size(size), 1)]
+        wanted += [
+            (Piece(ref, colors[color_id], part_size, item), count)
+            for ref, part_size, color_id, item, count in counts
+            if item is not None
+        ]
+        wishlist = Connector.create_wishlist(f"Project {name} {time.ctime()}", jwt=jwt)
+        Connector.add_pieces_to_wishlist(wishlist, wanted, jwt)
+        return Connector.get_wishlist_url(wishlist)
+
+    def get_render(self, render_id: str) -> bytes | None:
+        with self._renders_lock:
+            return self._renders.get(render_id)
+
+    def health(self) -> dict:
+        return dict(
+            Profiler.report(),
+            status="ok",
+            uptime=time.time() - self.started,
+            workers=self.workers,
+            renders=len(self._renders),
+        )
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "ImageToLegoBoard/1.0"
+    protocol_version = "HTTP/1.1"
+    _render_path = re.compile(r"^/renders/([0-9a-f]{32})\.png$")
+
+    def _send(self, status: int, body: bytes, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, data: dict) -> None:
+        self._send(status, json.dumps(data).encode(), "application/json")
+
+    def _handle(self, route) -> None:
+        start = time.perf_counter()
+        path = urlparse(self.path).path
+        status = 500
+        try:
+            status = route(path)
+        except RequestError as e:
+            status = e.status
+            # the body may be left unread, the connection cannot be reused
+            self.close_connection = True
+            self._send_json(status, {"error": str(e)})
+        except Exception as e:
+            self.close_connection = True
+            self._send_json(status, {"error": f"{type(e).__name__}: {e}"})
+        finally:
+            # one entry per route, not per render id or unknown path
+            if path in ("/convert", "/health"):
+                kind = path
+            elif path.startswith("/renders/"):
+                kind = "/renders"
+            else:
+                kind = "other"
+            Profiler.record_request(
+                f"http {self.command} {kind}", time.perf_counter() - start, status >= 500
+            )
+
+    def do_GET(self) -> None:
+        self._handle(self._get)
+
+    def do_POST(self) -> None:
+        self._handle(self._post)
+
+    def _get(self, path: str) -> int:
+        app = self.server.app
+        if path == "/health":
+            self._send_json(200, app.health())
+            return 200
+        match = self._render_path.match(path)
+        png = app.get_render(match.group(1)) if match else None
+        if png is None:
+            raise RequestError(404, f"nothing at {path}")
+        self._send(200, png, "image/png")
+        return 200
+
+    def _post(self, path: str) -> int:
+        app = self.server.app
+        if path != "/convert":
+            raise RequestError(404, f"nothing at {path}")
+        length = int(self.headers.get("Content-Length") or 0)
+        if length <= 0:
+            raise RequestError(400, "the request body must be the image")
+        if length > app.max_upload:
+            raise RequestError(413, f"image larger than {app.max_upload} bytes")
+        data = self.rfile.read(length)
+        params = parse_qs(urlparse(self.path).query)
+        response = app.convert(data, params, self.headers.get("X-BrickLink-JWT"))
+        self._send_json(200, response)
+        return 200
+
+    def log_message(self, format: str, *args) -> None:
+        pass
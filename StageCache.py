@@ -0,0 +1,192 @@
+import hashlib
+import io
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import BinaryIO
+from Cache import get_cache_dir
+from Profiler import Profiler
+
+
+class StageCache:
+    """
+    Content-addressed cache of pipeline stages, so a rerun that changes one option only
+    recomputes the stages downstream of it:
+
+        lab      resized RGB and LAB arrays, per image content and size
+        indices  palette index matrix, per lab entry, palette and matching options
+        render   PNG of a board, per index matrix, parts, colors and stud size
+
+    Entries are files named after the hash of their inputs, the least recently used
+    ones are evicted once the cache grows past `max_bytes`. Each process keeps a running
+    total of the cache size, only an eviction scans the directory and resyncs it with
+    what other processes wrote.
+    """
+
+    STAGES = {"lab": ".npz", "indices": ".npz", "render": ".png"}
+
+    enabled = True
+    max_bytes = 512 * 2**20
+    # temporary files older than this were left by a crashed writer
+    tmp_max_age = 3600
+    _bytes = None
+
+    @staticmethod
+    def get_dir() -> Path:
+        return get_cache_dir("stages")
+
+    @staticmethod
+    def key(*parts) -> str:
+        """
+        Hash of the inputs of a stage: strings, numbers, tuples or NumPy arrays.
+        """
+        digest = hashlib.sha256()
+        for part in parts:
+            if hasattr(part, "tobytes"):
+                digest.update(f"{part.dtype}{part.shape}".encode())
+                digest.update(part.tobytes())
+            else:
+                digest.update(repr(part).encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    @staticmethod
+    def hash_image(source: Path | BinaryIO) -> str:
+        digest = hashlib.sha256()
+        if hasattr(source, "read"):
+            position = source.tell()
+            for chunk in iter(lambda: source.read(2**20), b""):
+                digest.update(chunk)
+            source.seek(position)
+        else:
+            with open(source, "rb") as f:
+                for chunk in iter(lambda: f.read(2**20), b""):
+                    digest.update(chunk)
+        return digest.hexdigest()
+
+    @classmethod
+    def _path(cls, stage: str, key: str) -> Path:
+        return cls.get_dir() / f"{stage}-{key}{cls.STAGES[stage]}"
+
+    @classmethod
+    def get_bytes(cls, stage: str, key: str | None) -> bytes | None:
+        if not cls.enabled or key is None:
+            return None
+        path = cls._path(stage, key)
+        try:
+            data = path.read_bytes()
+            # the modification time orders entries for eviction
+            os.utime(path)
+        except FileNotFoundError:
+            Profiler.count(f"stage_{stage}", misses=1)
+            return None
+        Profiler.count(f"stage_{stage}", hits=1)
+        return data
+
+    @classmethod
+    def put_bytes(cls, stage: str, key: str | None, data: bytes) -> None:
+        if not cls.enabled or key is None:
+            return
+        path = cls._path(stage, key)
+        # written aside then renamed, batch workers and the server may write concurrently
+        try:
+            replaced = path.stat().st_size
+        except FileNotFoundError:
+            replaced = 0
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        if cls._bytes is None:
+            cls._bytes = sum(size for _, size, _ in cls._entries())
+        else:
+            cls._bytes += len(data) - replaced
+        if cls._bytes > cls.max_bytes:
+            cls.evict()
+
+    @classmethod
+    def get_arrays(cls, stage: str, key: str | None) -> dict | None:
+        import numpy as np
+
+        data = cls.get_bytes(stage, key)
+        if data is None:
+            return None
+        with np.load(io.BytesIO(data)) as arrays:
+            return dict(arrays)
+
+    @classmethod
+    def put_arrays(cls, stage: str, key: str | None, **arrays) -> None:
+        import numpy as np
+
+        if not cls.enabled or key is None:
+            return
+        buffer = io.BytesIO()
+        np.savez(buffer, **arrays)
+        cls.put_bytes(stage, key, buffer.getvalue())
+
+    @classmethod
+    def _entries(cls) -> list[tuple[float, int, Path]]:
+        entries = []
+        for path in cls.get_dir().iterdir():
+            if path.suffix == ".tmp":
+                continue
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return sorted(entries)
+
+    @classmethod
+    def evict(cls) -> int:
+        """
+        Remove the least recently used entries until the cache fits in `max_bytes`,
+        returns the number of entries removed.
+        """
+        entries = cls._entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in entries:
+            if total <= cls.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        cls._bytes = total
+        return removed
+
+    @classmethod
+    def info(cls) -> dict:
+        stages = {stage: {"entries": 0, "bytes": 0} for stage in cls.STAGES}
+        for _, size, path in cls._entries():
+            stage = stages.get(path.name.split("-", 1)[0])
+            if stage is not None:
+                stage["entries"] += 1
+                stage["bytes"] += size
+        return {
+            "path": str(cls.get_dir()),
+            "bytes": sum(stage["bytes"] for stage in stages.values()),
+            "max_bytes": cls.max_bytes,
+            "stages": stages,
+        }
+
+    @classmethod
+    def clear(cls) -> int:
+        """
+        Remove every entry, and the temporary files of crashed writers. Recent temporary
+        files are left alone, a concurrent writer is about to rename them.
+        """
+        removed = 0
+        now = time.time()
+        for path in cls.get_dir().iterdir():
+            if path.suffix == ".tmp":
+                try:
+                    if now - path.stat().st_mtime < cls.tmp_max_age:
+                        continue
+                except FileNotFoundError:
+                    continue
+            path.unlink(missing_ok=True)
+            removed += 1
+        cls._bytes = None
+        return removed
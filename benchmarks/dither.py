@@ -0,0 +1,66 @@
+"""
+Timings of the dithering methods on synthetic gradients, no network needed.
+
+    python benchmarks/dither.py [--sizes 48 96 192] [--colors 120]
+"""
+import argparse
+import importlib.util
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from skimage import color
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import Dither
+from BrickLink.PaletteIndex import PaletteIndex
+
+
+def synthetic_palette(count: int, seed: int = 0) -> np.ndarray:
+    rgb = np.random.default_rng(seed).random((count, 1, 3))
+    return color.rgb2lab(rgb).reshape(-1, 3)
+
+
+def gradient(size: int) -> np.ndarray:
+    x = np.linspace(0, 1, size)
+    rgb = np.stack(np.broadcast_arrays(x[None, :], x[:, None], 0.5 * np.ones((1, 1))), axis=2)
+    return color.rgb2lab(rgb)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[48, 96, 192])
+    parser.add_argument("--colors", type=int, default=120)
+    args = parser.parse_args()
+
+    palette = synthetic_palette(args.colors)
+    nearest = PaletteIndex(palette).query
+    compiled = "numba" if importlib.util.find_spec("numba") else "python"
+
+    # first call compiles the error diffusion kernel, keep it out of the timings
+    Dither.dither("floyd-steinberg", gradient(4), palette, nearest)
+
+    print(f"{'method':<24}{'size':>6}{'seconds':>10}{'mean dE':>9}")
+    for size in args.sizes:
+        labs = gradient(size)
+        for method in (None,) + Dither.METHODS:
+            start = time.perf_counter()
+            if method is None:
+                indices = nearest(labs.reshape(-1, 3)).reshape(size, size)
+            else:
+                indices = Dither.dither(method, labs, palette, nearest)
+            elapsed = time.perf_counter() - start
+            # error of 4x4 block averages, what is seen from a distance
+            blocks = size // 4 * 4
+            mean = lambda a: a[:blocks, :blocks].reshape(blocks // 4, 4, blocks // 4, 4, 3).mean((1, 3))
+            error = np.linalg.norm(mean(palette[indices]) - mean(labs), axis=2).mean()
+            name = method or "nearest"
+            if method == "floyd-steinberg":
+                name += f" ({compiled})"
+            print(f"{name:<24}{size:>6}{elapsed:>10.4f}{error:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+"""
+Offline benchmark suite of the hot paths: startup and import costs, CIEDE2000, catalog
+parsing, image loading, color matching, rendering, cached stock lookups, cached reruns
+and the comparison of piece types.
+
+    python benchmarks/run.py --save-baseline    # record the baseline of this machine
+    python benchmarks/run.py                    # compare with benchmarks/baseline.json
+    python benchmarks/run.py --check            # exit 1 on regressions
+
+Inputs are fixed: synthetic images generated from a seed at every baseplate size,
+the saved catalog pages in benchmarks/fixtures and the palette frozen in
+fixtures/catalog.json. Nothing is read from the network or from the user cache.
+Timings only compare across runs on the same machine, so the baseline is recorded
+locally and not committed.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+ROOT = Path(__file__).resolve().parent.parent
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+BASELINE = Path(__file__).resolve().parent / "baseline.json"
+
+# everything the suite caches goes to a throwaway directory, set before the imports below
+CACHE = Path(tempfile.mkdtemp(prefix="image-to-lego-bench-"))
+os.environ["IMAGE_TO_LEGO_CACHE"] = str(CACHE)
+sys.path.insert(0, str(ROOT))
+
+import main
+import Pipeline
+from Brick.Piece import Piece
+from Brick.Type import Type
+from BrickLink.Color import Color as BrickLinkColor
+from BrickLink.CatalogParser import CatalogParser
+from BrickLink.Connector import Connector
+from Color import CIEDE2000, CIEDE2000_matrix
+from StageCache import StageCache
+
+
+def synthetic_image(path: Path, width: int = 3000, height: int = 2000, seed: int = 0):
+    """
+    Smooth gradients, hard edges and noise, written as a JPEG like a camera photo.
+    """
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width] / max(width, height)
+    rgb = np.stack(
+        [
+            0.5 + 0.5 * np.sin(6 * x + 2 * y),
+            0.5 + 0.5 * np.cos(4 * y - 3 * x),
+            x * y * 2,
+        ],
+        axis=2,
+    )
+    for _ in range(12):
+        cx, cy, r = rng.random(3) * [1.5, 1, 0.2]
+        rgb[(x - cx) ** 2 + (y - cy) ** 2 < r**2] = rng.random(3)
+    rgb += rng.normal(0, 0.03, rgb.shape)
+    pixels = (np.clip(rgb, 0, 1) * 255).astype(np.uint8)
+    Image.fromarray(pixels).save(path, quality=90)
+
+
+def measure(fn, repeat: int, setup=None) -> dict:
+    """
+    Best and median wall time over `repeat` runs, then one traced run for peak memory.
+    """
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+
+    if setup:
+        setup()
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "best": min(times),
+        "median": statistics.median(times),
+        "peak_mb": peak / 2**20,
+    }
+
+
+# code each stage imports on first use, timed in a fresh interpreter
+IMPORTS = {
+    "cli": None,
+    "matching": "from BrickLink.Color import Color; import skimage.color",
+    "render": "import numpy; from PIL import Image, ImageDraw, ImageFont",
+    "stock": "import selenium.webdriver, selenium.webdriver.support.ui",
+    "network": "import BrickLink.AsyncConnector, requests, bs4",
+    "dither": "import Dither, numba",
+}
+
+
+def measure_imports(repeat: int) -> dict:
+    """
+    Startup cost of `main.py --help` and of each stage's imports, over a bare interpreter.
+    """
+
+    def best(args: list[str]) -> list[float]:
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, *args], cwd=ROOT, check=True, capture_output=True)
+            times.append(time.perf_counter() - start)
+        return times
+
+    bare = min(best(["-c", "pass"]))
+    stages = {}
+    for name, code in IMPORTS.items():
+        args = [str(ROOT / "main.py"), "--help"] if code is None else ["-c", code]
+        try:
+            times = [max(0.0, t - bare) for t in best(args)]
+        except subprocess.CalledProcessError:
+            continue  # optional dependency not installed
+        stages[f"import[{name}]"] = {
+            "best": min(times),
+            "median": statistics.median(times),
+            "peak_mb": None,
+        }
+    return stages
+
+
+def prepare_cache(piece_type: Type):
+    """
+    Install the frozen palette as the catalog snapshot and fill the stock cache for it.
+    """
+    catalog_dir = CACHE / "catalog"
+    catalog_dir.mkdir(parents=True, exist_ok=True)
+    shutil.copy(FIXTURES / "catalog.json", catalog_dir / "catalog.json")
+    Connector.offline = True
+    # stages are timed from scratch, the stage cache has its own entries below
+    StageCache.enabled = False
+
+    cache = Connector.get_stock_cache()
+    for c in BrickLinkColor.get_filtered_colors(piece_type):
+        cache.put(piece_type, c.id, c.stock)
+
+
+def run_suite(sizes: list[int], piece_type: Type, repeat: int) -> dict:
+    prepare_cache(piece_type)
+    palette = BrickLinkColor.get_filtered_colors(piece_type)
+    palette_labs = np.array([c.lab_code for c in palette])
+    image_path = CACHE / "synthetic.jpg"
+    synthetic_image(image_path)
+
+    rng = np.random.default_rng(1)
+    labs = np.column_stack(
+        [rng.uniform(0, 100, 20000), rng.uniform(-80, 80, 20000), rng.uniform(-80, 80, 20000)]
+    )
+    stages = measure_imports(repeat)
+
+    def scalar():
+        for lab in labs:
+            CIEDE2000(lab, palette_labs[0])
+
+    stages["ciede2000_scalar"] = measure(scalar, repeat)
+    stages["ciede2000_matrix"] = measure(lambda: CIEDE2000_matrix(labs, palette_labs), repeat)
+
+    for fixture in sorted(FIXTURES.glob("catalog_*.html")):
+        html = fixture.read_text()
+        # tests/test_catalog_parser.py checks every backend reads the page like soup
+        for backend in CatalogParser.BACKENDS[1:]:
+            if backend == "lxml" and not CatalogParser.has_lxml():
+                continue
+            stages[f"parse_catalog[{backend},{fixture.stem}]"] = measure(
+                lambda: CatalogParser.parse(html, backend), repeat
+            )
+
+    lookups = [(piece_type, c.id, 1) for c in palette]
+    stages["stock_offline"] = measure(lambda: Connector.get_pieces_stock(lookups), repeat)
+
+    for size in sizes:
+        stages[f"load_image[{size}]"] = measure(
+            lambda: Pipeline.load_image(image_path, (size, size)), repeat
+        )
+        # the match cache is emptied so every run maps the image from scratch
+        board = None
+
+        def match():
+            nonlocal board
+            board = Pipeline.image_to_matrix(image_path, (size, size), piece_type)
+
+        stages[f"image_to_matrix[{size}]"] = measure(
+            match, repeat, setup=BrickLinkColor.match_cache.clear
+        )
+        stages[f"render[{size}]"] = measure(
+            lambda: Pipeline.render_matrix_to_image(board, stud_size=20, show_studs=True),
+            repeat,
+        )
+
+        # a rerun with unchanged inputs, every stage read back from the stage cache
+        def rerun():
+            Pipeline.render_png(Pipeline.image_to_matrix(image_path, (size, size), piece_type))
+
+        StageCache.enabled = True
+        rerun()
+        stages[f"rerun_cached[{size}]"] = measure(rerun, repeat)
+        StageCache.enabled = False
+
+        # every piece type of the fixture catalog, one distance matrix for all of them
+        stages[f"compare_types[{size}]"] = measure(
+            lambda: main.compare_piece_types(image_path, (size, size)), repeat
+        )
+    return stages
+
+
+def compare(stages: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Print every stage next to its baseline, returns the stages slower than allowed.
+    """
+    regressions = []
+    print(f"{'stage':<42}{'best s':>10}{'base s':>10}{'ratio':>8}{'peak MB':>10}")
+    for name, result in stages.items():
+        base = baseline.get(name)
+        peak = "-" if result["peak_mb"] is None else f"{result['peak_mb']:.1f}"
+        if base and base["best"] > 0:
+            ratio = result["best"] / base["best"]
+            flag = ""
+            if ratio > 1 + tolerance:
+                flag = "  slower"
+                regressions.append(name)
+            elif ratio < 1 - tolerance:
+                flag = "  faster"
+            print(
+                f"{name:<42}{result['best']:>10.4f}{base['best']:>10.4f}"
+                f"{ratio:>8.2f}{peak:>10}{flag}"
+            )
+        else:
+            print(f"{name:<42}{result['best']:>10.4f}{'-':>10}{'-':>8}{peak:>10}")
+    return regressions
+
+
+def main_benchmarks():
+    parser = argparse.ArgumentParser(description="Offline benchmarks of image-to-lego-board")
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=Piece.get_baseplate_sizes(),
+        help="Baseplate sizes to map and render (default: all supported sizes)",
+    )
+    parser.add_argument("--type", default=Type.PLATE, choices=[Type.PLATE, Type.TILE])
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per stage (default: 5)")
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown before a stage is flagged (default: 0.2)")
+    parser.add_argument("--check", action="store_true", help="Exit with status 1 if a stage regressed")
+    parser.add_argument("--json", type=Path, default=None, help="Also write the results to this file")
+    args = parser.parse_args()
+
+    try:
+        # the code under test reports progress, keep the table readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            stages = run_suite(args.sizes, args.type, args.repeat)
+    finally:
+        Connector.close()
+        shutil.rmtree(CACHE, ignore_errors=True)
+
+    results = {
+        "machine": {"python": platform.python_version(), "platform": platform.platform()},
+        "piece_type": args.type,
+        "stages": stages,
+        # tracemalloc only sees Python and NumPy allocations, not the PIL buffers
+        "max_rss_mb": Pipeline.peak_memory_mb(),
+    }
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=1))
+
+    baseline = {}
+    if args.baseline.is_file():
+        baseline = json.loads(args.baseline.read_text()).get("stages", {})
+    elif not args.save_baseline:
+        print(f"No baseline at {args.baseline}, record one with --save-baseline")
+    regressions = compare(stages, baseline, args.tolerance)
+    if results["max_rss_mb"] is not None:
+        print(f"Peak resident memory: {results['max_rss_mb']:.0f} MB")
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(results, indent=1) + "\n")
+        print(f"Baseline saved to {args.baseline}")
+    elif regressions:
+        print(f"{len(regressions)} stage(s) slower than baseline by more than {args.tolerance:.0%}")
+        if args.check:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_benchmarks()
@@ -1,20 +1,40 @@
+from __future__ import annotations
 from Brick.Piece import Piece
 from Brick.Type import Type
-from BrickLink.Item import Item
-from BrickLink.Color import Color as BrickLinkColor
 import argparse
 from pathlib import Path
-from tqdm import tqdm
-from PIL import Image, ImageDraw, ImageFont
-from collections import Counter
-from Color import Color
-from BrickLink.Connector import Connector
-from datetime import datetime
-from skimage import io, color
+from Profiler import Profiler
+from StageCache import StageCache
+from Pipeline import (
+    PIECE_TYPES,
+    image_to_matrix,
+    load_lab,
+    get_indices_key,
+    optimize_board,
+    peak_memory_mb,
+    render_png,
+    warm_palette,
+)
 from os.path import basename
+from typing import TYPE_CHECKING
+import time
+import os
+import sys
+import json
+import glob
+
+# Stages import their dependencies (NumPy, scikit-image, PIL, Selenium, aiohttp...)
+# when they run, so --help and argument errors return without loading them
+if TYPE_CHECKING:
+    from Brick.Board import Board
 
 
 def init_parse() -> argparse.ArgumentParser:
+    # the defaults shown in the help, light modules unlike the Connector
+    from BrickLink.BrowserPool import BrowserPool
+    from BrickLink.Catalog import Catalog
+    from BrickLink.StockCache import StockCache
+
     parser = argparse.ArgumentParser(
         prog="Image to Lego Board",
         description="Transform an image into a Lego board plan",
@@ -30,15 +50,63 @@ def init_parse() -> argparse.ArgumentParser:
         return path
 
     parser.add_argument(
-        "image_path", help="Path to the input image file", type=valid_image_path
+        "image_path",
+        help="Path to the input image file",
+        type=valid_image_path,
+        nargs="?",
+    )
+
+    parser.add_argument(
+        "-b",
+        "--batch",
+        help="Directory or glob pattern of images to process in parallel, instead of image_path",
+        default=None,
+    )
+
+    parser.add_argument(
+        "--compare-types",
+        action="store_true",
+        help="Map the image with every piece type in one pass and compare color error, "
+        "piece counts and lots for sale side by side",
+    )
+
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="Run a local HTTP service (POST /convert, GET /health) with warm caches, instead of image_path",
+    )
+
+    parser.add_argument(
+        "--host",
+        default="127.0.0.1",
+        help="Address the service listens on (default: 127.0.0.1)",
+    )
+
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=8080,
+        help="Port the service listens on (default: 8080)",
+    )
+
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="Number of worker processes in batch and service modes (default: number of cores)",
     )
 
-    def valid_size(s: str) -> Piece:
+    def valid_size(s: str) -> int:
         try:
             s = int(s)
         except ValueError:
             raise argparse.ArgumentTypeError(f"size '{s}' is not a valid integer")
-        return Piece.get_baseplate_by_size(s)
+        if s not in Piece.get_baseplate_sizes():
+            raise argparse.ArgumentTypeError(
+                f"No baseplate with size {(s, s)}. Supported sizes: {Piece.get_baseplate_sizes()}"
+            )
+        return s
 
     parser.add_argument(
         "-s",
@@ -48,6 +116,25 @@ def init_parse() -> argparse.ArgumentParser:
         help="Size of the Lego baseplate (default: 32)",
     )
 
+    def valid_grid(s: str) -> tuple[int, int]:
+        try:
+            columns, rows = (int(v) for v in s.lower().split("x"))
+        except ValueError:
+            raise argparse.ArgumentTypeError(
+                f"mural '{s}' is not a valid grid, expected COLUMNSxROWS (e.g. 4x3)"
+            )
+        if columns < 1 or rows < 1:
+            raise argparse.ArgumentTypeError(f"mural '{s}' must have at least one baseplate")
+        return columns, rows
+
+    parser.add_argument(
+        "-m",
+        "--mural",
+        type=valid_grid,
+        default=None,
+        help="Build a mural of COLUMNSxROWS baseplates of --size studs (e.g. 4x3)",
+    )
+
     parser.add_argument(
         "-j",
         "--jwt",
@@ -55,32 +142,214 @@ def init_parse() -> argparse.ArgumentParser:
         default=None,
     )
 
-    available_types = {
-        "plate": Type.PLATE,
-        "plate_round": Type.PLATE_ROUND,
-        "slope": Type.SLOPE,
-        "tile": Type.TILE,
-    }
-
     def valid_type(s: str) -> Type:
-        if s not in available_types:
-            valid_values = ", ".join(available_types.keys())
+        if s not in PIECE_TYPES:
+            valid_values = ", ".join(PIECE_TYPES.keys())
             raise argparse.ArgumentTypeError(
                 f"Type '{s}' is not a valid type. Must be one of: {valid_values}"
             )
-        return available_types[s]
+        return PIECE_TYPES[s]
 
     parser.add_argument(
         "-t",
         "--type",
         help=(
             "Types available are:\n"
-            + ",".join(f" {key} ({value})" for key, value in available_types.items())
+            + ",".join(f" {key} ({value})" for key, value in PIECE_TYPES.items())
         ),
         default="plate",
         type=valid_type,
     )
 
+    parser.add_argument(
+        "--lut",
+        action="store_true",
+        help="Match colors through the on-disk RGB lookup table of the palette",
+    )
+
+    parser.add_argument(
+        "--rebuild-lut",
+        action="store_true",
+        help="Rebuild the RGB lookup table and check it against exact CIEDE2000 (implies --lut)",
+    )
+
+    parser.add_argument(
+        "--merge",
+        action="store_true",
+        help="Cover same-color areas with larger parts (1x2, 2x2, 2x4...) in stock in that color, "
+        "among the parts with a known BrickLink item id",
+    )
+
+    parser.add_argument(
+        "--merge-budget",
+        type=float,
+        default=0.5,
+        help="Seconds allowed for refining merged parts (default: 0.5)",
+    )
+
+    def valid_caps(p: str) -> dict:
+        try:
+            caps = json.loads(Path(p).read_text())
+        except (OSError, ValueError) as e:
+            raise argparse.ArgumentTypeError(f"caps file '{p}' cannot be read: {e}")
+        if not isinstance(caps, dict):
+            raise argparse.ArgumentTypeError(f"caps file '{p}' must map colors to counts")
+        for color, cap in caps.items():
+            if isinstance(cap, bool) or not isinstance(cap, int) or cap < 1:
+                raise argparse.ArgumentTypeError(
+                    f"cap of '{color}' in '{p}' must be a whole number of at least 1, got {cap!r}"
+                )
+        return caps
+
+    parser.add_argument(
+        "--caps",
+        type=valid_caps,
+        default=None,
+        help='JSON file of maximum pieces per color, by BrickLink color id or name (e.g. {"11": 300, "White": 500})',
+    )
+
+    parser.add_argument(
+        "--max-per-color",
+        type=int,
+        default=None,
+        help="Maximum number of pieces of any single color",
+    )
+
+    def valid_dither(s: str) -> str:
+        import Dither
+
+        if s not in Dither.METHODS:
+            raise argparse.ArgumentTypeError(
+                f"dithering '{s}' is not a valid method. Must be one of: {', '.join(Dither.METHODS)}"
+            )
+        return s
+
+    parser.add_argument(
+        "--dither",
+        type=valid_dither,
+        default=None,
+        help="Dither the image while matching colors: bayer (ordered), rows (row-wise error diffusion) "
+        "or floyd-steinberg (serpentine, exact CIEDE2000)",
+    )
+
+    parser.add_argument(
+        "--dither-strength",
+        type=float,
+        default=None,
+        help="Amplitude of the bayer lightness offsets in delta E (default: a quarter of the median spacing of the palette)",
+    )
+
+    parser.add_argument(
+        "--save-resized",
+        action="store_true",
+        help="Also write the resized input image next to it, for debugging",
+    )
+
+    parser.add_argument(
+        "--browsers",
+        type=int,
+        default=None,
+        help=f"Number of headless browsers used in parallel for stock lookups (default: {BrowserPool.DEFAULT_SIZE})",
+    )
+
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Never scrape stock, use cached counts even if expired",
+    )
+
+    parser.add_argument(
+        "--refresh-stock",
+        action="store_true",
+        help="Ignore cached stock counts and scrape them again",
+    )
+
+    parser.add_argument(
+        "--stock-ttl",
+        type=float,
+        default=None,
+        help=f"Hours before a cached stock count expires (default: {StockCache.DEFAULT_TTL / 3600:g})",
+    )
+
+    parser.add_argument(
+        "--refresh-catalog",
+        action="store_true",
+        help="Download the BrickLink color guides again instead of using the local catalog snapshot. "
+        "Without an image, refreshes the guides of every piece type",
+    )
+
+    parser.add_argument(
+        "--catalog-max-age",
+        type=float,
+        default=None,
+        help=f"Days before a part of the catalog snapshot is downloaded again (default: {Catalog.DEFAULT_MAX_AGE / 86400:g})",
+    )
+
+    parser.add_argument(
+        "--stage-cache",
+        choices=("info", "clear"),
+        default=None,
+        help="Print the size of the cache of resized images, color matches and renders, "
+        "or clear it. Runs alone when no image is given",
+    )
+
+    parser.add_argument(
+        "--match-resolution",
+        type=float,
+        default=None,
+        help="Snap LAB values to a grid of this step in delta E before matching, so close "
+        "pixel colors share one match: faster on photos, no longer exact (default: exact)",
+    )
+
+    parser.add_argument(
+        "--no-stage-cache",
+        action="store_true",
+        help="Recompute every stage instead of reusing the results of previous runs",
+    )
+
+    parser.add_argument(
+        "--stage-cache-size",
+        type=float,
+        default=None,
+        help=f"Size in MB above which the least recently used stage results are evicted (default: {StageCache.max_bytes / 2**20:g})",
+    )
+
+    parser.add_argument(
+        "--catalog-parser",
+        choices=("auto", "stream", "lxml", "soup"),
+        default="auto",
+        help="HTML parser for the BrickLink color guides: stream (only reads the lots block), "
+        "lxml, soup (BeautifulSoup, slowest) or auto, lxml when installed (default: auto)",
+    )
+
+    parser.add_argument(
+        "--profile",
+        type=Path,
+        default=None,
+        help="Write a JSON report of stage timings, network requests and cache hit rates to this file",
+    )
+
+    parser.add_argument(
+        "--profile-stats",
+        type=Path,
+        default=None,
+        help="Also write a cProfile dump of the run to this file, for pstats or snakeviz",
+    )
+
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=8,
+        help="Maximum number of BrickLink requests in flight (default: 8)",
+    )
+
+    parser.add_argument(
+        "--rate-limit",
+        type=float,
+        default=5.0,
+        help="Maximum number of BrickLink requests per second (default: 5)",
+    )
+
     return parser
 
 
@@ -89,164 +358,629 @@ def print_color(text: str, color: tuple[int, int, int]):
     print(f"\033[48;2;{r};{g};{b}m  {text}  \033[0m")
 
 
-def image_to_matrix(
-    image_path: Path, size: tuple[int, int], piece_type: Type
-) -> list[list[str]]:
-    w, h = size
-    img = Image.open(image_path).convert("RGB").resize((w, h), Image.LANCZOS)
-    resized_path = image_path.parent / f"{image_path.stem}_resized_{w}x{h}.png"
-    img.save(resized_path)
-
-    rgb = io.imread(resized_path)
-    pixels = color.rgb2lab(rgb)
-    flat_pixels = pixels.reshape(-1, 3)
-
-    # transform colors for each pixel to nearest Lego color
-    mapped = []
-    for l, a, b in tqdm(flat_pixels, desc="Mapping colors", unit="pixel"):
-        closest_color = BrickLinkColor.get_closest_bricklink_color(
-            Color(l, a, b), piece_type
+def get_block_list(
+    board: Board,
+    image_name: str,
+    jwt: str = None,
+    concurrency: int = 8,
+    rate: float = 5.0,
+    baseplate_size: int = None,
+    baseplates: int = 1,
+) -> None:
+    import asyncio
+
+    asyncio.run(
+        build_block_list(
+            board, image_name, jwt, concurrency, rate, baseplate_size, baseplates
         )
-        mapped.append(Piece(piece_type, closest_color, (1, 1), Item.PLATE))
+    )
 
-    # Turn flat mapped list into matrix rows (height rows, each width long)
-    matrix: list[list[Piece]] = [
-        mapped[row_start : row_start + w] for row_start in range(0, w * h, w)
-    ]
-    return matrix
 
+async def build_block_list(
+    board: Board,
+    image_name: str,
+    jwt: str = None,
+    concurrency: int = 8,
+    rate: float = 5.0,
+    baseplate_size: int = None,
+    baseplates: int = 1,
+) -> None:
+    import asyncio
+    from datetime import datetime
+    from BrickLink.AsyncConnector import AsyncConnector
+    from BrickLink.Connector import Connector
+
+    counts = board.piece_counts()
+
+    async with AsyncConnector(concurrency=concurrency, rate=rate) as client:
+        # stock of every color and the wishlist are requested at the same time
+        tasks = [
+            client.get_pieces_stock(
+                [(piece.reference, piece.color.id, count) for piece, count in counts]
+            )
+        ]
+        if jwt:
+            tasks.append(
+                client.create_wishlist(f"Project {image_name} {datetime.now()}", jwt=jwt)
+            )
+        with Profiler.stage("stock"):
+            stocks, *wishlist = await asyncio.gather(*tasks)
 
-def get_block_list(matrix: list[list[Piece]], image_name: str, jwt: str = None) -> None:
-    flat = [cell for row in matrix for cell in row]
-    counts = Counter()
-    piece_map = {}
+        if jwt:
+            wishlist = wishlist[0]
+            # Add baseplate, every lot is sent at once after the list is printed
+            baseplate = Piece.get_baseplate_by_size(baseplate_size or board.height)
+            wanted = [(baseplate, baseplates)]
+
+        for (piece, count), (stock, url) in zip(counts, stocks):
+            ref = getattr(piece.reference, "name", str(piece.reference))
+            col = getattr(piece.color, "id", str(piece.color))
+            col_rgb = getattr(piece.color, "rgb_code", (255, 255, 255))
+            size = piece.size
+
+            plural = "s" if count != 1 else ""
+            size_str = f"{size[0]}x{size[1]}"
+            if stock is None:
+                stock = "unknown"
+
+            if jwt and piece.id is not None:
+                wanted.append((piece, count))
+            elif jwt:
+                print(f"Part {ref} has no known BrickLink item id, add it to the wishlist by hand.")
+
+            print_color(
+                f"You need {count} piece{plural} from {url} (ref: {ref}, color: {col}, size: {size_str}, stock: {stock})",
+                col_rgb,
+            )
 
-    if jwt:
-        wishlist = Connector.create_wishlist(
-            f"Project {image_name} {datetime.now()}", jwt=jwt
+        if jwt:
+            with Profiler.stage("wishlist"):
+                await client.add_pieces_to_wishlist(wishlist, wanted, jwt)
+            url = Connector.get_wishlist_url(wishlist)
+            print(f"Wishlist `{wishlist.name}` created: {url}.")
+
+
+def save_mural_plates(board: Board, plate_size: int, image_path: Path) -> None:
+    """
+    Render and list the pieces of each baseplate of a mural, one at a time.
+    """
+    for (row, column), plate in board.split(plate_size):
+        suffix = f"r{row + 1}_c{column + 1}"
+        out_path = image_path.parent / f"{image_path.stem}_brick_{suffix}.png"
+        out_path.write_bytes(render_png(plate, stud_size=20, show_studs=True))
+
+        parts = [
+            {
+                "ref": piece.reference,
+                "size": f"{piece.size[0]}x{piece.size[1]}",
+                "color": piece.color.id,
+                "name": piece.color.name,
+                "count": count,
+            }
+            for piece, count in plate.piece_counts()
+        ]
+        parts_path = image_path.parent / f"{image_path.stem}_parts_{suffix}.json"
+        parts_path.write_text(json.dumps(parts, indent=2))
+        print(f"Saved baseplate row {row + 1}, column {column + 1} to: {out_path}")
+
+
+def compare_piece_types(
+    image_path: Path, size: tuple[int, int], save_resized: bool = False
+) -> dict:
+    """
+    Map the image with every piece type in one pass: the image is decoded once and the
+    CIEDE2000 distances are computed once against the union of the type palettes, each
+    type then keeps the nearest of its own colors. Renders every board, writes the error,
+    piece counts and lots for sale per type to `<image>_compare.json`, and returns them.
+    """
+    import numpy as np
+    from Brick.Board import Board
+    from BrickLink.Color import Color as BrickLinkColor
+    from BrickLink.Item import Item
+    from Color import CIEDE2000_matrix
+
+    w, h = size
+    rgb, pixels, lab_key = load_lab(image_path, size, save_resized)
+
+    palettes = {}
+    with Profiler.stage("palette"):
+        for name, piece_type in PIECE_TYPES.items():
+            try:
+                palettes[name] = BrickLinkColor.get_filtered_colors(piece_type)
+            except RuntimeError as e:
+                print(f"Skipping {name}: {e}")
+    if not palettes:
+        raise RuntimeError("No piece type has a palette to compare")
+
+    # colors shared by several types are measured once
+    union = {}
+    for palette in palettes.values():
+        for c in palette:
+            union.setdefault(c.hex_code, (len(union), c.lab_code))
+    union_labs = np.array([lab for _, lab in union.values()], dtype=np.float64)
+
+    with Profiler.stage("color_matching"):
+        quantized = BrickLinkColor.match_cache.quantize(pixels.reshape(-1, 3))
+        uniques, inverse, weights = np.unique(
+            quantized, axis=0, return_inverse=True, return_counts=True
         )
-        # Add baseplate
-        Connector.add_piece_to_wishlist(
-            wishlist, Piece.get_baseplate_by_size(len(matrix)), 1, jwt
+        inverse = inverse.reshape(-1)
+        distances = CIEDE2000_matrix(uniques, union_labs)
+
+    results = {}
+    for name, palette in palettes.items():
+        piece_type = PIECE_TYPES[name]
+        columns = [union[c.hex_code][0] for c in palette]
+        nearest = distances[:, columns].argmin(axis=1)
+        errors = distances[np.arange(len(uniques)), np.array(columns)[nearest]]
+        indices = nearest[inverse]
+        # a later run with this --type reuses the matches
+        StageCache.put_arrays(
+            "indices",
+            get_indices_key(lab_key, piece_type),
+            indices=indices,
+            errors=[float("nan"), float("nan")],
         )
 
-    for piece in flat:
-        ref = getattr(piece.reference, "name", str(piece.reference))
-        col = getattr(piece.color, "id", str(piece.color))
-        col_rgb = getattr(piece.color, "rgb_code", (255, 255, 255))
-        size = piece.size
-        key = (ref, col, size, col_rgb)
-
-        counts[key] += 1
-        piece_map[key] = piece
-
-    for (ref, col, size, col_rgb), count in counts.most_common():
-        plural = "s" if count != 1 else ""
-        size_str = f"{size[0]}x{size[1]}"
-        stock, url = Connector.get_piece_stock(ref=ref, color_id=col, quantity=count)
+        board = Board(indices.reshape(h, w), palette, piece_type, Item.PLATE)
+        out_path = image_path.parent / f"{image_path.stem}_brick_{name}.png"
+        with Profiler.stage("render"):
+            out_path.write_bytes(render_png(board, stud_size=20, show_studs=True))
+
+        parts = [
+            {
+                "ref": piece.reference,
+                "color": piece.color.id,
+                "name": piece.color.name,
+                "count": count,
+                "lots": piece.color.stock,
+            }
+            for piece, count in board.piece_counts()
+        ]
+        scarcest = min(parts, key=lambda part: part["lots"])
+        total = float((errors * weights).sum())
+        results[name] = {
+            "render": str(out_path),
+            "delta_e_total": total,
+            "delta_e_mean": total / indices.size,
+            "delta_e_max": float(errors.max()),
+            "colors": len(parts),
+            "pieces": int(indices.size),
+            "min_lots": scarcest["lots"],
+            "scarcest_color": scarcest["name"],
+            "parts": parts,
+        }
+
+    print(
+        f"{'type':<12}{'colors':>7}{'dE mean':>9}{'dE max':>8}{'dE total':>10}"
+        f"{'min lots':>10}  scarcest color"
+    )
+    for name, result in sorted(results.items(), key=lambda item: item[1]["delta_e_total"]):
+        print(
+            f"{name:<12}{result['colors']:>7}{result['delta_e_mean']:>9.2f}"
+            f"{result['delta_e_max']:>8.2f}{result['delta_e_total']:>10.1f}"
+            f"{result['min_lots']:>10}  {result['scarcest_color']}"
+        )
+    out_path = image_path.parent / f"{image_path.stem}_compare.json"
+    out_path.write_text(json.dumps(results, indent=2))
+    print(f"Saved comparison of {len(results)} piece types to: {out_path}")
+    return results
+
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".gif", ".tif", ".tiff", ".webp"}
+
+
+def get_batch_paths(pattern: str) -> list[Path]:
+    path = Path(pattern)
+    if path.is_dir():
+        paths = [p for p in path.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES]
+    else:
+        paths = [Path(p) for p in glob.glob(pattern, recursive=True)]
+    # skip outputs of previous runs
+    return sorted(
+        p
+        for p in paths
+        if p.is_file()
+        and not p.stem.endswith("_brick")
+        and "_brick_" not in p.stem
+        and "_resized_" not in p.stem
+    )
 
-        if jwt:
-            piece = piece_map[(ref, col, size, col_rgb)]
-            Connector.add_piece_to_wishlist(wishlist, piece, count, jwt)
 
-        print_color(
-            f"You need {count} piece{plural} from {url} (ref: {ref}, color: {col}, size: {size_str}, stock: {stock})",
-            col_rgb,
+def process_image(
+    image_path: Path,
+    size: tuple[int, int],
+    piece_type: Type,
+    use_lut: bool = False,
+    save_resized: bool = False,
+    optimize: bool = False,
+    merge_budget: float = 0.5,
+) -> dict:
+    """
+    Map and render one image of a batch, returns its piece counts by part and color id
+    and the profiler counters of the worker for it.
+    Failures are returned instead of raised so one bad image does not stop the batch.
+    """
+    before = Profiler.counters()
+    try:
+        board = image_to_matrix(
+            image_path, size, piece_type, use_lut, save_resized=save_resized
+        )
+        if optimize:
+            optimize_board(board, piece_type, merge_budget)
+        out_path = image_path.parent / f"{image_path.stem}_brick.png"
+        with Profiler.stage("render"):
+            out_path.write_bytes(render_png(board, stud_size=20, show_studs=True))
+        counts = [
+            (piece.reference, piece.size, piece.color.id, count)
+            for piece, count in board.piece_counts()
+        ]
+        result = {"image": image_path, "render": out_path, "counts": counts}
+    except Exception as e:
+        result = {"image": image_path, "error": f"{type(e).__name__}: {e}"}
+    result["profile"] = Profiler.since(before)
+    return result
+
+
+def run_batch(
+    image_paths: list[Path],
+    size: tuple[int, int],
+    piece_type: Type,
+    workers: int,
+    use_lut: bool = False,
+    rebuild_lut: bool = False,
+    save_resized: bool = False,
+    optimize: bool = False,
+    merge_budget: float = 0.5,
+) -> list[dict]:
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    from concurrent.futures.process import BrokenProcessPool
+    from BrickLink.Color import Color as BrickLinkColor
+    from BrickLink.Connector import Connector
+
+    start = time.perf_counter()
+    warm_palette(piece_type, use_lut, rebuild_lut, optimize)
+
+    if "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+        initializer, initargs = None, ()
+    else:
+        # without fork, each worker loads the palette from the local snapshots once
+        context = None
+        initializer, initargs = warm_palette, (
+            piece_type,
+            use_lut,
+            False,
+            optimize,
+            BrickLinkColor.match_cache.resolution,
         )
 
-    if jwt:
-        url = Connector.get_wishlist_url(wishlist)
-        print(f"Wishlist `{wishlist.name}` created: {url}.")
-
-
-def render_matrix_to_image(
-    matrix: list[list[Piece]], stud_size: int = 20, show_studs: bool = True
-) -> Image.Image:
-    h = len(matrix)
-    w = len(matrix[0]) if h else 0
-
-    index_space = stud_size * 2 // 3
-    img_w = w * stud_size + index_space
-    img_h = h * stud_size + index_space
-
-    img = Image.new("RGB", (img_w, img_h), (240, 240, 240))
-    draw = ImageDraw.Draw(img)
-    font = ImageFont.load_default()
-
-    for x in range(w):
-        text = str(x + 1)
-        tx = index_space + x * stud_size + stud_size // 2
-        ty = index_space // 4
-        bbox = draw.textbbox((0, 0), text, font=font)
-        text_w = bbox[2] - bbox[0]
-        text_h = bbox[3] - bbox[1]
-        draw.text(
-            (tx - text_w // 2, ty - text_h // 2),
-            text,
-            fill=(0, 0, 0),
-            font=font,
+    def get_executor(max_workers: int) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=context,
+            initializer=initializer,
+            initargs=initargs,
         )
 
-    for y in range(h):
-        text = str(y + 1)
-        tx = index_space // 4
-        ty = index_space + y * stud_size + stud_size // 2
-        bbox = draw.textbbox((0, 0), text, font=font)
-        text_w = bbox[2] - bbox[0]
-        text_h = bbox[3] - bbox[1]
-        draw.text(
-            (tx - text_w // 2, ty - text_h // 2),
-            text,
-            fill=(0, 0, 0),
-            font=font,
+    def submit(executor: ProcessPoolExecutor, path: Path):
+        return executor.submit(
+            process_image,
+            path,
+            size,
+            piece_type,
+            use_lut or rebuild_lut,
+            save_resized,
+            optimize,
+            merge_budget,
         )
 
-    for y, row in enumerate(matrix):
-        for x, piece in enumerate(row):
-            x0 = index_space + x * stud_size
-            y0 = index_space + y * stud_size
-            x1 = x0 + stud_size
-            y1 = y0 + stud_size
-
-            # brick body
-            draw.rectangle([x0, y0, x1, y1], fill=piece.color.rgb_code)
-
-            if show_studs:
-                # stud: centered circle with slight highlight
-                cx = x0 + stud_size / 2
-                cy = y0 + stud_size / 2
-                r = stud_size * 0.35
-                stud_fill = tuple(min(255, int(c * 1.15)) for c in piece.color.rgb_code)
-                outline = (0, 0, 0)
-                draw.ellipse(
-                    [cx - r, cy - r, cx + r, cy + r], fill=stud_fill, outline=outline
-                )
+    def report(result: dict) -> None:
+        # stages ran in the worker, the parent profile adds them up
+        if "profile" in result:
+            Profiler.merge(result.pop("profile"))
+        if "error" in result:
+            print(f"Failed {result['image']}: {result['error']}")
+        else:
+            print(f"Saved rendered Lego image to: {result['render']}")
+
+    by_path = {}
+    crashed = []
+    with get_executor(max(1, workers)) as executor:
+        futures = {path: submit(executor, path) for path in image_paths}
+        for path, future in futures.items():
+            try:
+                by_path[path] = future.result()
+                report(by_path[path])
+            except BrokenProcessPool:
+                crashed.append(path)
+
+    # a dying worker breaks the whole pool, so every image still pending is retried
+    # alone and only the one that takes its worker down again fails
+    for path in crashed:
+        with get_executor(1) as executor:
+            try:
+                by_path[path] = submit(executor, path).result()
+            except BrokenProcessPool:
+                by_path[path] = {"image": path, "error": "worker process crashed"}
+        report(by_path[path])
+    results = [by_path[path] for path in image_paths]
+
+    # one stock lookup for the colors of every image
+    done = [r for r in results if "error" not in r]
+    lookups = list(
+        dict.fromkeys((ref, col) for r in done for ref, _, col, _ in r["counts"])
+    )
+    stocks = dict(
+        zip(lookups, Connector.get_pieces_stock([(ref, col, 1) for ref, col in lookups]))
+    )
+    for result in done:
+        parts = []
+        for ref, part_size, col, count in result["counts"]:
+            stock, _ = stocks[(ref, col)]
+            parts.append(
+                {
+                    "ref": ref,
+                    "size": f"{part_size[0]}x{part_size[1]}",
+                    "color": col,
+                    "count": count,
+                    "stock": stock,
+                    "url": Connector.get_bricklink_url(ref, col, count),
+                }
+            )
+        image_path = result["image"]
+        parts_path = image_path.parent / f"{image_path.stem}_parts.json"
+        parts_path.write_text(json.dumps(parts, indent=2))
+
+    elapsed = time.perf_counter() - start
+    print(
+        f"Processed {len(done)}/{len(results)} images in {elapsed:.2f}s "
+        f"({len(results) / elapsed:.2f} images/sec, {max(1, workers)} workers)"
+    )
+    return results
 
-    return img
 
+def write_profile(path: Path, elapsed: float) -> None:
+    from BrickLink.Color import Color as BrickLinkColor
+
+    cache_info = BrickLinkColor.match_cache.info()
+    Profiler.count("color_match", cache_info.hits, cache_info.misses)
+    report = Profiler.write(
+        path, wall=elapsed, peak_memory_mb=peak_memory_mb(), argv=sys.argv[1:]
+    )
+    for name, stage in report["stages"].items():
+        print(f"{name:<16} {stage['wall']:8.2f}s wall {stage['cpu']:8.2f}s cpu")
+    for kind, requests in report["requests"].items():
+        print(
+            f"{kind:<16} {requests['count']:5d} requests, {requests['failures']} failed, "
+            f"p50 {requests['p50'] * 1000:.0f}ms, p95 {requests['p95'] * 1000:.0f}ms"
+        )
+    print(f"Profile written to {path}")
+
+
+def refresh_catalog() -> None:
+    """
+    Download the color guides of every piece type and of the parts used when merging.
+    """
+    from Brick.Optimizer import merge_parts
+    from BrickLink.Connector import Connector
+
+    refs = list(PIECE_TYPES.values())
+    refs += [ref for parts in merge_parts.values() for ref, _ in parts.values()]
+    try:
+        for ref in dict.fromkeys(refs):
+            colors = Connector.get_piece_colors_with_stock(ref)
+            print(f"Part {ref}: {len(colors)} colors")
+    finally:
+        Connector.close()
+    print(f"Catalog snapshot saved to {Connector.get_catalog().path}")
+
+
+def run_stage_cache(action: str) -> None:
+    if action == "clear":
+        print(f"Removed {StageCache.clear()} entries from {StageCache.get_dir()}")
+        return
+    info = StageCache.info()
+    print(
+        f"Stage cache {info['path']}: {info['bytes'] / 2**20:.1f} MB "
+        f"of {info['max_bytes'] / 2**20:.0f} MB"
+    )
+    for name, stage in info["stages"].items():
+        print(f"{name:<8} {stage['entries']:5d} entries {stage['bytes'] / 2**20:8.1f} MB")
+
+
+def run(args: argparse.Namespace, parser: argparse.ArgumentParser) -> None:
+    from BrickLink.Color import Color as BrickLinkColor
+    from BrickLink.Connector import Connector
 
-def main():
-    # Parse command-line arguments
-    parser = init_parse()
-    args = parser.parse_args()
     image_path = args.image_path
-    image_name = basename(image_path)
-    baseplate = args.size
+    size = args.size
     jwt = args.jwt
     piece_type = args.type
 
-    matrix = image_to_matrix(image_path, baseplate.size, piece_type)
+    if args.serve:
+        from Server import Server
+
+        Server(
+            args.host,
+            args.port,
+            args.workers,
+            (piece_type,),
+            args.lut or args.rebuild_lut,
+            args.merge,
+            args.merge_budget,
+        ).serve_forever()
+        return
+
+    if args.compare_types:
+        with Profiler.stage("compare"):
+            compare_piece_types(image_path, (size, size), args.save_resized)
+        return
+
+    if args.batch is not None:
+        image_paths = get_batch_paths(args.batch)
+        if not image_paths:
+            parser.error(f"no image matches '{args.batch}'")
+        try:
+            with Profiler.stage("batch"):
+                run_batch(
+                    image_paths,
+                    (size, size),
+                    piece_type,
+                    args.workers,
+                    args.lut,
+                    args.rebuild_lut,
+                    args.save_resized,
+                    args.merge,
+                    args.merge_budget,
+                )
+        finally:
+            Connector.close()
+        return
+
+    # a mural is mapped as one image, so colors are matched once for all baseplates
+    from BrickLink.CappedAssignment import CapsError
+
+    columns, rows = args.mural or (1, 1)
+    try:
+        board = image_to_matrix(
+            image_path,
+            (columns * size, rows * size),
+            piece_type,
+            args.lut,
+            args.rebuild_lut,
+            args.save_resized,
+            args.caps,
+            args.max_per_color,
+            args.dither,
+            args.dither_strength,
+            size if args.mural else None,
+        )
+    except CapsError as e:
+        parser.error(str(e))
+    if args.merge:
+        optimize_board(board, piece_type, args.merge_budget, size if args.mural else None)
+    cache_info = BrickLinkColor.match_cache.info()
+    print(f"Color matching: {cache_info.hits} cache hits, {cache_info.misses} misses")
 
     print("Building baseplate...")
-    get_block_list(matrix, image_name, jwt)
+    try:
+        get_block_list(
+            board,
+            basename(image_path),
+            jwt,
+            args.concurrency,
+            args.rate_limit,
+            size,
+            columns * rows,
+        )
+    finally:
+        Connector.close()
     print("Baseplate fully prepared.")
 
+    if args.mural:
+        print(f"Rendering {columns}x{rows} mural baseplates...")
+        with Profiler.stage("render"):
+            save_mural_plates(board, size, image_path)
+        return
+
     print("Rendering matrix to image...")
-    out_image = render_matrix_to_image(matrix, stud_size=20, show_studs=True)
-    out_path = image_path.parent / f"{image_path.stem}_brick.png"
-    out_image.save(out_path)
+    with Profiler.stage("render"):
+        out_path = image_path.parent / f"{image_path.stem}_brick.png"
+        out_path.write_bytes(render_png(board, stud_size=20, show_studs=True))
     print(f"Saved rendered Lego image to: {out_path}")
 
 
+def main():
+    # Parse command-line arguments
+    parser = init_parse()
+    args = parser.parse_args()
+    if args.no_stage_cache:
+        StageCache.enabled = False
+    if args.stage_cache_size is not None:
+        StageCache.max_bytes = int(args.stage_cache_size * 2**20)
+    if args.match_resolution is not None:
+        from BrickLink.Color import Color as BrickLinkColor
+        from BrickLink.MatchCache import MatchCache
+
+        if args.match_resolution <= 0:
+            parser.error(f"--match-resolution must be positive, got {args.match_resolution}")
+        BrickLinkColor.match_cache = MatchCache(args.match_resolution)
+    modes = [args.image_path is not None, args.batch is not None, args.serve].count(True)
+    # cache maintenance can run on its own
+    standalone = args.stage_cache is not None or args.refresh_catalog
+    if modes > 1 or (modes == 0 and not standalone):
+        parser.error("give one of image_path, --batch or --serve")
+    if args.jwt and (args.batch is not None or args.serve):
+        parser.error(
+            "--jwt cannot be combined with --batch or --serve, "
+            "the service takes the token in the X-BrickLink-JWT header"
+        )
+    if args.refresh_catalog and args.offline:
+        parser.error("--refresh-catalog cannot be combined with --offline")
+    if args.stage_cache is not None:
+        run_stage_cache(args.stage_cache)
+    if args.mural is not None and args.image_path is None:
+        parser.error("--mural needs an image_path")
+    if args.compare_types and (
+        args.image_path is None
+        or args.mural
+        or args.merge
+        or args.dither
+        or args.lut
+        or args.rebuild_lut
+        or args.caps
+        or args.max_per_color is not None
+        or args.jwt
+    ):
+        parser.error("--compare-types only takes an image_path, --size and --save-resized")
+    if args.browsers is not None and args.browsers < 1:
+        parser.error(f"--browsers must be at least 1, got {args.browsers}")
+    if args.concurrency < 1:
+        parser.error(f"--concurrency must be at least 1, got {args.concurrency}")
+    if args.max_per_color is not None and args.max_per_color < 1:
+        parser.error(f"--max-per-color must be at least 1, got {args.max_per_color}")
+    if args.dither and (args.caps or args.max_per_color is not None):
+        parser.error("--dither cannot be combined with --caps or --max-per-color")
+    if args.dither and (args.lut or args.rebuild_lut):
+        parser.error("--dither cannot be combined with --lut")
+    if (args.caps or args.max_per_color is not None) and (args.lut or args.rebuild_lut):
+        # the capped assignment matches exactly, the table would not be used
+        parser.error("--lut cannot be combined with --caps or --max-per-color")
+    from BrickLink.Connector import Connector
+
+    if args.browsers is not None:
+        Connector.browser_pool_size = args.browsers
+    if args.stock_ttl is not None:
+        Connector.stock_ttl = args.stock_ttl * 3600
+    Connector.offline = args.offline
+    Connector.refresh_stock = args.refresh_stock
+    Connector.refresh_catalog = args.refresh_catalog
+    if args.catalog_max_age is not None:
+        Connector.catalog_max_age = args.catalog_max_age * 24 * 3600
+    Connector.catalog_parser = args.catalog_parser
+    if modes == 0:
+        if args.refresh_catalog:
+            refresh_catalog()
+        return
+
+    profiler = None
+    if args.profile_stats:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+    start = time.perf_counter()
+    try:
+        run(args, parser)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile_stats)
+        if args.profile:
+            write_profile(args.profile, time.perf_counter() - start)
+
+
 if __name__ == "__main__":
     main()
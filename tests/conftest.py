@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Cache.py reads the cache directory at import time, tests never touch the user cache
+os.environ["IMAGE_TO_LEGO_CACHE"] = tempfile.mkdtemp(prefix="image-to-lego-tests-")
+sys.path.insert(0, str(ROOT))
@@ -0,0 +1,74 @@
+import asyncio
+import time
+import pytest
+from BrickLink.AsyncConnector import AsyncConnector, TokenBucket
+from mock_server import MockServer
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+async def requests(server: MockServer, method: str, count: int, **options) -> list[int]:
+    async with AsyncConnector(backoff=0, **options) as client:
+        results = await asyncio.gather(
+            *(client._request("test", method, f"{server.url}/{i}") for i in range(count))
+        )
+    return [status for status, _ in results]
+
+
+def test_concurrency_is_bounded():
+    with MockServer(delay=0.05) as server:
+        statuses = run(requests(server, "GET", 12, concurrency=3, rate=1000))
+    assert statuses == [200] * 12
+    assert server.max_in_flight == 3
+
+
+def test_token_bucket_rate():
+    async def acquire_all():
+        bucket = TokenBucket(rate=20, capacity=2)
+        start = time.monotonic()
+        for _ in range(12):
+            await bucket.acquire()
+        return time.monotonic() - start
+
+    # the first 2 tokens are a burst, the next 10 come at 20 per second
+    assert 0.45 <= run(acquire_all()) < 1.0
+
+
+def test_requests_follow_the_rate():
+    with MockServer() as server:
+        start = time.monotonic()
+        run(requests(server, "GET", 7, concurrency=2, rate=10))
+        elapsed = time.monotonic() - start
+    assert elapsed >= 0.45
+
+
+@pytest.mark.parametrize("status", [429, 502, 503, 504])
+def test_get_is_retried(status):
+    with MockServer() as server:
+        server.responses = [(status, {}), (status, {})]
+        assert run(requests(server, "GET", 1)) == [200]
+    assert len(server.requests) == 3
+
+
+@pytest.mark.parametrize("status", [500, 502, 503, 504])
+def test_post_is_not_replayed_on_5xx(status):
+    with MockServer() as server:
+        server.responses = [(status, {})]
+        assert run(requests(server, "POST", 1)) == [status]
+    assert len(server.requests) == 1
+
+
+def test_post_is_retried_on_429():
+    with MockServer() as server:
+        server.responses = [(429, {})]
+        assert run(requests(server, "POST", 1)) == [200]
+    assert len(server.requests) == 2
+
+
+def test_retries_are_limited():
+    with MockServer() as server:
+        server.responses = [(503, {})] * 10
+        assert run(requests(server, "GET", 1, retries=2)) == [503]
+    assert len(server.requests) == 3
@@ -0,0 +1,80 @@
+import os
+import pytest
+import main
+from BrickLink.Connector import Connector
+from Profiler import Profiler
+
+process_image = main.process_image
+
+
+def crashing_process_image(image_path, *args):
+    # a segfault or the OOM killer, the worker dies without an exception
+    if "crash" in image_path.stem:
+        os._exit(1)
+    return {"image": image_path, "render": image_path, "counts": []}
+
+
+@pytest.fixture
+def batch(tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "process_image", crashing_process_image)
+    monkeypatch.setattr(main, "warm_palette", lambda *args: None)
+    monkeypatch.setattr(Connector, "get_pieces_stock", classmethod(lambda cls, lookups: []))
+    paths = []
+    for name in ["a", "b", "crash", "c", "d", "e"]:
+        path = tmp_path / f"{name}.jpg"
+        path.write_bytes(b"")
+        paths.append(path)
+    return paths
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_worker_crash_fails_only_its_image(batch, workers):
+    results = main.run_batch(batch, (16, 16), main.Type.PLATE, workers)
+    assert [r["image"] for r in results] == batch
+    failed = [r["image"].stem for r in results if "error" in r]
+    assert failed == ["crash"]
+
+
+def test_worker_stages_are_added_to_the_profile(batch, monkeypatch):
+    def image_to_matrix(*args, **kwargs):
+        with Profiler.stage("load_image"):
+            Profiler.count("stage_lab", misses=1)
+            raise ValueError("not an image")
+
+    monkeypatch.setattr(main, "process_image", process_image)
+    monkeypatch.setattr(main, "image_to_matrix", image_to_matrix)
+    Profiler.reset()
+    main.run_batch(batch[:2], (16, 16), main.Type.PLATE, 2)
+    report = Profiler.report()
+    assert report["stages"]["load_image"]["calls"] == 2
+    assert report["caches"]["stage_lab"]["misses"] == 2
+    Profiler.reset()
+
+
+def test_worker_render_is_added_to_the_profile(batch, monkeypatch):
+    import numpy as np
+    from Brick.Board import Board
+    from BrickLink.Color import Color as BrickLinkColor
+
+    palette = [BrickLinkColor(0, "White", "ffffff", 10)]
+    monkeypatch.setattr(main, "process_image", process_image)
+    monkeypatch.setattr(
+        main,
+        "image_to_matrix",
+        lambda *args, **kwargs: Board(np.zeros((2, 2), dtype=np.intp), palette, main.Type.PLATE, "3024"),
+    )
+    monkeypatch.setattr(
+        Connector, "get_pieces_stock", classmethod(lambda cls, lookups: [(100, None)] * len(lookups))
+    )
+    Profiler.reset()
+    results = main.run_batch(batch[:2], (2, 2), main.Type.PLATE, 2)
+    assert not any("error" in r for r in results)
+    assert Profiler.report()["stages"]["render"]["calls"] == 2
+    Profiler.reset()
+
+
+def test_jwt_is_rejected_in_batch_mode(monkeypatch, capsys):
+    monkeypatch.setattr("sys.argv", ["main.py", "--batch", "*.jpg", "--jwt", "token"])
+    with pytest.raises(SystemExit):
+        main.main()
+    assert "--jwt cannot be combined with --batch" in capsys.readouterr().err
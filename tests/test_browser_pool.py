@@ -0,0 +1,70 @@
+import threading
+import time
+import pytest
+from BrickLink.BrowserPool import BrowserPool
+
+
+class FakeElement:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeDriver:
+    """
+    Stands in for a WebDriver: "pages" are a dict of element id -> text.
+    """
+
+    def __init__(self, pages: dict, delay: float = 0.0):
+        self.pages = pages
+        self.delay = delay
+        self.url = None
+        self.quit_called = False
+
+    def get(self, url: str) -> None:
+        time.sleep(self.delay)
+        self.url = url
+
+    def find_element(self, by, element_id: str) -> FakeElement:
+        return FakeElement(self.pages.get(self.url, {}).get(element_id, ""))
+
+    def quit(self) -> None:
+        self.quit_called = True
+
+
+def test_pool_reuses_at_most_size_drivers():
+    pages = {f"page{i}": {"stock": f" {i} "} for i in range(20)}
+    drivers = []
+    lock = threading.Lock()
+
+    def factory():
+        with lock:
+            drivers.append(FakeDriver(pages, delay=0.01))
+            return drivers[-1]
+
+    with BrowserPool(size=3, timeout=1, driver_factory=factory) as pool:
+        texts = pool.map_element_text([f"page{i}" for i in range(20)], "stock")
+    assert texts == [str(i) for i in range(20)]
+    assert 1 <= len(drivers) <= 3
+    assert all(driver.quit_called for driver in drivers)
+
+
+def test_missing_element_times_out_as_none():
+    with BrowserPool(size=1, timeout=0.2, driver_factory=lambda: FakeDriver({})) as pool:
+        assert pool.get_element_text("empty", "stock") is None
+
+
+def test_size_below_one_is_rejected():
+    with pytest.raises(ValueError):
+        BrowserPool(size=0)
+
+
+def test_chrome_on_a_local_page(tmp_path):
+    page = tmp_path / "stock.html"
+    page.write_text('<html><body><span id="stock">42 lots</span></body></html>')
+    pool = BrowserPool(size=1, timeout=5)
+    try:
+        pool._release(pool._acquire())
+    except Exception as e:
+        pytest.skip(f"headless Chrome is not available: {type(e).__name__}")
+    with pool:
+        assert pool.get_element_text(page.as_uri(), "stock") == "42 lots"
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+from BrickLink.CappedAssignment import CappedAssignment, CapsError
+
+
+def test_caps_are_respected_at_minimal_cost():
+    rng = np.random.default_rng(3)
+    distances = rng.uniform(0, 50, (30, 5))
+    weights = rng.integers(1, 20, 30)
+    caps = np.full(5, np.ceil(weights.sum() / 5) + 1)
+
+    flows = CappedAssignment.solve(distances, weights, caps)
+    np.testing.assert_array_equal(flows.sum(axis=1), weights)
+    assert (flows.sum(axis=0) <= caps).all()
+
+
+@pytest.mark.parametrize("caps", [[0, np.inf], [2.5, np.inf]])
+def test_caps_must_be_whole_pieces(caps):
+    with pytest.raises(CapsError):
+        CappedAssignment.solve([[0.0, 1.0]], [3], caps)
+
+
+def test_too_few_pieces_is_reported():
+    with pytest.raises(CapsError, match="allow 4 pieces, the board needs 6"):
+        CappedAssignment.solve([[0.0, 1.0], [1.0, 0.0]], [3, 3], [2, 2])
+
+
+@pytest.mark.parametrize("seed", range(6))
+def test_assignment_is_minimal(seed):
+    linprog = pytest.importorskip("scipy.optimize").linprog
+    rng = np.random.default_rng(seed)
+    groups, k = rng.integers(3, 9), rng.integers(2, 6)
+    distances = rng.uniform(0, 50, (groups, k))
+    weights = rng.integers(1, 10, groups)
+    caps = rng.integers(1, weights.sum(), k).astype(float)
+    caps[rng.integers(k)] = weights.sum()  # always feasible
+
+    flows = CappedAssignment.solve(distances, weights, caps)
+    # transportation problem: every group fully assigned, colors within their caps
+    rows = np.kron(np.eye(groups), np.ones(k))
+    columns = np.tile(np.eye(k), groups)
+    expected = linprog(
+        distances.reshape(-1), A_ub=columns, b_ub=caps, A_eq=rows, b_eq=weights, bounds=(0, None)
+    )
+    assert expected.success
+    assert (distances * flows).sum() == pytest.approx(expected.fun, rel=1e-9, abs=1e-6)
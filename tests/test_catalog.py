@@ -0,0 +1,74 @@
+import json
+import time
+import pytest
+import main
+from BrickLink.Catalog import Catalog
+from BrickLink.Color import Color as BrickLinkColor
+from BrickLink.Connector import Connector
+
+
+def colors(n: int = 3) -> list[BrickLinkColor]:
+    return [BrickLinkColor(i, f"Color {i}", "%06x" % (i * 0x101010), 50) for i in range(n)]
+
+
+@pytest.fixture
+def catalog(tmp_path, monkeypatch):
+    catalog = Catalog(tmp_path / "catalog.json", max_age=3600)
+    monkeypatch.setattr(Connector, "_catalog", catalog)
+    monkeypatch.setattr(Connector, "offline", False)
+    monkeypatch.setattr(Connector, "refresh_catalog", False)
+    Connector.get_piece_colors_with_stock.cache_clear()
+    yield catalog
+    Connector.get_piece_colors_with_stock.cache_clear()
+
+
+def age(catalog: Catalog, ref: str, seconds: float) -> None:
+    data = json.loads(catalog.path.read_text())
+    data["parts"][ref]["fetched_at"] = time.time() - seconds
+    catalog.path.write_text(json.dumps(data))
+    catalog._parts = None
+
+
+def test_stale_parts_are_missing_unless_allowed(catalog):
+    catalog.put_colors("3024", colors())
+    assert len(catalog.get_colors("3024")) == 3
+    age(catalog, "3024", 7200)
+    assert catalog.get_colors("3024") is None
+    assert len(catalog.get_colors("3024", allow_stale=True)) == 3
+
+
+def test_empty_scrape_is_not_saved(catalog):
+    catalog.put_colors("3024", [])
+    assert catalog.get_colors("3024") is None
+    assert not catalog.path.exists()
+
+
+def test_empty_scrape_keeps_the_previous_snapshot(catalog, monkeypatch, capsys):
+    catalog.put_colors("3024", colors())
+    age(catalog, "3024", 7200)
+    monkeypatch.setattr(Connector, "fetch_piece_colors_with_stock", staticmethod(lambda ref: []))
+    assert len(Connector.get_piece_colors_with_stock("3024")) == 3
+    assert "using the saved snapshot" in capsys.readouterr().out
+
+
+def test_stale_part_is_downloaded_again(catalog, monkeypatch):
+    catalog.put_colors("3024", colors(2))
+    age(catalog, "3024", 7200)
+    monkeypatch.setattr(Connector, "fetch_piece_colors_with_stock", staticmethod(lambda ref: colors(4)))
+    assert len(Connector.get_piece_colors_with_stock("3024")) == 4
+    assert len(catalog.get_colors("3024")) == 4
+
+
+def test_refresh_catalog_runs_without_an_image(catalog, monkeypatch, capsys):
+    fetched = []
+
+    def fetch(ref):
+        fetched.append(ref)
+        return colors()
+
+    monkeypatch.setattr(Connector, "fetch_piece_colors_with_stock", staticmethod(fetch))
+    monkeypatch.setattr(Connector, "close", classmethod(lambda cls: None))
+    monkeypatch.setattr("sys.argv", ["main.py", "--refresh-catalog"])
+    main.main()
+    assert set(main.PIECE_TYPES.values()) <= set(fetched)
+    assert all(catalog.get_colors(ref) for ref in fetched)
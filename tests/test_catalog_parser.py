@@ -0,0 +1,36 @@
+from pathlib import Path
+import pytest
+from BrickLink.CatalogParser import CatalogParser
+
+ROOT = Path(__file__).resolve().parent.parent
+FIXTURES = sorted((ROOT / "benchmarks" / "fixtures").glob("catalog_*.html"))
+BACKENDS = [
+    backend
+    for backend in CatalogParser.BACKENDS
+    if backend != "lxml" or CatalogParser.has_lxml()
+]
+
+
+def rows(colors) -> list[tuple]:
+    return [(c.id, c.name, c.hex_code, c.stock) for c in colors]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("fixture", FIXTURES, ids=lambda path: path.stem)
+def test_backends_read_pages_like_soup(fixture, backend):
+    html = fixture.read_text()
+    expected = rows(CatalogParser.parse_soup(html))
+    assert expected
+    assert rows(CatalogParser.parse(html, backend)) == expected
+
+
+def test_layout_drift_falls_back_to_soup():
+    # a cell opening between the block's cell and its title misleads the stream extractor
+    html = FIXTURES[0].read_text().replace(
+        '<div class="pciColorTitle">Lots For Sale:</div>',
+        '<table><tr><td>Legend</td></tr></table><div class="pciColorTitle">Lots For Sale:</div>',
+        1,
+    )
+    assert CatalogParser.parse_stream(html) == []
+    assert rows(CatalogParser.parse(html, "stream")) == rows(CatalogParser.parse_soup(html))
+    assert CatalogParser.parse(html, "stream")
@@ -0,0 +1,79 @@
+import pytest
+import main
+
+
+@pytest.mark.parametrize("option", ["--browsers", "--concurrency", "--max-per-color"])
+@pytest.mark.parametrize("value", ["0", "-2"])
+def test_counts_below_one_are_rejected(option, value, monkeypatch, capsys):
+    monkeypatch.setattr("sys.argv", ["main.py", "--serve", option, value])
+    with pytest.raises(SystemExit) as exit_info:
+        main.main()
+    assert exit_info.value.code == 2
+    assert f"{option} must be at least 1" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("caps", ['{"White": 0}', '{"White": 2.5}', "[300]"])
+def test_caps_below_one_or_fractional_are_rejected(caps, tmp_path, monkeypatch, capsys):
+    path = tmp_path / "caps.json"
+    path.write_text(caps)
+    image = tmp_path / "image.png"
+    image.write_bytes(b"")
+    monkeypatch.setattr("sys.argv", ["main.py", str(image), "--caps", str(path)])
+    with pytest.raises(SystemExit) as exit_info:
+        main.main()
+    assert exit_info.value.code == 2
+    assert "caps.json" in capsys.readouterr().err
+
+
+def test_infeasible_caps_are_a_usage_error(tmp_path, monkeypatch, capsys):
+    from BrickLink.CappedAssignment import CapsError
+
+    def image_to_matrix(*args, **kwargs):
+        raise CapsError("Color caps allow 10 pieces, the board needs 1024")
+
+    image = tmp_path / "image.png"
+    image.write_bytes(b"")
+    monkeypatch.setattr(main, "image_to_matrix", image_to_matrix)
+    monkeypatch.setattr("sys.argv", ["main.py", str(image), "--max-per-color", "10", "--offline"])
+    with pytest.raises(SystemExit) as exit_info:
+        main.main()
+    assert exit_info.value.code == 2
+    assert "Color caps allow 10 pieces" in capsys.readouterr().err
+
+
+def test_help_shows_the_connector_defaults(capsys):
+    from BrickLink.Connector import Connector
+
+    help_text = " ".join(main.init_parse().format_help().split())
+    assert f"stock lookups (default: {Connector.browser_pool_size})" in help_text
+    assert f"expires (default: {Connector.stock_ttl / 3600:g})" in help_text
+    assert f"downloaded again (default: {Connector.catalog_max_age / 86400:g})" in help_text
+
+
+def test_lut_is_rejected_with_caps(tmp_path, monkeypatch, capsys):
+    image = tmp_path / "image.png"
+    image.write_bytes(b"")
+    monkeypatch.setattr("sys.argv", ["main.py", str(image), "--max-per-color", "10", "--lut"])
+    with pytest.raises(SystemExit) as exit_info:
+        main.main()
+    assert exit_info.value.code == 2
+    assert "--lut cannot be combined with --caps" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("value", ["0", "-0.5"])
+def test_match_resolution_must_be_positive(value, monkeypatch, capsys):
+    monkeypatch.setattr("sys.argv", ["main.py", "--serve", "--match-resolution", value])
+    with pytest.raises(SystemExit) as exit_info:
+        main.main()
+    assert exit_info.value.code == 2
+    assert "--match-resolution must be positive" in capsys.readouterr().err
+
+
+def test_match_resolution_replaces_the_match_cache(monkeypatch):
+    from BrickLink.Color import Color as BrickLinkColor
+
+    monkeypatch.setattr(BrickLinkColor, "match_cache", BrickLinkColor.match_cache)
+    monkeypatch.setattr(main, "run", lambda args, parser: None)
+    monkeypatch.setattr("sys.argv", ["main.py", "--serve", "--match-resolution", "1.5"])
+    main.main()
+    assert BrickLinkColor.match_cache.resolution == 1.5
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from Color import CIEDE2000, CIEDE2000_matrix, CIEDE2000_pairs
+
+
+def random_labs(n: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return np.column_stack(
+        [rng.uniform(0, 100, n), rng.uniform(-110, 110, n), rng.uniform(-110, 110, n)]
+    )
+
+
+# neutral grays (zero chroma) and pairs whose hues sit on both sides of 0/360 degrees
+EDGE_CASES = np.array(
+    [
+        [50.0, 0.0, 0.0],
+        [0.0, 0.0, 0.0],
+        [100.0, 0.0, 0.0],
+        [50.0, 0.0, 20.0],
+        [50.0, 0.0, -20.0],
+        [50.0, 20.0, 0.0],
+        [50.0, -20.0, 0.0],
+        [50.0, 30.0, 1.0],
+        [50.0, 30.0, -1.0],
+        [60.0, -30.0, 1e-3],
+        [60.0, -30.0, -1e-3],
+        [50.0, 2.5, 0.0],
+        [73.0, 25.0, -18.0],
+    ]
+)
+
+
+def scalar_matrix(labs: np.ndarray, palette: np.ndarray) -> np.ndarray:
+    return np.array([[CIEDE2000(lab, color) for color in palette] for lab in labs])
+
+
+@pytest.mark.parametrize(
+    "labs, palette",
+    [
+        (random_labs(200, 0), random_labs(40, 1)),
+        (EDGE_CASES, EDGE_CASES),
+        (random_labs(50, 2), EDGE_CASES),
+    ],
+)
+def test_matrix_matches_scalar(labs, palette):
+    expected = scalar_matrix(labs, palette)
+    np.testing.assert_allclose(CIEDE2000_matrix(labs, palette), expected, rtol=0, atol=1e-9)
+
+
+def test_pairs_match_scalar():
+    labs_1 = np.vstack([random_labs(300, 3), EDGE_CASES, EDGE_CASES])
+    labs_2 = np.vstack([random_labs(300, 4), EDGE_CASES, EDGE_CASES[::-1]])
+    expected = np.array([CIEDE2000(a, b) for a, b in zip(labs_1, labs_2)])
+    np.testing.assert_allclose(CIEDE2000_pairs(labs_1, labs_2), expected, rtol=0, atol=1e-9)
+
+
+def test_identical_colors_have_no_distance():
+    labs = np.vstack([random_labs(20, 5), EDGE_CASES])
+    np.testing.assert_allclose(CIEDE2000_pairs(labs, labs), 0, atol=1e-9)
+
+
+def test_sharma_reference_pairs():
+    # pairs 1, 7, 17 and 25 of the Sharma, Wu and Dalal test data
+    labs_1 = [[50, 2.6772, -79.7751], [50, 0, 0], [50, 2.5, 0], [60.2574, -34.0099, 36.2677]]
+    labs_2 = [[50, 0, -82.7485], [50, -1, 2], [73, 25, -18], [60.4626, -34.1751, 39.4387]]
+    expected = [2.0425, 2.3669, 27.1492, 1.2644]
+    np.testing.assert_allclose(CIEDE2000_pairs(labs_1, labs_2), expected, atol=1e-4)
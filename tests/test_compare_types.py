@@ -0,0 +1,75 @@
+import json
+import shutil
+from pathlib import Path
+import numpy as np
+import pytest
+from PIL import Image
+import main
+import Pipeline
+from BrickLink.Catalog import Catalog
+from BrickLink.Color import Color as BrickLinkColor
+from BrickLink.Connector import Connector
+from Color import CIEDE2000_matrix
+from StageCache import StageCache
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture
+def fixture_catalog(tmp_path, monkeypatch):
+    path = tmp_path / "catalog.json"
+    shutil.copy(ROOT / "benchmarks" / "fixtures" / "catalog.json", path)
+    monkeypatch.setattr(Connector, "_catalog", Catalog(path))
+    monkeypatch.setattr(Connector, "offline", True)
+    monkeypatch.setattr(StageCache, "enabled", True)
+
+    def clear():
+        Connector.get_piece_colors_with_stock.cache_clear()
+        BrickLinkColor.get_palette_fingerprint.cache_clear()
+        BrickLinkColor.get_palette_index.cache_clear()
+        BrickLinkColor.match_cache.clear()
+
+    clear()
+    yield
+    clear()
+
+
+def test_compare_types_offline(fixture_catalog, tmp_path, monkeypatch):
+    rng = np.random.default_rng(13)
+    image = tmp_path / "photo.png"
+    Image.fromarray(rng.integers(0, 256, (60, 60, 3), dtype=np.uint8)).save(image)
+    monkeypatch.setattr(
+        "sys.argv", ["main.py", str(image), "--compare-types", "-s", "16", "--offline"]
+    )
+    main.main()
+
+    results = json.loads((tmp_path / "photo_compare.json").read_text())
+    # only plates and tiles are in the fixture catalog, the other types are skipped
+    assert set(results) == {"plate", "tile"}
+
+    _, pixels, lab_key = Pipeline.load_lab(image, (16, 16))
+    for name, result in results.items():
+        piece_type = main.PIECE_TYPES[name]
+        palette = BrickLinkColor.get_filtered_colors(piece_type)
+        assert (tmp_path / f"photo_brick_{name}.png").is_file()
+
+        # the union palette pass picks what matching with the type's own palette picks
+        key = Pipeline.get_indices_key(lab_key, piece_type)
+        indices = StageCache.get_arrays("indices", key)["indices"]
+        labs = pixels.reshape(-1, 3)
+        expected = BrickLinkColor.get_closest_bricklink_indices(labs, piece_type)
+        np.testing.assert_array_equal(indices, expected)
+
+        counts = np.bincount(expected, minlength=len(palette))
+        assert {part["color"]: part["count"] for part in result["parts"]} == {
+            palette[i].id: int(count) for i, count in enumerate(counts) if count
+        }
+        assert result["pieces"] == 16 * 16
+        assert result["colors"] == int((counts > 0).sum())
+        distances = CIEDE2000_matrix(labs, np.array([c.lab_code for c in palette]))
+        total = distances[np.arange(len(labs)), expected].sum()
+        assert result["delta_e_total"] == pytest.approx(total)
+        assert result["delta_e_mean"] == pytest.approx(total / 256)
+        assert result["delta_e_max"] <= result["delta_e_total"]
+        scarcest = min(result["parts"], key=lambda part: part["lots"])
+        assert (result["min_lots"], result["scarcest_color"]) == (scarcest["lots"], scarcest["name"])
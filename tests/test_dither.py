@@ -0,0 +1,29 @@
+import numpy as np
+import Dither
+from Color import CIEDE2000
+
+
+def test_bayer_offsets_only_move_lightness():
+    rng = np.random.default_rng(5)
+    labs = rng.uniform([0, -60, -60], [100, 60, 60], (8, 8, 3))
+    seen = []
+
+    def nearest(values):
+        seen.append(values)
+        return np.zeros(len(values), dtype=np.intp)
+
+    Dither.ordered_dither(labs, [[0, 0, 0], [100, 0, 0]], nearest, strength=10)
+    offset = seen[0].reshape(labs.shape) - labs
+    np.testing.assert_array_equal(offset[..., 1:], 0)
+    assert np.abs(offset[..., 0]).max() <= 5
+    assert np.ptp(offset[..., 0]) > 0
+
+
+def test_compiled_scan_matches_plain_python():
+    rng = np.random.default_rng(6)
+    labs = rng.uniform([0, -60, -60], [100, 60, 60], (6, 7, 3))
+    palette = rng.uniform([0, -60, -60], [100, 60, 60], (12, 3))
+    plain = Dither._floyd_steinberg_kernel(CIEDE2000)(
+        labs, palette, np.empty((6, 7), dtype=np.intp)
+    )
+    np.testing.assert_array_equal(Dither.floyd_steinberg(labs, palette), plain)
@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+from BrickLink.Color import Color as BrickLinkColor
+from BrickLink.MatchCache import MatchCache
+from Color import CIEDE2000_matrix
+
+PIECE_TYPE = "test-palette"
+
+
+@pytest.fixture
+def palette(monkeypatch):
+    rng = np.random.default_rng(7)
+    colors = [
+        BrickLinkColor(i, f"Color {i}", "%02x%02x%02x" % tuple(rng.integers(0, 256, 3)), 100)
+        for i in range(40)
+    ]
+    original = BrickLinkColor.get_filtered_colors
+    monkeypatch.setattr(
+        BrickLinkColor,
+        "get_filtered_colors",
+        staticmethod(lambda piece_type: colors if piece_type == PIECE_TYPE else original(piece_type)),
+    )
+    BrickLinkColor.match_cache.clear()
+    yield colors
+    BrickLinkColor.get_palette_fingerprint.cache_clear()
+    BrickLinkColor.get_palette_index.cache_clear()
+    BrickLinkColor.match_cache.clear()
+
+
+def test_indices_are_exact_ciede2000(palette):
+    rng = np.random.default_rng(8)
+    # every value twice, the second lookup is a cache hit
+    labs = rng.uniform([0, -80, -80], [100, 80, 80], (500, 3))
+    labs = np.vstack([labs, labs])
+    palette_labs = np.array([c.lab_code for c in palette])
+
+    indices = BrickLinkColor.get_closest_bricklink_indices(labs, PIECE_TYPE)
+    expected = CIEDE2000_matrix(labs, palette_labs).argmin(axis=1)
+    np.testing.assert_array_equal(indices, expected)
+    assert BrickLinkColor.match_cache.info().currsize == 500
+
+
+def test_cache_keys_are_exact_by_default():
+    cache = MatchCache()
+    labs = [[50.0, 10.0, 10.0], [50.1, 10.0, 10.0]]
+    np.testing.assert_array_equal(cache.quantize(labs), labs)
+    assert cache.key(labs[0], "t", "f") != cache.key(labs[1], "t", "f")
+
+
+def test_cache_resolution_snaps_values():
+    cache = MatchCache(resolution=0.5)
+    assert cache.key([50.0, 10.0, 10.0], "t", "f") == cache.key([50.1, 10.1, 9.9], "t", "f")
+    np.testing.assert_array_equal(cache.quantize([[50.1, 10.3, -9.9]]), [[50.0, 10.5, -10.0]])
+    with pytest.raises(ValueError):
+        MatchCache(resolution=0)
+
+
+def test_caps_skip_the_nearest_color_match(palette):
+    import Pipeline
+    from Profiler import Profiler
+    from skimage import color
+
+    rng = np.random.default_rng(10)
+    rgb = rng.integers(0, 256, (16, 16, 3), dtype=np.uint8)
+    Profiler.reset()
+    indices, base_error, capped_error = Pipeline.match_colors(
+        rgb, color.rgb2lab(rgb), PIECE_TYPE, max_per_color=20
+    )
+    assert np.bincount(indices).max() <= 20
+    assert capped_error >= base_error
+    assert "color_matching" not in Profiler.report()["stages"]
+    assert BrickLinkColor.match_cache.info().misses == 0
+    Profiler.reset()
+
+
+def test_mural_plates_match_like_the_whole_image(palette):
+    import Pipeline
+    from skimage import color
+
+    rng = np.random.default_rng(9)
+    rgb = rng.integers(0, 256, (32, 48, 3), dtype=np.uint8)
+    pixels = color.rgb2lab(rgb)
+    whole, _, _ = Pipeline.match_colors(rgb, pixels, PIECE_TYPE)
+    plates = Pipeline.match_plates(rgb, pixels, 16, PIECE_TYPE)
+    np.testing.assert_array_equal(plates, whole)
+
+
+def test_warm_palette_takes_the_match_resolution(palette, monkeypatch):
+    from Pipeline import warm_palette
+
+    monkeypatch.setattr(BrickLinkColor, "match_cache", BrickLinkColor.match_cache)
+    warm_palette(PIECE_TYPE, match_resolution=2.0)
+    assert BrickLinkColor.match_cache.resolution == 2.0
+    cache = BrickLinkColor.match_cache
+    warm_palette(PIECE_TYPE, match_resolution=2.0)
+    assert BrickLinkColor.match_cache is cache
+    warm_palette(PIECE_TYPE)
+    assert BrickLinkColor.match_cache.resolution is None
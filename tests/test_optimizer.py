@@ -0,0 +1,96 @@
+import time
+import numpy as np
+import pytest
+from Brick import Optimizer as optimizer_module
+from Brick.Board import Board
+from Brick.Optimizer import Optimizer
+from Brick.Type import Type
+from BrickLink.Color import Color as BrickLinkColor
+
+PARTS = {
+    (1, 2): (Type.PLATE_1_2, "1"),
+    (1, 4): (Type.PLATE_1_4, "2"),
+    (2, 2): (Type.PLATE_2_2, "3"),
+    (2, 4): (Type.PLATE_2_4, "4"),
+}
+PALETTE = [BrickLinkColor(i, f"Color {i}", "%06x" % (i * 0x202020), 10) for i in range(4)]
+
+
+def board(size: int, seed: int = 0) -> Board:
+    # blocks of 1 to 4 cells so every part size has room
+    rng = np.random.default_rng(seed)
+    indices = np.zeros((size, size), dtype=np.intp)
+    y = 0
+    while y < size:
+        height = int(rng.integers(1, 5))
+        x = 0
+        while x < size:
+            width = int(rng.integers(1, 5))
+            indices[y : y + height, x : x + width] = rng.integers(len(PALETTE))
+            x += width
+        y += height
+    return Board(indices, PALETTE, Type.PLATE, "381")
+
+
+def optimizer(available: dict = None, time_budget: float = 0.5) -> Optimizer:
+    if available is None:
+        available = {reference: {c.id for c in PALETTE} for reference, _ in PARTS.values()}
+    return Optimizer(PARTS, available, time_budget)
+
+
+def cover(board: Board, placements) -> np.ndarray:
+    covered = np.zeros((board.height, board.width), dtype=int)
+    for p in placements:
+        covered[p.y : p.y + p.height, p.x : p.x + p.width] += 1
+    return covered
+
+
+def test_placements_cover_every_cell_once_in_one_color():
+    b = board(32)
+    placements = optimizer().optimize(b)
+    np.testing.assert_array_equal(cover(b, placements), 1)
+    for p in placements:
+        assert (b.indices[p.y : p.y + p.height, p.x : p.x + p.width] == p.index).all()
+        if (p.height, p.width) == (1, 1):
+            assert (p.reference, p.item) == (Type.PLATE, "381")
+        else:
+            assert PARTS[p.size] == (p.reference, p.item)
+    assert len(placements) < b.height * b.width
+
+
+def test_parts_never_cross_a_baseplate():
+    b = Board(np.zeros((24, 24), dtype=np.intp), PALETTE, Type.PLATE, "381")
+    placements = optimizer().optimize(b, plate_size=6)
+    np.testing.assert_array_equal(cover(b, placements), 1)
+    for p in placements:
+        assert p.y // 6 == (p.y + p.height - 1) // 6
+        assert p.x // 6 == (p.x + p.width - 1) // 6
+    # 36 cells of one color need at least 5 parts of 8 cells at most, per plate
+    assert len(placements) == 16 * 5
+
+
+def test_parts_out_of_stock_in_a_color_are_not_used():
+    available = {reference: {c.id for c in PALETTE} for reference, _ in PARTS.values()}
+    available[Type.PLATE_2_4] = {0, 1}
+    available[Type.PLATE_2_2] = set()
+    b = board(32, seed=1)
+    placements = optimizer(available).optimize(b)
+    np.testing.assert_array_equal(cover(b, placements), 1)
+    for p in placements:
+        if p.reference in (Type.PLATE_2_4, Type.PLATE_2_2):
+            assert PALETTE[p.index].id in available[p.reference]
+    assert not any(p.reference == Type.PLATE_2_2 for p in placements)
+    assert any(p.reference == Type.PLATE_2_4 for p in placements)
+
+
+def test_48x48_board_within_the_time_budget():
+    b = board(48, seed=2)
+    start = time.perf_counter()
+    placements = optimizer(time_budget=0.5).optimize(b)
+    assert time.perf_counter() - start < 1.0
+    np.testing.assert_array_equal(cover(b, placements), 1)
+
+
+@pytest.mark.parametrize("piece_type", list(optimizer_module.merge_parts))
+def test_merge_parts_only_lists_orderable_parts(piece_type):
+    assert all(item is not None for _, item in optimizer_module.merge_parts[piece_type].values())
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+from BrickLink.PaletteIndex import PaletteIndex
+from Color import CIEDE2000_matrix
+
+
+def random_labs(n: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return np.column_stack(
+        [rng.uniform(0, 100, n), rng.uniform(-128, 128, n), rng.uniform(-128, 128, n)]
+    )
+
+
+@pytest.mark.parametrize("palette_size", [1, 2, 40, 160])
+def test_query_matches_exhaustive_scan(palette_size):
+    palette = random_labs(palette_size, palette_size)
+    labs = random_labs(3000, 1)
+    index = PaletteIndex(palette)
+    expected = CIEDE2000_matrix(labs, palette).argmin(axis=1)
+    np.testing.assert_array_equal(index.query(labs), expected)
+    assert index.evaluated <= index.total + len(labs) * index.seeds
+
+
+def test_query_across_chunks(monkeypatch):
+    monkeypatch.setattr(PaletteIndex, "chunk_size", 100)
+    palette = random_labs(30, 2)
+    labs = random_labs(1050, 3)
+    expected = CIEDE2000_matrix(labs, palette).argmin(axis=1)
+    np.testing.assert_array_equal(PaletteIndex(palette).query(labs), expected)
+
+
+def test_ties_keep_the_first_color():
+    palette = np.array([[50.0, 10.0, 0.0], [50.0, 10.0, 0.0], [20.0, 0.0, 0.0]])
+    assert PaletteIndex(palette).query([[50.0, 10.0, 0.0], [49.0, 9.0, 1.0]]).tolist() == [0, 0]
+
+
+def test_verify():
+    assert PaletteIndex(random_labs(60, 4)).verify(samples=2000)
+
+
+def test_empty_input_and_palette():
+    assert PaletteIndex(random_labs(5, 5)).query(np.empty((0, 3))).shape == (0,)
+    with pytest.raises(ValueError):
+        PaletteIndex(np.empty((0, 3)))
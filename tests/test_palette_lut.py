@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+from BrickLink import PaletteLUT as lut_module
+from BrickLink.Color import Color as BrickLinkColor
+from BrickLink.PaletteLUT import PaletteLUT
+
+RULES = "type=Solid;stock>0"
+
+
+def colors(hex_codes: list[str]) -> list[BrickLinkColor]:
+    return [BrickLinkColor(i, f"Color {i}", code, 10) for i, code in enumerate(hex_codes)]
+
+
+PALETTE = colors(["000000", "FFFFFF", "C91A09", "0055BF", "237841", "F2CD37"])
+
+
+@pytest.fixture(autouse=True)
+def lut_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(lut_module, "get_cache_dir", lambda name: tmp_path)
+    return tmp_path
+
+
+def test_build_is_saved_under_its_fingerprint_and_reused(lut_dir, monkeypatch):
+    lut = PaletteLUT("3024", PALETTE, RULES, bits=4)
+    table = lut.load()
+    assert lut.path == lut_dir / f"{lut.fingerprint}.npy"
+    assert lut.path.is_file()
+
+    again = PaletteLUT("3024", PALETTE, RULES, bits=4)
+    monkeypatch.setattr(PaletteLUT, "build", lambda self: pytest.fail("table rebuilt"))
+    np.testing.assert_array_equal(again.load(), table)
+
+
+def test_palette_or_rules_change_gives_a_new_table(lut_dir):
+    lut = PaletteLUT("3024", PALETTE, RULES, bits=4)
+    changed = [
+        PaletteLUT("3024", PALETTE[:-1], RULES, bits=4),
+        # one channel of one color is off by one
+        PaletteLUT("3024", PALETTE[:-1] + colors(["F2CD38"]), RULES, bits=4),
+        PaletteLUT("3024", PALETTE, "type=Solid;stock>5", bits=4),
+        PaletteLUT("3070", PALETTE, RULES, bits=4),
+    ]
+    paths = {lut.path} | {other.path for other in changed}
+    assert len(paths) == len(changed) + 1
+    for table in [lut] + changed:
+        table.load()
+    assert set(lut_dir.iterdir()) == paths
+
+
+def test_rebuild_recomputes_the_saved_table(lut_dir):
+    lut = PaletteLUT("3024", PALETTE, RULES, bits=4)
+    table = lut.build()
+    np.save(lut.path, np.zeros_like(table))
+
+    assert not PaletteLUT("3024", PALETTE, RULES, bits=4).load().any()
+    rebuilt = PaletteLUT("3024", PALETTE, RULES, bits=4).load(rebuild=True)
+    np.testing.assert_array_equal(rebuilt, table)
+    np.testing.assert_array_equal(np.load(lut.path), table)
+
+
+def test_verify_reports_agreement_with_ciede2000(lut_dir):
+    from skimage import color
+    from Color import CIEDE2000_matrix
+
+    lut = PaletteLUT("3024", PALETTE, RULES, bits=5)
+    lut.load()
+    report = lut.verify(samples=2000, seed=3)
+    assert report["samples"] == 2000
+    assert report["agreement"] > 0.9
+    assert 0 <= report["mean_extra_delta_e"] <= report["max_extra_delta_e"]
+
+    # a table of one color agrees exactly where that color is the nearest
+    lut.table = np.zeros_like(lut.table)
+    rgb = np.random.default_rng(3).integers(0, 256, size=(2000, 3), dtype=np.uint8)
+    exact = CIEDE2000_matrix(color.rgb2lab(rgb / 255), lut._palette_lab()).argmin(axis=1)
+    report = lut.verify(samples=2000, seed=3)
+    assert report["agreement"] == pytest.approx(np.mean(exact == 0))
+    assert report["max_extra_delta_e"] > 0
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw, ImageFont
+import Pipeline
+from Brick.Board import Board
+from Brick.Type import Type
+from BrickLink.Color import Color as BrickLinkColor
+
+
+def reference_render(board: Board, stud_size: int, show_studs: bool) -> Image.Image:
+    """
+    The renderer before tiles: every index and cell drawn by PIL, one at a time.
+    """
+    h, w = board.height, board.width
+    index_space = stud_size * 2 // 3
+    size = (w * stud_size + index_space, h * stud_size + index_space)
+    img = Image.new("RGB", size, (240, 240, 240))
+    draw = ImageDraw.Draw(img)
+    font = ImageFont.load_default()
+
+    def index(text: str, tx: int, ty: int):
+        bbox = draw.textbbox((0, 0), text, font=font)
+        text_w, text_h = bbox[2] - bbox[0], bbox[3] - bbox[1]
+        draw.text((tx - text_w // 2, ty - text_h // 2), text, fill=(0, 0, 0), font=font)
+
+    for x in range(w):
+        index(str(x + 1), index_space + x * stud_size + stud_size // 2, index_space // 4)
+    for y in range(h):
+        index(str(y + 1), index_space // 4, index_space + y * stud_size + stud_size // 2)
+
+    rgb_codes = [c.rgb_code for c in board.palette]
+    for y, row in enumerate(board.indices):
+        for x, i in enumerate(row):
+            rgb_code = rgb_codes[i]
+            x0 = index_space + x * stud_size
+            y0 = index_space + y * stud_size
+            draw.rectangle([x0, y0, x0 + stud_size, y0 + stud_size], fill=rgb_code)
+            if show_studs:
+                cx, cy, r = x0 + stud_size / 2, y0 + stud_size / 2, stud_size * 0.35
+                stud_fill = tuple(min(255, int(c * 1.15)) for c in rgb_code)
+                draw.ellipse([cx - r, cy - r, cx + r, cy + r], fill=stud_fill, outline=(0, 0, 0))
+    return img
+
+
+@pytest.mark.parametrize("show_studs", [True, False])
+@pytest.mark.parametrize("stud_size", [7, 12, 20, 31])
+def test_tiles_render_like_the_cell_by_cell_drawing(stud_size, show_studs):
+    rng = np.random.default_rng(stud_size)
+    palette = [
+        BrickLinkColor(i, f"Color {i}", "%02x%02x%02x" % tuple(rng.integers(0, 256, 3)), 1)
+        for i in range(9)
+    ]
+    # more than 9 columns and rows, so indices have two digits
+    board = Board(rng.integers(0, len(palette), (12, 17)), palette, Type.PLATE, "381")
+    Pipeline.render_stud_tile.cache_clear()
+
+    rendered = np.asarray(Pipeline.render_matrix_to_image(board, stud_size, show_studs))
+    expected = np.asarray(reference_render(board, stud_size, show_studs))
+    assert np.array_equal(rendered, expected)
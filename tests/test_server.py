@@ -0,0 +1,99 @@
+import io
+import json
+import threading
+import urllib.error
+import urllib.request
+import numpy as np
+import pytest
+from PIL import Image
+from Brick.Type import Type
+from BrickLink.Color import Color as BrickLinkColor
+from Server import Server
+
+
+def palette_colors() -> list[BrickLinkColor]:
+    rng = np.random.default_rng(11)
+    return [
+        BrickLinkColor(i, f"Color {i}", "%02x%02x%02x" % tuple(rng.integers(0, 256, 3)), 100)
+        for i in range(12)
+    ]
+
+
+@pytest.fixture(scope="module")
+def server():
+    colors = palette_colors()
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(
+            BrickLinkColor, "get_filtered_colors", staticmethod(lambda piece_type: colors)
+        )
+        BrickLinkColor.get_palette_fingerprint.cache_clear()
+        BrickLinkColor.get_palette_index.cache_clear()
+        server = Server(port=0, workers=1, piece_types=(Type.PLATE,))
+        server.start()
+        httpd = server._httpd
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        yield f"http://127.0.0.1:{server.port}"
+        httpd.shutdown()
+        thread.join()
+    BrickLinkColor.get_palette_fingerprint.cache_clear()
+    BrickLinkColor.get_palette_index.cache_clear()
+
+
+def image_bytes() -> bytes:
+    rng = np.random.default_rng(12)
+    buffer = io.BytesIO()
+    Image.fromarray(rng.integers(0, 256, (40, 40, 3), dtype=np.uint8)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def request(url: str, data: bytes = None) -> tuple[int, bytes]:
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, data=data)) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+
+def test_convert_then_fetch_the_render(server):
+    status, body = request(f"{server}/convert?size=16", image_bytes())
+    assert status == 200
+    result = json.loads(body)
+    assert sum(part["count"] for part in result["parts"]) == 16 * 16
+    assert all(part["size"] == "1x1" for part in result["parts"])
+
+    status, png = request(server + result["render_url"])
+    assert status == 200
+    assert Image.open(io.BytesIO(png)).size[0] > 16 * 20
+
+
+@pytest.mark.parametrize(
+    "query, data, error",
+    [
+        ("size=16", b"", "the request body must be the image"),
+        ("size=16", b"not an image", "cannot read the image"),
+        ("size=17", None, "size must be one of"),
+        ("size=big", None, "size must be one of"),
+        ("size=16&type=brick", None, "type must be one of"),
+    ],
+)
+def test_bad_requests(server, query, data, error):
+    status, body = request(f"{server}/convert?{query}", image_bytes() if data is None else data)
+    assert status == 400
+    assert error in json.loads(body)["error"]
+
+
+def test_missing_render_is_404(server):
+    status, _ = request(f"{server}/renders/{'0' * 32}.png")
+    assert status == 404
+
+
+def test_health_reports_latency_percentiles(server):
+    request(f"{server}/convert?size=16", image_bytes())
+    status, body = request(f"{server}/health")
+    assert status == 200
+    health = json.loads(body)
+    assert health["status"] == "ok"
+    convert = health["requests"]["http POST /convert"]
+    assert convert["count"] >= 1
+    assert 0 < convert["p50"] <= convert["p95"] <= convert["p99"] <= convert["max"]
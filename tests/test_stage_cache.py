@@ -0,0 +1,50 @@
+import os
+import time
+import pytest
+from StageCache import StageCache
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(StageCache, "get_dir", staticmethod(lambda: tmp_path))
+    monkeypatch.setattr(StageCache, "enabled", True)
+    monkeypatch.setattr(StageCache, "max_bytes", 1000)
+    monkeypatch.setattr(StageCache, "_bytes", None)
+    return tmp_path
+
+
+def test_puts_scan_the_directory_only_to_evict(cache, monkeypatch):
+    scans = []
+    entries = StageCache._entries.__func__
+
+    def counted(cls):
+        scans.append(1)
+        return entries(cls)
+
+    monkeypatch.setattr(StageCache, "_entries", classmethod(counted))
+
+    for i in range(4):
+        StageCache.put_bytes("render", str(i), b"x" * 200)
+    # the first put loads the total, the next ones add to it
+    assert len(scans) == 1
+    StageCache.put_bytes("render", "3", b"x" * 300)
+    assert len(scans) == 1
+
+    for i in range(4, 8):
+        StageCache.put_bytes("render", str(i), b"x" * 200)
+    assert len(scans) > 1
+    assert StageCache.info()["bytes"] <= 1000
+    assert StageCache._bytes == StageCache.info()["bytes"]
+
+
+def test_clear_keeps_files_being_written(cache):
+    StageCache.put_bytes("render", "a", b"png")
+    writing = cache / "render-b.png123.tmp"
+    writing.write_bytes(b"half")
+    crashed = cache / "render-c.png456.tmp"
+    crashed.write_bytes(b"half")
+    old = time.time() - 2 * StageCache.tmp_max_age
+    os.utime(crashed, (old, old))
+
+    assert StageCache.clear() == 2
+    assert [path.name for path in cache.iterdir()] == [writing.name]
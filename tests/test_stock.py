@@ -0,0 +1,69 @@
+import pytest
+from BrickLink.Connector import Connector
+from BrickLink.StockCache import StockCache
+
+
+class FakePool:
+    def __init__(self, texts: dict):
+        self.texts = texts
+        self.urls = []
+
+    def map_element_text(self, urls: list[str], element_id: str) -> list[str | None]:
+        self.urls += urls
+        return [self.texts.get(url) for url in urls]
+
+
+@pytest.fixture
+def connector(tmp_path, monkeypatch):
+    cache = StockCache(tmp_path / "stock.sqlite3")
+    monkeypatch.setattr(Connector, "_stock_cache", cache)
+    monkeypatch.setattr(Connector, "offline", False)
+    monkeypatch.setattr(Connector, "refresh_stock", False)
+    yield Connector
+    cache.close()
+
+
+@pytest.mark.parametrize(
+    "text, lots",
+    [("12 items", 12), ("1,204 items", 1204), ("0 items", 0), (None, None), ("", None), ("n/a", None)],
+)
+def test_parse_stock(text, lots):
+    assert Connector._parse_stock(text) == lots
+
+
+def test_timeouts_are_unknown_and_not_cached(connector, monkeypatch):
+    url_ok = connector.get_bricklink_url("3024", 1, 1)
+    pool = FakePool({url_ok: "7 items"})
+    monkeypatch.setattr(Connector, "get_browser_pool", classmethod(lambda cls: pool))
+
+    results = connector.get_pieces_stock([("3024", 1, 5), ("3024", 2, 5)])
+    assert [stock for stock, _ in results] == [7, None]
+    assert connector.get_stock_cache().get("3024", 1) == 7
+    assert connector.get_stock_cache().get("3024", 2) is None
+
+    # only the unknown count is scraped again
+    pool.urls.clear()
+    connector.get_pieces_stock([("3024", 1, 5), ("3024", 2, 5)])
+    assert pool.urls == [connector.get_bricklink_url("3024", 2, 1)]
+
+
+def test_threads_share_one_stock_cache(tmp_path, monkeypatch):
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from BrickLink import Connector as connector_module
+
+    created = []
+
+    class SlowStockCache(StockCache):
+        def __init__(self, ttl: float):
+            time.sleep(0.05)
+            super().__init__(tmp_path / f"stock-{len(created)}.sqlite3", ttl)
+            created.append(self)
+
+    monkeypatch.setattr(connector_module, "StockCache", SlowStockCache)
+    monkeypatch.setattr(Connector, "_stock_cache", None)
+    with ThreadPoolExecutor(8) as executor:
+        caches = list(executor.map(lambda _: Connector.get_stock_cache(), range(8)))
+    assert len(created) == 1
+    assert all(cache is created[0] for cache in caches)
+    created[0].close()
@@ -0,0 +1,69 @@
+import json
+from urllib.parse import parse_qs
+import pytest
+from Brick.Piece import Piece
+from BrickLink.Color import Color as BrickLinkColor
+from BrickLink.Connector import Connector
+from BrickLink.Wishlist import Wishlist
+from mock_server import MockServer
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(Connector, "_session", None)
+    with MockServer() as server:
+        monkeypatch.setattr(Connector, "wanted_url", server.url)
+        yield server
+    Connector.close()
+
+
+def lots(n: int) -> list[tuple[Piece, int]]:
+    color = BrickLinkColor(11, "Black", "212121", 500)
+    return [(Piece("3024", color, (1, 1), 3000 + i), i + 1) for i in range(n)]
+
+
+def posted_items(body: str) -> list[dict]:
+    return json.loads(parse_qs(body)["wantedItemStr"][0])
+
+
+def test_payloads_are_chunked():
+    payloads = Connector._wanted_payloads(Wishlist(7, "test"), lots(250))
+    sizes = [len(json.loads(p["wantedItemStr"])) for p in payloads]
+    assert sizes == [100, 100, 50]
+    assert all(p["wantedMoreID"] == 7 for p in payloads)
+    assert json.loads(payloads[2]["wantedItemStr"])[-1]["wantedQty"] == 250
+
+
+def test_lots_are_sent_in_chunks(server):
+    Connector.add_pieces_to_wishlist(Wishlist(7, "test"), lots(201), jwt="token")
+    assert [len(posted_items(body)) for _, _, body in server.requests] == [100, 100, 1]
+
+
+def test_post_is_retried_on_429(server):
+    server.responses = [(429, {}), (429, {})]
+    Connector.add_pieces_to_wishlist(Wishlist(7, "test"), lots(3), jwt="token")
+    assert len(server.requests) == 3
+
+
+@pytest.mark.parametrize("status", [500, 502, 503, 504])
+def test_post_is_not_replayed_on_5xx(server, status):
+    server.responses = [(status, {})]
+    with pytest.raises(Exception, match=str(status)):
+        Connector.add_pieces_to_wishlist(Wishlist(7, "test"), lots(3), jwt="token")
+    assert len(server.requests) == 1
+
+
+def test_get_is_retried_on_5xx(server):
+    server.responses = [(503, {}), (502, {})]
+    response = Connector.get_session().get(f"{server.url}/page")
+    assert response.status_code == 200
+    assert len(server.requests) == 3
+
+
+def test_create_wishlist(server):
+    server.responses = [(200, {"wantedMoreID": 42})]
+    wishlist = Connector.create_wishlist("Project", jwt="token")
+    assert wishlist.id == 42
+    method, path, body = server.requests[0]
+    assert (method, path) == ("POST", "/editList.ajax")
+    assert parse_qs(body)["wantedMoreName"] == ["Project"]